@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Encode and decode time and size of sessions with each session codec
+
+    python benchmarks/session_codec.py [sessions] [entities] [items]
+"""
+import sys
+import time
+
+from tock.models import Entity, StringValue, Candidate, UserId, PlayerType
+from tock.session.codec import CompactSessionCodec, PickleSessionCodec, SessionCodec
+from tock.session.session import Session
+
+
+def given_session(index: int, entities: int, items: int) -> Session:
+    session = Session(
+        user_id=UserId(id=f"user-{index}", type=PlayerType.USER, client_id="client"),
+        entities=[
+            Entity(
+                type=f"namespace:type{entity}",
+                role=f"role{entity}",
+                evaluated=True,
+                new=False,
+                content=f"content {index} {entity}",
+                value=StringValue(value=f"value {index} {entity}",
+                                  candidates=[Candidate(value=f"candidate {index}", probability=0.5)])
+            )
+            for entity in range(entities)
+        ]
+    )
+    session.current_story = "story"
+    for item in range(items):
+        session.set_item(f"item{item}", {"text": f"text {index} {item}", "count": item})
+    return session
+
+
+def measure(name: str, codec: SessionCodec, sessions: list):
+    start = time.perf_counter()
+    encoded = [codec.dumps(session) for session in sessions]
+    encode = time.perf_counter() - start
+    start = time.perf_counter()
+    for data in encoded:
+        codec.loads(data)
+    decode = time.perf_counter() - start
+    size = sum(len(data) for data in encoded) / len(encoded)
+    print(f"{name:<24} encode {encode / len(sessions) * 1e6:7.1f} us"
+          f"   decode {decode / len(sessions) * 1e6:7.1f} us   size {size:7.0f} bytes")
+
+
+def main(sessions: int, entities: int, items: int):
+    given = [given_session(index, entities, items) for index in range(sessions)]
+    print(f"{sessions} sessions of {entities} entities and {items} items")
+    measure("pickle", PickleSessionCodec(), given)
+    measure("compact", CompactSessionCodec(compress_threshold=None), given)
+    measure("compact + zlib > 1 KiB", CompactSessionCodec(compress_threshold=1024), given)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 5,
+         int(sys.argv[3]) if len(sys.argv) > 3 else 20)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Memory kept by MemoryStorage for each session
+
+    python benchmarks/session_memory.py [sessions] [entities]
+"""
+import gc
+import sys
+import tracemalloc
+
+from tock.models import Entity, StringValue, Candidate, UserId, PlayerType
+from tock.session.memory import MemoryStorage
+from tock.session.session import Session
+
+
+def given_session(index: int, entities: int) -> Session:
+    session = Session(
+        user_id=UserId(id=f"user-{index}", type=PlayerType.USER, client_id="client"),
+        entities=[
+            Entity(
+                type=f"namespace:type{entity}",
+                role=f"role{entity}",
+                evaluated=True,
+                new=False,
+                content=f"content {index} {entity}",
+                value=StringValue(value=f"value {index} {entity}",
+                                  candidates=[Candidate(value=f"candidate {index}", probability=0.5)])
+            )
+            for entity in range(entities)
+        ]
+    )
+    session.current_story = "story"
+    return session
+
+
+def main(sessions: int, entities: int):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    storage = MemoryStorage()
+    for index in range(sessions):
+        storage.save(given_session(index, entities))
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print(f"{sessions} sessions of {entities} entities: {used / sessions:.0f} bytes per session")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000, int(sys.argv[2]) if len(sys.argv) > 2 else 5)
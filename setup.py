@@ -41,6 +41,10 @@ setuptools.setup(
         'marshmallow-oneofschema==2.1.0',
         'testfixtures==6.15.0',
     ],
+    extras_require={
+        'orjson': ['orjson'],
+        'ujson': ['ujson'],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
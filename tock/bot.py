@@ -14,18 +14,28 @@
 """
 import abc
 import logging
+from concurrent.futures import Executor
 from datetime import datetime
-from typing import Callable, Type, List, Any
+from time import perf_counter
+from typing import Callable, Type, List, Any, Optional, Union
 
 import asyncio
 
 from tock.bus import TockBotBus, BotBus
-from tock.session.storage import Storage
+from tock.session.storage import Storage, AsyncStorage, SyncStorageAdapter
 from tock.session.memory import MemoryStorage
+from tock.idempotency import IdempotencyCache
 from tock.intent import Intent
+from tock.json_backend import JsonBackend, json_backend
+from tock.metrics import Metrics, SESSION_LOAD, STORY_LOOKUP, STORY_CREATE, ANSWER, RESPONSE_BUILD, SESSION_SAVE
+from tock.middleware import Middleware, AsyncMiddleware, Handler, compose
 from tock.models import TockMessage, BotRequest, BotMessage, \
-    BotResponse, ResponseContext, IntentName, ClientConfiguration, UserId
-from tock.story import Story, StoryDefinitions, story as story_decorator, unknown
+    BotResponse, ResponseContext, IntentName, ClientConfiguration, UserId, RawBotMessage
+from tock.response_cache import ResponseCache
+from tock.schemas import TockMessageSchema, UberBotMessageSchema
+from tock.sharding import ShardedHandler, MAX_IN_FLIGHT_PER_WORKER
+from tock.story import Story, StoryDefinitions, story as story_decorator
+from tock.supervisor import WorkerSupervisor
 from tock.webhook import TockWebhook
 from tock.websocket import TockWebsocket
 
@@ -37,7 +47,17 @@ class TockBot:
         self.__namespace: str = "default"
         self.__bus: Type[TockBotBus] = TockBotBus
         self.__story_definitions: StoryDefinitions = StoryDefinitions()
-        self.__bot_storage: Storage = MemoryStorage()
+        self.__bot_storage: AsyncStorage = SyncStorageAdapter(MemoryStorage())
+        self.__executor: Optional[Executor] = None
+        self.__codec: Any = TockMessageSchema()
+        self.__json: JsonBackend = json_backend()
+        self.__metrics: Metrics = Metrics()
+        self.__idempotency: Optional[IdempotencyCache] = None
+        self.__response_cache: Optional[ResponseCache] = None
+        self.__message_schema = UberBotMessageSchema()
+        self.__middlewares: List[Union[Middleware, AsyncMiddleware]] = []
+        # the bot handler wrapped by the middlewares, composed once when they are registered
+        self.__handler: Handler = self.__bot_handler
 
     def __add_story(self, intent_name: IntentName, answer: Callable) -> 'TockBot':
         story_class: Type[Story] = story_decorator(intent_name)(answer)()
@@ -48,10 +68,49 @@ class TockBot:
         self.__namespace = namespace
         return self
 
-    def use_storage(self, storage: Storage) -> 'TockBot':
+    def use_storage(self, storage: Union[Storage, AsyncStorage]) -> 'TockBot':
+        if isinstance(storage, Storage):
+            storage = SyncStorageAdapter(storage)
         self.__bot_storage = storage
         return self
 
+    def use_executor(self, executor: Executor) -> 'TockBot':
+        self.__executor = executor
+        return self
+
+    def use_codec(self, codec: Any) -> 'TockBot':
+        self.__codec = codec
+        return self
+
+    def use_json_backend(self, backend: Union[str, JsonBackend]) -> 'TockBot':
+        if isinstance(backend, str):
+            backend = json_backend(backend)
+        self.__json = backend
+        return self
+
+    def use_idempotency(self, max_size: int = 10000, ttl: float = 300.0) -> 'TockBot':
+        """
+        Answer requests retried by Tock with the response of their first execution, without running the story again
+        """
+        self.__idempotency = IdempotencyCache(max_size=max_size, ttl=ttl)
+        return self
+
+    def use_response_cache(self, max_size: int = 1000) -> 'TockBot':
+        """
+        Reuse the serialized messages of cacheable stories answering the same intent, entities and language
+        """
+        self.__response_cache = ResponseCache(max_size=max_size)
+        return self
+
+    def use_middleware(self, *middlewares: Union[Middleware, AsyncMiddleware]) -> 'TockBot':
+        self.__middlewares.extend(middlewares)
+        self.__handler = compose(self.__middlewares, self.__bot_handler)
+        return self
+
+    @property
+    def metrics(self) -> Metrics:
+        return self.__metrics
+
     def register_bus(self, bus: Type[BotBus]) -> 'TockBot':
         self.__bus = bus
         return self
@@ -76,40 +135,149 @@ class TockBot:
     def start_webhook(self,
                       host: str,
                       path: str,
-                      port: int):
+                      port: int,
+                      workers: int = 1,
+                      on_worker_start: Optional[Callable[['TockBot', int], None]] = None,
+                      metrics_path: Optional[str] = None):
+        """
+        Serve the webhook, in ``workers`` forked processes sharing the port when workers > 1
+
+        Metrics are exported on ``GET metrics_path`` when provided. They include story
+        names and error counts: keep the path secret or out of public reach.
+
+        Connections opened before the fork must not be shared between workers:
+        ``on_worker_start(bot, index)`` is called in each worker before it serves
+        requests, and is the place to call ``use_storage`` with a per-worker storage.
+        A storage which is not fork safe must be replaced there, or ValueError is raised.
+        Workers may answer the same user: storages shared by workers must not cache
+        what other workers write, like ``ShardedFileStorage`` with ``negative_cache``.
+        """
+        if workers > 1:
+            self.__check_fork_safe(on_worker_start)
+            WorkerSupervisor(
+                target=lambda index: self.__run_webhook(host, path, port, True, on_worker_start, index, metrics_path),
+                workers=workers
+            ).run()
+        else:
+            self.__run_webhook(host, path, port, False, on_worker_start, 0, metrics_path)
+
+    def __run_webhook(self,
+                      host: str,
+                      path: str,
+                      port: int,
+                      reuse_port: bool,
+                      on_worker_start: Optional[Callable[['TockBot', int], None]],
+                      index: int,
+                      metrics_path: Optional[str] = None):
+        if reuse_port:
+            # the event loop of the parent process must not be shared with forked workers
+            asyncio.set_event_loop(asyncio.new_event_loop())
+        self.__start_worker(on_worker_start, index, forked=reuse_port)
         TockWebhook(
             host=host,
             path=path,
             port=port,
             client_configuration=self.client_configuration(),
-            bot_handler=self.__bot_handler
-        ).start()
+            bot_handler=self.__handler,
+            codec=self.__codec,
+            on_cleanup=self.__bot_storage.close,
+            json=self.__json,
+            metrics=self.__metrics,
+            idempotency=self.__idempotency,
+            metrics_path=metrics_path
+        ).start(reuse_port=reuse_port)
 
     def start_websocket(self,
                         apikey: str = 'apikey_is_undefined',
                         host: str = 'demo-bot.tock.ai',
                         port: int = 443,
-                        protocol: str = 'wss'):
+                        protocol: str = 'wss',
+                        max_concurrency: int = 1,
+                        workers: int = 1,
+                        on_worker_start: Optional[Callable[['TockBot', int], None]] = None,
+                        reconnect: bool = True,
+                        backoff_base: float = 0.5,
+                        backoff_max: float = 30.0,
+                        connections: int = 1):
+        """
+        Connect to Tock, answering messages in ``workers`` forked processes when workers > 1
+
+        Lost connections are opened again after a jittered exponential backoff unless
+        ``reconnect`` is False, ``connections`` sockets are opened in parallel.
+
+        Each user is always answered by the same worker, so each worker keeps the sessions
+        of its users. ``on_worker_start(bot, index)`` is called in each worker before it
+        answers messages. A storage which is not fork safe must be replaced there, or
+        ValueError is raised.
+        """
         loop = asyncio.get_event_loop()
-        loop.run_until_complete(TockWebsocket(
-            apikey=apikey,
-            host=host,
-            port=port,
-            protocol=protocol,
-            client_configuration=self.client_configuration(),
-            bot_handler=self.__bot_handler
-        ).start())
+        shards: Optional[ShardedHandler] = None
+        if workers > 1:
+            self.__check_fork_safe(on_worker_start)
+            shards = ShardedHandler(
+                workers=workers,
+                bot_handler=self.__handler,
+                codec=self.__codec,
+                json=self.__json,
+                on_worker_start=lambda index: self.__start_worker(on_worker_start, index, forked=True),
+                on_worker_stop=lambda: self.__bot_storage.close(),
+                idempotency=self.__idempotency
+            )
+            shards.start()
+            max_concurrency = max(max_concurrency, MAX_IN_FLIGHT_PER_WORKER * workers)
+        try:
+            loop.run_until_complete(TockWebsocket(
+                apikey=apikey,
+                host=host,
+                port=port,
+                protocol=protocol,
+                client_configuration=self.client_configuration(),
+                bot_handler=self.__handler,
+                max_concurrency=max_concurrency,
+                codec=self.__codec,
+                json=self.__json,
+                frame_handler=None if shards is None else shards.handle,
+                reconnect=reconnect,
+                backoff_base=backoff_base,
+                backoff_max=backoff_max,
+                connections=connections,
+                metrics=self.__metrics,
+                idempotency=self.__idempotency
+            ).start())
+        finally:
+            if shards is not None:
+                shards.close()
+            loop.run_until_complete(self.__bot_storage.close())
+
+    def __check_fork_safe(self, on_worker_start: Optional[Callable[['TockBot', int], None]]):
+        if on_worker_start is None and not self.__bot_storage.fork_safe:
+            raise ValueError("the storage runs threads or holds connections which are not copied in forked workers, "
+                             "create it in on_worker_start")
+
+    def __start_worker(self,
+                       on_worker_start: Optional[Callable[['TockBot', int], None]],
+                       index: int,
+                       forked: bool):
+        storage = self.__bot_storage
+        if on_worker_start is not None:
+            on_worker_start(self, index)
+        if forked and self.__bot_storage is storage and not storage.fork_safe:
+            raise RuntimeError(f"worker {index} uses a storage created before the fork, "
+                               f"on_worker_start must call use_storage with a new storage")
 
-    def __bot_handler(self, tock_message: TockMessage) -> TockMessage:
-        self.__logger.debug(f"receive tock_message {tock_message}")
+    async def __bot_handler(self, tock_message: TockMessage) -> TockMessage:
+        self.__logger.debug("receive tock_message %s", tock_message)
+        metrics = self.__metrics
         messages: List[BotMessage] = []
         request: BotRequest = tock_message.bot_request
-        current_user_id: UserId = request.context.user_id
+        current_user_id: UserId = request.user_id
 
-        session = self.__bot_storage.get_session(current_user_id)
+        with metrics.time(SESSION_LOAD):
+            session = await self.__bot_storage.get_session(current_user_id)
         session.entities = request.entities
 
-        story_type: Type[Story] = self.__story_definitions.find_story(request.story_id)
+        with metrics.time(STORY_LOOKUP):
+            story_type: Type[Story] = self.__story_definitions.find_story(request.story_id)
         session.previous_intent = Intent(request.intent)
 
         bus = self.__bus(
@@ -119,42 +287,72 @@ class TockBot:
         )
 
         if story_type is not None:
-            story_name: str = story_type.configuration().name
+            story_name: str = self.__story_definitions.configuration(story_type).name
             self.__logger.info("story found %s for intent %s", story_name, request.intent)
             session.current_story = story_name
         else:
             self.__logger.info("No story for intent %s", request.intent)
-            story_type = unknown()
+            story_type = self.__story_definitions.unknown_story
+            story_name = self.__story_definitions.configuration(story_type).name
 
-        story_instance: Story = self.__create(story_type, bus)
+        cache_key = None
+        cached: Optional[List[RawBotMessage]] = None
+        if self.__response_cache is not None and story_type.cacheable:
+            cache_key = ResponseCache.key(story_name, request)
+            cached = self.__response_cache.get(cache_key)
 
-        try:
-            story_instance.answer(bus)
-        except:
-            self.__logger.exception("Unexpected error")
-
-        response = TockMessage(
-            bot_response=BotResponse(
-                messages=messages,
-                story_id=story_instance.configuration().name,
-                step=None,
-                context=ResponseContext(
-                    request_id=tock_message.request_id,
-                    date=datetime.now()
+        if cached is None:
+            with metrics.time(STORY_CREATE):
+                story_instance: Story = self.__create(story_type, bus)
+
+            error = False
+            started = perf_counter()
+            try:
+                await self.__answer(story_instance, bus)
+            except:
+                error = True
+                self.__logger.exception("Unexpected error")
+            answered = perf_counter() - started
+            metrics.observe(ANSWER, answered)
+            metrics.observe_story(story_name, answered, error)
+
+            if cache_key is not None and not error:
+                self.__response_cache.put(cache_key, [
+                    RawBotMessage(self.__message_schema.dump(message)) for message in messages
+                ])
+        else:
+            messages = cached
+
+        with metrics.time(RESPONSE_BUILD):
+            response = TockMessage(
+                bot_response=BotResponse(
+                    messages=messages,
+                    story_id=story_name,
+                    step=None,
+                    context=ResponseContext(
+                        request_id=tock_message.request_id,
+                        date=datetime.now()
+                    ),
+                    entities=request.entities
                 ),
-                entities=request.entities
-            ),
-            request_id=tock_message.request_id,
-        )
-        self.__logger.debug(f"send tock_message {response}")
-        self.__bot_storage.save(session)
+                request_id=tock_message.request_id,
+            )
+        self.__logger.debug("send tock_message %s", response)
+        with metrics.time(SESSION_SAVE):
+            await self.__bot_storage.save(session)
         return response
 
+    async def __answer(self, story_instance: Story, bus: BotBus):
+        if asyncio.iscoroutinefunction(story_instance.answer):
+            await story_instance.answer(bus)
+        else:
+            # sync stories run on the executor so they never block the event loop
+            await asyncio.get_event_loop().run_in_executor(self.__executor, story_instance.answer, bus)
+
     @staticmethod
     def __create(story_class: Type[Story], bus: BotBus):
         story = story_class(request=bus.request)
-        for entity in bus.session.entities:
-            entity_type = entity.type.split(":")[1]
+        for entity_type, entity in bus.session.entities_by_short_type.items():
             if hasattr(story, entity_type):
                 setattr(
                     story,
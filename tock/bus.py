@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 import abc
 import logging
-from typing import Callable, List, Any
+from typing import Callable, List, Any, Optional
 
 from tock.session.session import Session
 from tock.intent import Intent
@@ -30,7 +30,7 @@ class BotBus(abc.ABC):
         pass
 
     @abc.abstractmethod
-    def entity(self, entity_type: str) -> Entity:
+    def entity(self, entity_type: str, role: Optional[str] = None) -> Entity:
         pass
 
     @abc.abstractmethod
@@ -76,8 +76,8 @@ class TockBotBus(BotBus):
     def request(self):
         return self.__request
 
-    def entity(self, entity_type: str) -> Entity:
-        return self.session.entity(entity_type)
+    def entity(self, entity_type: str, role: Optional[str] = None) -> Entity:
+        return self.session.entity(entity_type, role)
 
     def is_intent(self, intents: Any) -> bool:
         if type(intents) == IntentName:
@@ -0,0 +1,488 @@
+# -*- coding: utf-8 -*-
+"""
+    The ``codec`` module
+    ======================
+
+    Fast alternative to the marshmallow schemas of ``tock.schemas``.
+
+    A codec is compiled once from a schema: every nested schema becomes a pair of
+    straight-line ``dump``/``load`` functions building the ``tock.models`` dataclasses
+    directly. The produced JSON is identical to the schema one.
+
+    :Example:
+
+    >>> from tock.codec import TockMessageCodec
+    >>> from tock.bot import TockBot
+    >>> TockBot().use_codec(TockMessageCodec())
+
+"""
+import json
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, get_type_hints
+
+from marshmallow import Schema, ValidationError, fields
+from marshmallow.decorators import POST_LOAD
+from marshmallow_enum import EnumField
+from marshmallow_oneofschema import OneOfSchema
+
+from tock.models import BotRequest, Entity, Message, RequestContext, UserId, Value
+from tock.schemas import TockMessageSchema, BotRequestSchema, EntitySchema, MessageSchema, RequestContextSchema, \
+    UberValueSchema, UserIdSchema
+
+_MISSING = object()
+
+
+def _dump_boolean(value: Any) -> bool:
+    if value is True or value is False:
+        return value
+    if value in fields.Boolean.truthy:
+        return True
+    if value in fields.Boolean.falsy:
+        return False
+    return bool(value)
+
+
+def _load_boolean(value: Any) -> bool:
+    if value is True or value is False:
+        return value
+    if value in fields.Boolean.truthy:
+        return True
+    if value in fields.Boolean.falsy:
+        return False
+    raise ValueError(f"Not a valid boolean: {value!r}")
+
+
+def _model_of(schema_class: Type[Schema]) -> Any:
+    for attribute_name in dir(schema_class):
+        hooks = getattr(getattr(schema_class, attribute_name), "__marshmallow_hook__", None)
+        if hooks and (POST_LOAD, False) in hooks:
+            return get_type_hints(getattr(schema_class, attribute_name))["return"]
+    return None
+
+
+class _Compiler:
+
+    def __init__(self):
+        self.__names: Dict[Type[Schema], str] = {}
+        self.__sources: List[str] = []
+        self.__namespace: Dict[str, Any] = {
+            "_MISSING": _MISSING,
+            "_ValidationError": ValidationError,
+            "_dump_boolean": _dump_boolean,
+            "_load_boolean": _load_boolean,
+            "_strptime": datetime.strptime,
+        }
+
+    def compile(self, schema_class: Type[Schema]) -> Tuple[Callable[[Any], dict], Callable[[dict], Any]]:
+        name = self.__function_name(schema_class)
+        exec("\n\n".join(self.__sources), self.__namespace)
+        return self.__namespace[f"dump_{name}"], self.__namespace[f"load_{name}"]
+
+    def dump_function(self, schema_class: Type[Schema]) -> Callable[[Any], dict]:
+        return self.__namespace[f"dump_{self.__names[schema_class]}"]
+
+    def load_function(self, schema_class: Type[Schema]) -> Callable[[dict], Any]:
+        return self.__namespace[f"load_{self.__names[schema_class]}"]
+
+    def replace_dump_function(self, schema_class: Type[Schema], dump: Callable[[Any], dict]):
+        # compiled functions call each other through the namespace, so nested dumps use the replacement
+        self.__namespace[f"dump_{self.__names[schema_class]}"] = dump
+
+    def replace_load_function(self, schema_class: Type[Schema], load: Callable[[dict], Any]):
+        self.__namespace[f"load_{self.__names[schema_class]}"] = load
+
+    def __function_name(self, schema_class: Type[Schema]) -> str:
+        if schema_class not in self.__names:
+            name = f"{schema_class.__name__}_{len(self.__names)}"
+            self.__names[schema_class] = name
+            schema = schema_class()
+            if isinstance(schema, OneOfSchema):
+                self.__compile_one_of(name, schema)
+            else:
+                self.__compile_schema(name, schema)
+        return self.__names[schema_class]
+
+    def __constant(self, prefix: str, value: Any) -> str:
+        name = f"_{prefix}_{len(self.__namespace)}"
+        self.__namespace[name] = value
+        return name
+
+    def __compile_schema(self, name: str, schema: Schema):
+        dump_lines = [f"def dump_{name}(obj):", "    data = {}"]
+        for field_name, field in schema.dump_fields.items():
+            attribute = field.attribute or field_name
+            dump_lines += [
+                f"    value = obj.{attribute}",
+                "    if value is not None:",
+                f"        data[{field.data_key or field_name!r}] = {self.__dump_expression(field, 'value')}",
+            ]
+        dump_lines.append("    return data")
+
+        model = _model_of(type(schema))
+        load_lines = [f"def load_{name}(data):", "    kwargs = {}"]
+        for field_name, field in schema.load_fields.items():
+            attribute = field.attribute or field_name
+            key = field.data_key or field_name
+            load_lines.append(f"    value = data.get({key!r}, _MISSING)")
+            if field.required:
+                load_lines += [
+                    "    if value is _MISSING:",
+                    f"        raise _ValidationError({{{key!r}: ['Missing data for required field.']}})",
+                ]
+            if not field.allow_none:
+                load_lines += [
+                    "    if value is None:",
+                    f"        raise _ValidationError({{{key!r}: ['Field may not be null.']}})",
+                ]
+            load_lines += [
+                "    if value is not _MISSING:",
+                f"        kwargs[{attribute!r}] = None if value is None else {self.__load_expression(field, 'value')}",
+            ]
+        if model is None:
+            load_lines.append("    return kwargs")
+        else:
+            load_lines.append(f"    return {self.__constant('model', model)}(**kwargs)")
+
+        self.__sources.append("\n".join(dump_lines))
+        self.__sources.append("\n".join(load_lines))
+
+    def __compile_one_of(self, name: str, schema: OneOfSchema):
+        function_names: Dict[str, str] = {}
+        classes: Dict[type, str] = {}
+        for type_name, type_schema in schema.type_schemas.items():
+            type_schema_class = type_schema if isinstance(type_schema, type) else type(type_schema)
+            function_names[type_name] = self.__function_name(type_schema_class)
+            model = _model_of(type_schema_class)
+            if model is not None:
+                classes.setdefault(model, type_name)
+
+        classes = self.__constant("classes", classes)
+        get_obj_type = self.__constant("get_obj_type", schema.get_obj_type)
+        dump_functions = ", ".join(f"{type_name!r}: dump_{function_name}"
+                                   for type_name, function_name in function_names.items())
+        load_functions = ", ".join(f"{type_name!r}: load_{function_name}"
+                                   for type_name, function_name in function_names.items())
+        type_field = schema.type_field
+
+        raw_check = []
+        raw_types = getattr(schema, "raw_types", ())
+        if raw_types:
+            raw_check = [
+                f"    if obj.__class__ in {self.__constant('raw_types', frozenset(raw_types))}:",
+                "        return obj.data",
+            ]
+
+        self.__sources.append("\n".join([
+            f"def dump_{name}(obj):",
+            *raw_check,
+            f"    obj_type = {classes}.get(obj.__class__) or {get_obj_type}(obj)",
+            f"    data = _DUMP_{name}[obj_type](obj)",
+            f"    data[{type_field!r}] = obj_type",
+            "    return data",
+        ]))
+        self.__sources.append("\n".join([
+            f"def load_{name}(data):",
+            f"    return _LOAD_{name}[data[{type_field!r}]](data)",
+        ]))
+        self.__sources.append(f"_DUMP_{name} = {{{dump_functions}}}")
+        self.__sources.append(f"_LOAD_{name} = {{{load_functions}}}")
+
+    def __dump_expression(self, field: fields.Field, value: str) -> str:
+        if isinstance(field, fields.Nested):
+            function_name = self.__function_name(type(field.schema))
+            if field.many:
+                return f"[dump_{function_name}(item) for item in {value}]"
+            return f"dump_{function_name}({value})"
+        if isinstance(field, fields.List):
+            return f"[{self.__dump_expression(field.inner, 'item')} for item in {value}]"
+        if isinstance(field, fields.String):
+            return f"str({value})"
+        if isinstance(field, fields.Integer):
+            return f"int({value})"
+        if isinstance(field, fields.Number):
+            return f"float({value})"
+        if isinstance(field, fields.Boolean):
+            return f"_dump_boolean({value})"
+        if isinstance(field, fields.DateTime) and field.format not in field.SERIALIZATION_FUNCS:
+            return f"{value}.strftime({field.format!r})"
+        if isinstance(field, EnumField):
+            return f"{value}.{'value' if field.dump_by == EnumField.VALUE else 'name'}"
+        serialize = self.__constant("serialize", field._serialize)
+        return f"{serialize}({value}, None, None)"
+
+    def __load_expression(self, field: fields.Field, value: str) -> str:
+        if isinstance(field, fields.Nested):
+            function_name = self.__function_name(type(field.schema))
+            if field.many:
+                return f"[load_{function_name}(item) for item in {value}]"
+            return f"load_{function_name}({value})"
+        if isinstance(field, fields.List):
+            return f"[{self.__load_expression(field.inner, 'item')} for item in {value}]"
+        if isinstance(field, fields.String):
+            return value
+        if isinstance(field, fields.Integer):
+            return f"int({value})"
+        if isinstance(field, fields.Number):
+            return f"float({value})"
+        if isinstance(field, fields.Boolean):
+            return f"_load_boolean({value})"
+        if isinstance(field, fields.DateTime) and field.format not in field.DESERIALIZATION_FUNCS:
+            return f"_strptime({value}, {field.format!r})"
+        if isinstance(field, EnumField):
+            enum = self.__constant("enum", field.enum)
+            if field.load_by == EnumField.VALUE:
+                return f"{enum}({value})"
+            return f"{enum}[{value}]"
+        deserialize = self.__constant("deserialize", field._deserialize)
+        return f"{deserialize}({value}, None, None)"
+
+
+class Codec:
+    """
+    Drop-in replacement of a marshmallow schema for ``load``, ``loads``, ``dump`` and ``dumps``
+    """
+
+    def __init__(self, schema_class: Type[Schema]):
+        self._compiler = _Compiler()
+        self.__dump, self.__load = self._compiler.compile(schema_class)
+
+    def dump(self, obj: Any) -> dict:
+        return self.__dump(obj)
+
+    def dumps(self, obj: Any) -> str:
+        return json.dumps(self.__dump(obj))
+
+    def load(self, data: dict) -> Any:
+        try:
+            return self.__load(data)
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise ValidationError(str(e))
+
+    def loads(self, data: str) -> Any:
+        return self.load(json.loads(data))
+
+
+class TockMessageCodec(Codec):
+    """
+    Codec of TockMessage
+
+    With ``lazy``, bot requests are loaded as LazyBotRequest: their message,
+    context and entity values are decoded when they are first read, and invalid
+    ones raise then instead of when the message is loaded. Unchanged entities
+    echoed in a response are dumped as the JSON they were loaded from.
+    """
+
+    def __init__(self, lazy: bool = False):
+        super().__init__(TockMessageSchema)
+        if lazy:
+            load_value = self._compiler.load_function(UberValueSchema)
+            load_message = self._compiler.load_function(MessageSchema)
+            load_context = self._compiler.load_function(RequestContextSchema)
+            load_user_id = self._compiler.load_function(UserIdSchema)
+            self._compiler.replace_load_function(
+                BotRequestSchema,
+                lambda data: LazyBotRequest(data, load_value, load_message, load_context, load_user_id)
+            )
+            dump_entity = self._compiler.dump_function(EntitySchema)
+            self._compiler.replace_dump_function(EntitySchema, lambda entity: _dump_lazy_entity(entity, dump_entity))
+
+
+@lru_cache(maxsize=None)
+def _value_functions() -> Tuple[Callable[[Any], dict], Callable[[dict], Any]]:
+    return _Compiler().compile(UberValueSchema)
+
+
+def _dump_lazy_entity(entity: Entity, dump_entity: Callable[[Any], dict]) -> dict:
+    if entity.__class__ is LazyEntity:
+        raw = entity.raw
+        if raw is not None:
+            return raw
+    return dump_entity(entity)
+
+
+def _lazy_equal(value: Any, data: Any, other_value: Any, other_data: Any, read: Callable[[Any], Any],
+                obj: Any, other: Any) -> bool:
+    # JSON not decoded on both sides is compared as it is
+    if value is _MISSING and other_value is _MISSING:
+        return data == other_data
+    return read(obj) == read(other)
+
+
+class LazyEntity(Entity):
+    """
+    Entity decoding its value when it is first read
+
+    A value not decoded is compared as JSON: as it is with another value not decoded,
+    or with the encoded value of the other entity.
+    """
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'LazyEntity':
+        """
+        Returns the lazy entity of its JSON, its value is decoded by a shared compiled loader
+        """
+        return cls(data, _value_functions()[1])
+
+    def __init__(self, data: dict, load_value: Callable[[dict], Any]):
+        self.type = data["type"]
+        self.role = data["role"]
+        self.content = data.get("content")
+        self.evaluated = _load_boolean(data["evaluated"])
+        self.new = _load_boolean(data["new"])
+        self.__data = data
+        self.__load_value = load_value
+        self.__value = _MISSING
+
+    @property
+    def value(self) -> Optional[Value]:
+        if self.__value is _MISSING:
+            data = self.__data.get("value")
+            self.__value = None if data is None else self.__load_value(data)
+        return self.__value
+
+    @property
+    def raw(self) -> Optional[dict]:
+        """
+        Returns the JSON the entity was loaded from, or None if the entity may have changed since
+
+        A value which was read may have been changed in place, so it is not considered unchanged.
+        """
+        data = self.__data
+        if self.__value is not _MISSING \
+                or self.type != data["type"] \
+                or self.role != data["role"] \
+                or self.content != data.get("content") \
+                or self.evaluated is not data["evaluated"] \
+                or self.new is not data["new"]:
+            return None
+        return data
+
+    @value.setter
+    def value(self, value: Optional[Value]):
+        self.__value = value
+
+    def __eq__(self, other):
+        if isinstance(other, Entity):
+            return (self.type, self.role, self.evaluated, self.new, self.content) == \
+                   (other.type, other.role, other.evaluated, other.new, other.content) \
+                   and self.__same_value(other)
+        return NotImplemented
+
+    def __same_value(self, other: Entity) -> bool:
+        if isinstance(other, LazyEntity) and other.__value is _MISSING:
+            if self.__value is _MISSING:
+                return self.__data.get("value") == other.__data.get("value")
+            return other.__same_value(self)
+        if self.__value is _MISSING:
+            # encoding the other value is cheaper than decoding this one
+            data = self.__data.get("value")
+            value = other.value
+            return data is None if value is None else data is not None and _value_functions()[0](value) == data
+        return self.value == other.value
+
+    def __reduce__(self):
+        # the loaders are compiled functions: an unchanged entity is pickled as its JSON, others as an eager Entity
+        raw = self.raw
+        if raw is not None:
+            return LazyEntity.from_json, (raw,)
+        return Entity, (self.type, self.role, self.evaluated, self.new, self.content, self.value)
+
+
+# data key, required and may be null of the bot request fields, checked like the eager codec
+_BOT_REQUEST_FIELDS = [(field.data_key or name, field.required, field.allow_none)
+                       for name, field in BotRequestSchema().load_fields.items()]
+
+
+class LazyBotRequest(BotRequest):
+    """
+    BotRequest decoding its message, context and entity values when they are first read
+
+    ``intent``, ``story_id`` and ``user_id`` are read without decoding the context.
+    Two lazy requests compare the JSON of their parts not decoded yet, comparing
+    with an eager BotRequest decodes them. Missing and null fields are rejected on
+    load, as by the eager codec.
+    """
+
+    def __init__(self,
+                 data: dict,
+                 load_value: Callable[[dict], Any],
+                 load_message: Callable[[dict], Any],
+                 load_context: Callable[[dict], Any],
+                 load_user_id: Callable[[dict], Any]):
+        for key, required, allow_none in _BOT_REQUEST_FIELDS:
+            value = data.get(key, _MISSING)
+            if value is _MISSING and required:
+                raise ValidationError({key: ['Missing data for required field.']})
+            if value is None and not allow_none:
+                raise ValidationError({key: ['Field may not be null.']})
+        self.intent = data["intent"]
+        self.story_id = data["storyId"]
+        self.__entities_data: List[dict] = data["entities"]
+        self.__message_data: Optional[dict] = data.get("message")
+        self.__context_data: Optional[dict] = data.get("context")
+        self.__load_value = load_value
+        self.__load_message = load_message
+        self.__load_context = load_context
+        self.__load_user_id = load_user_id
+        self.__entities = _MISSING
+        self.__message = _MISSING
+        self.__context = _MISSING
+        self.__user_id = _MISSING
+
+    @property
+    def entities(self) -> List[Entity]:
+        if self.__entities is _MISSING:
+            self.__entities = [LazyEntity(entity, self.__load_value) for entity in self.__entities_data]
+        return self.__entities
+
+    @entities.setter
+    def entities(self, entities: List[Entity]):
+        self.__entities = entities
+
+    @property
+    def message(self) -> Message:
+        if self.__message is _MISSING:
+            self.__message = None if self.__message_data is None else self.__load_message(self.__message_data)
+        return self.__message
+
+    @message.setter
+    def message(self, message: Message):
+        self.__message = message
+
+    @property
+    def context(self) -> Optional[RequestContext]:
+        if self.__context is _MISSING:
+            self.__context = None if self.__context_data is None else self.__load_context(self.__context_data)
+        return self.__context
+
+    @context.setter
+    def context(self, context: Optional[RequestContext]):
+        self.__context = context
+        self.__user_id = _MISSING
+
+    @property
+    def user_id(self) -> Optional[UserId]:
+        if self.__context is not _MISSING:
+            return super().user_id
+        if self.__user_id is _MISSING:
+            data = self.__context_data
+            self.__user_id = None if data is None else self.__load_user_id(data["userId"])
+        return self.__user_id
+
+    def __eq__(self, other):
+        if isinstance(other, LazyBotRequest):
+            return (self.intent, self.story_id) == (other.intent, other.story_id) \
+                   and _lazy_equal(self.__entities, self.__entities_data, other.__entities, other.__entities_data,
+                                   lambda request: request.entities, self, other) \
+                   and _lazy_equal(self.__message, self.__message_data, other.__message, other.__message_data,
+                                   lambda request: request.message, self, other) \
+                   and _lazy_equal(self.__context, self.__context_data, other.__context, other.__context_data,
+                                   lambda request: request.context, self, other)
+        if isinstance(other, BotRequest):
+            return (self.intent, self.entities, self.message, self.story_id, self.context) == \
+                   (other.intent, other.entities, other.message, other.story_id, other.context)
+        return NotImplemented
+
+    def __reduce__(self):
+        return BotRequest, (self.intent, self.entities, self.message, self.story_id, self.context)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+    The ``idempotency`` module
+    ======================
+
+    Answer retried requests with the response of their first execution.
+
+    :Example:
+
+    >>> from tock.bot import TockBot
+    >>> bot = TockBot().use_idempotency(max_size=10000, ttl=300)
+
+"""
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from time import monotonic
+from typing import Awaitable, Callable, List, Optional
+
+
+@dataclass
+class IdempotencyStats:
+    size: int = 0
+    hits: int = 0
+    misses: int = 0
+
+
+class IdempotencyCache:
+    """
+    Serialized responses by request id
+
+    A request id seen less than ``ttl`` seconds ago gets the response of its
+    first execution, waiting for it if it is still running. When the first
+    execution fails, its duplicates are executed again.
+    Must be used from a single event loop.
+
+    :param max_size: oldest request ids are forgotten above this count
+    :param ttl: seconds a response is kept after its request was first received
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0):
+        self.__max_size = max_size
+        self.__ttl = ttl
+        # oldest first, values are [future of the response, reception time]
+        self.__entries: OrderedDict = OrderedDict()
+        self.__stats = IdempotencyStats()
+
+    async def get_or_compute(self, request_id: str, compute: Callable[[], Awaitable[bytes]]) -> bytes:
+        now = monotonic()
+        entry: Optional[List] = self.__entries.get(request_id)
+        if entry is not None and now - entry[1] <= self.__ttl:
+            self.__stats.hits += 1
+            # shielded so a cancelled duplicate does not cancel the first execution
+            response: Optional[bytes] = await asyncio.shield(entry[0])
+            if response is not None:
+                return response
+            return await compute()
+
+        self.__stats.misses += 1
+        future = asyncio.get_event_loop().create_future()
+        self.__entries[request_id] = [future, now]
+        self.__entries.move_to_end(request_id)
+        self.__expire(now)
+        self.__evict()
+        try:
+            response = await compute()
+        except BaseException:
+            if self.__entries.get(request_id, [None])[0] is future:
+                del self.__entries[request_id]
+            future.set_result(None)
+            raise
+        future.set_result(response)
+        return response
+
+    @property
+    def stats(self) -> IdempotencyStats:
+        return replace(self.__stats, size=len(self.__entries))
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def __expire(self, now: float):
+        while self.__entries:
+            request_id, entry = next(iter(self.__entries.items()))
+            if now - entry[1] <= self.__ttl:
+                break
+            del self.__entries[request_id]
+
+    def __evict(self):
+        while len(self.__entries) > self.__max_size:
+            self.__entries.popitem(last=False)
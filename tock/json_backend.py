@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+    The ``json_backend`` module
+    ======================
+
+    JSON parsers used by the transports. orjson or ujson are used when installed,
+    stdlib json otherwise. Backends read bytes or str and write bytes.
+
+    :Example:
+
+    >>> from tock.json_backend import json_backend
+    >>> json_backend().name in ("orjson", "ujson", "json")
+    True
+    >>> json_backend("json").dumps({"text": "yo"})
+    b'{"text": "yo"}'
+
+"""
+import abc
+import json
+from typing import Any, Optional, Union
+
+
+class JsonBackend(abc.ABC):
+    name: str
+
+    @abc.abstractmethod
+    def loads(self, data: Union[bytes, str]) -> Any:
+        pass
+
+    @abc.abstractmethod
+    def dumps(self, obj: Any) -> bytes:
+        pass
+
+
+class StdlibJsonBackend(JsonBackend):
+    name = "json"
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj).encode('utf-8')
+
+
+class OrjsonBackend(JsonBackend):
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+        self.__orjson = orjson
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return self.__orjson.loads(data)
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.__orjson.dumps(obj)
+
+
+class UjsonBackend(JsonBackend):
+    name = "ujson"
+
+    def __init__(self):
+        import ujson
+        self.__ujson = ujson
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return self.__ujson.loads(data)
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.__ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False).encode('utf-8')
+
+
+BACKENDS = {
+    OrjsonBackend.name: OrjsonBackend,
+    UjsonBackend.name: UjsonBackend,
+    StdlibJsonBackend.name: StdlibJsonBackend,
+}
+
+
+def json_backend(name: Optional[str] = None) -> JsonBackend:
+    """
+    Returns the named backend, or the fastest installed one when no name is provided
+    """
+    if name is not None:
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown json backend {name}, available backends are {', '.join(BACKENDS)}")
+        return BACKENDS[name]()
+    for backend in BACKENDS.values():
+        try:
+            return backend()
+        except ImportError:
+            pass
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+    The ``metrics`` module
+    ======================
+
+    Durations of the bot request pipeline stages, and latencies and errors by story.
+
+    :Example:
+
+    >>> from tock.metrics import Metrics, ANSWER
+    >>> metrics = Metrics()
+    >>> with metrics.time(ANSWER):
+    ...     pass
+    >>> metrics.stages[ANSWER].count
+    1
+
+"""
+import threading
+from bisect import bisect_left
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+DECODE = "decode"
+SESSION_LOAD = "session_load"
+STORY_LOOKUP = "story_lookup"
+STORY_CREATE = "story_create"
+ANSWER = "answer"
+RESPONSE_BUILD = "response_build"
+SESSION_SAVE = "session_save"
+ENCODE = "encode"
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+class Histogram:
+    """
+    Count of observations by upper bound, the last count being above the last bound
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets: Tuple[float, ...] = buckets
+        self.counts: List[int] = [0] * (len(buckets) + 1)
+        self.count: int = 0
+        self.sum: float = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Returns the upper bound of the bucket holding the q quantile, None without observations
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulated = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulated += count
+            if cumulated >= rank:
+                return bound
+        return float("inf")
+
+    def copy(self) -> 'Histogram':
+        histogram = Histogram(self.buckets)
+        histogram.counts = list(self.counts)
+        histogram.count = self.count
+        histogram.sum = self.sum
+        return histogram
+
+
+class _Timer:
+
+    def __init__(self, metrics: 'Metrics', stage: str):
+        self.__metrics = metrics
+        self.__stage = stage
+        self.__started = 0.0
+
+    def __enter__(self):
+        self.__started = perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.__metrics.observe(self.__stage, perf_counter() - self.__started)
+
+
+class Metrics:
+    """
+    Durations by pipeline stage, latencies and error counts by story
+
+    Metrics are kept by process, workers started by ``start_webhook`` or
+    ``start_websocket`` each have their own.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.__buckets = buckets
+        self.__lock = threading.Lock()
+        self.__stages: Dict[str, Histogram] = {}
+        self.__stories: Dict[str, Histogram] = {}
+        self.__errors: Dict[str, int] = {}
+
+    def time(self, stage: str) -> _Timer:
+        return _Timer(self, stage)
+
+    def observe(self, stage: str, seconds: float):
+        with self.__lock:
+            histogram = self.__stages.get(stage)
+            if histogram is None:
+                histogram = self.__stages[stage] = Histogram(self.__buckets)
+            histogram.observe(seconds)
+
+    def observe_story(self, story: str, seconds: float, error: bool = False):
+        with self.__lock:
+            histogram = self.__stories.get(story)
+            if histogram is None:
+                histogram = self.__stories[story] = Histogram(self.__buckets)
+                self.__errors[story] = 0
+            histogram.observe(seconds)
+            if error:
+                self.__errors[story] += 1
+
+    @property
+    def stages(self) -> Dict[str, Histogram]:
+        with self.__lock:
+            return {stage: histogram.copy() for stage, histogram in self.__stages.items()}
+
+    @property
+    def stories(self) -> Dict[str, Histogram]:
+        with self.__lock:
+            return {story: histogram.copy() for story, histogram in self.__stories.items()}
+
+    @property
+    def errors(self) -> Dict[str, int]:
+        with self.__lock:
+            return dict(self.__errors)
+
+    def prometheus(self) -> str:
+        """
+        Returns the metrics in the Prometheus text exposition format
+        """
+        lines: List[str] = []
+        self.__histograms(lines, "tock_stage_duration_seconds", "Duration of the bot request pipeline stages",
+                          "stage", self.stages)
+        self.__histograms(lines, "tock_story_duration_seconds", "Duration of the story answers",
+                          "story", self.stories)
+        lines.append("# HELP tock_story_errors_total Count of story answers raising an error")
+        lines.append("# TYPE tock_story_errors_total counter")
+        for story, count in sorted(self.errors.items()):
+            lines.append(f'tock_story_errors_total{{story="{_escape(story)}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def __histograms(lines: List[str], name: str, description: str, label: str, histograms: Dict[str, Histogram]):
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} histogram")
+        for key, histogram in sorted(histograms.items()):
+            labels = f'{label}="{_escape(key)}"'
+            cumulated = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulated += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulated}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+            lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+    The ``middleware`` module
+    ======================
+
+    Middlewares run around the bot handler, in registration order. They see the
+    decoded TockMessage and can answer in place of the bot or change its response.
+
+    :Example:
+
+    >>> from tock.bot import TockBot
+    >>> async def trace(message, call_next):
+    ...     response = await call_next(message)
+    ...     print(message.request_id)
+    ...     return response
+    >>> bot = TockBot().use_middleware(trace)
+
+"""
+from typing import Awaitable, Callable, Optional, Sequence, Union
+
+from tock.models import TockMessage
+
+Handler = Callable[[TockMessage], Awaitable[TockMessage]]
+AsyncMiddleware = Callable[[TockMessage, Handler], Awaitable[TockMessage]]
+
+
+class Middleware:
+    """
+    Synchronous middleware
+
+    ``before`` returns a response to answer without calling the next handlers,
+    ``after`` returns a response replacing the one of the next handlers.
+    Returning None keeps going with the message or the response unchanged.
+    """
+
+    def before(self, message: TockMessage) -> Optional[TockMessage]:
+        return None
+
+    def after(self, message: TockMessage, response: TockMessage) -> Optional[TockMessage]:
+        return None
+
+
+def compose(middlewares: Sequence[Union[Middleware, AsyncMiddleware]], handler: Handler) -> Handler:
+    """
+    Returns the handler calling the middlewares then handler, the first middleware being the outermost
+    """
+    for middleware in reversed(middlewares):
+        handler = _wrap(middleware, handler)
+    return handler
+
+
+def _wrap(middleware: Union[Middleware, AsyncMiddleware], call_next: Handler) -> Handler:
+    if isinstance(middleware, Middleware):
+        async def call(message: TockMessage) -> TockMessage:
+            response = middleware.before(message)
+            if response is not None:
+                return response
+            response = await call_next(message)
+            replaced = middleware.after(message, response)
+            return response if replaced is None else replaced
+    else:
+        async def call(message: TockMessage) -> TockMessage:
+            return await middleware(message, call_next)
+    return call
@@ -2,7 +2,7 @@
 from __future__ import annotations
 import abc
 import uuid
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from datetime import datetime, timedelta
 from enum import Enum
 from typing import List, Optional, Any
@@ -10,6 +10,41 @@ from typing import List, Optional, Any
 from isodate import parse_duration
 
 
+def _getstate(self) -> dict:
+    return {field.name: getattr(self, field.name) for field in fields(self) if hasattr(self, field.name)}
+
+
+def _setstate(self, state: Any):
+    # models pickled before they were slotted have their __dict__ as state
+    if isinstance(state, tuple):
+        state = {**(state[0] or {}), **(state[1] or {})}
+    names = {field.name for field in fields(self)}
+    for name, value in state.items():
+        if name in names:
+            object.__setattr__(self, name, value)
+
+
+def _slotted(cls):
+    """
+    Recreate a dataclass with ``__slots__``, so its instances have no ``__dict__``
+
+    Must be applied on top of ``@dataclass``. Methods of the class must call their
+    base class explicitly, as ``super()`` without arguments refers to the replaced class.
+    """
+    names = [field.name for field in fields(cls)]
+    inherited = {name for base in cls.__mro__[1:-1] for name in getattr(base, '__slots__', ())}
+    cls_dict = dict(cls.__dict__)
+    # defaults are class attributes, which conflict with slots of the same name
+    for name in names:
+        cls_dict.pop(name, None)
+    cls_dict.pop('__dict__', None)
+    cls_dict.pop('__weakref__', None)
+    cls_dict['__slots__'] = tuple(name for name in names if name not in inherited)
+    cls_dict['__getstate__'] = _getstate
+    cls_dict['__setstate__'] = _setstate
+    return type(cls)(cls.__name__, cls.__bases__, cls_dict)
+
+
 class PlayerType(Enum):
     USER = "user"
     BOT = "bot"
@@ -19,15 +54,17 @@ IntentName = str
 
 
 class Value(abc.ABC):
-    pass
+    __slots__ = ()
 
 
+@_slotted
 @dataclass
 class AmountOfMoneyValue(Value):
     value: int
     unit: str
 
 
+@_slotted
 @dataclass
 class Candidate:
     value: str
@@ -49,27 +86,31 @@ class DateGrain(Enum):
 
 
 class DateValue(abc.ABC):
-    pass
+    __slots__ = ()
 
 
+@_slotted
 @dataclass
 class DateEntityValue(DateValue):
     date: datetime
     grain: DateGrain
 
 
+@_slotted
 @dataclass
 class DateIntervalEntityValue(DateValue):
     date: DateValue
     to_date: DateValue
 
 
+@_slotted
 @dataclass
 class DistanceValue(Value):
     value: int
     unit: str
 
 
+@_slotted
 @dataclass
 class DurationValue(Value):
     value: str
@@ -78,26 +119,31 @@ class DurationValue(Value):
         return parse_duration(self.value)
 
 
+@_slotted
 @dataclass
 class EmailValue(Value):
     value: str
 
 
+@_slotted
 @dataclass
 class NumberValue(Value):
     value: int
 
 
+@_slotted
 @dataclass
 class OrdinalValue(Value):
     value: int
 
 
+@_slotted
 @dataclass
 class PhoneNumberValue(Value):
     value: str
 
 
+@_slotted
 @dataclass
 class StringValue(Value):
     value: str
@@ -110,23 +156,27 @@ class TemperatureUnit(Enum):
     DEGREE = "degree"
 
 
+@_slotted
 @dataclass
 class TemperatureValue(Value):
     value: int
     unit: TemperatureUnit
 
 
+@_slotted
 @dataclass
 class UrlValue(Value):
     value: str
 
 
+@_slotted
 @dataclass
 class VolumeValue(Value):
     value: int
     unit: str
 
 
+@_slotted
 @dataclass
 class Entity:
     type: str
@@ -138,25 +188,29 @@ class Entity:
     value: Optional[Value] = None
 
 
+@_slotted
 @dataclass
 class Message:
     type: str
     text: str
 
 
+@_slotted
 @dataclass
 class ConnectorType:
     id: str
     user_interface_type: str
 
 
-@dataclass
+@_slotted
+@dataclass(frozen=True)
 class UserId:
     id: str
     type: PlayerType
     client_id: Optional[str] = None
 
 
+@_slotted
 @dataclass
 class User:
     timezone: str
@@ -164,6 +218,7 @@ class User:
     test: bool
 
 
+@_slotted
 @dataclass
 class RequestContext:
     namespace: str
@@ -176,6 +231,7 @@ class RequestContext:
     user: User
 
 
+@_slotted
 @dataclass
 class I18nText:
     text: str
@@ -185,16 +241,19 @@ class I18nText:
     key: Optional[str] = None
 
 
+@_slotted
 @dataclass
 class Suggestion:
     title: I18nText
 
 
+@_slotted
 @dataclass
 class BotMessage(abc.ABC):
     delay: int
 
 
+@_slotted
 @dataclass
 class Sentence(BotMessage):
     text: I18nText
@@ -207,7 +266,7 @@ class Sentence(BotMessage):
                  delay: int = 0):
         self.text = text
         self.suggestions = suggestions
-        super().__init__(delay)
+        BotMessage.__init__(self, delay)
 
     class Builder:
 
@@ -263,18 +322,21 @@ class AttachmentType(Enum):
     FILE = "file"
 
 
+@_slotted
 @dataclass
 class Attachment:
     url: str
     type: Optional[AttachmentType]
 
 
+@_slotted
 @dataclass
 class Action:
     title: I18nText
     url: Optional[str]
 
 
+@_slotted
 @dataclass
 class Card(BotMessage):
     title: Optional[I18nText]
@@ -293,7 +355,7 @@ class Card(BotMessage):
         self.sub_title = sub_title
         self.attachment = attachment
         self.actions = actions
-        super().__init__(delay)
+        BotMessage.__init__(self, delay)
 
     class Builder:
 
@@ -357,6 +419,7 @@ class Card(BotMessage):
             )
 
 
+@_slotted
 @dataclass
 class Carousel(BotMessage):
     cards: List[Card]
@@ -364,7 +427,7 @@ class Carousel(BotMessage):
 
     def __init__(self, cards: List[Card], delay: int = 0):
         self.cards = cards
-        super().__init__(delay)
+        BotMessage.__init__(self, delay)
 
     class Builder:
 
@@ -383,12 +446,28 @@ class Carousel(BotMessage):
             )
 
 
+@_slotted
+@dataclass
+class RawBotMessage(BotMessage):
+    """
+    A bot message already serialized, sent as it is
+    """
+    data: dict
+    delay: int
+
+    def __init__(self, data: dict):
+        self.data = data
+        BotMessage.__init__(self, data.get("delay", 0))
+
+
+@_slotted
 @dataclass
 class ResponseContext:
     request_id: str
     date: datetime
 
 
+@_slotted
 @dataclass
 class BotRequest:
     intent: IntentName
@@ -397,7 +476,12 @@ class BotRequest:
     story_id: str
     context: RequestContext = None
 
+    @property
+    def user_id(self) -> Optional[UserId]:
+        return self.context.user_id if self.context is not None else None
+
 
+@_slotted
 @dataclass
 class BotResponse:
     messages: List[BotMessage]
@@ -407,6 +491,7 @@ class BotResponse:
     entities: List[Entity]
 
 
+@_slotted
 @dataclass
 class StepConfiguration:
     main_intent: IntentName
@@ -415,6 +500,7 @@ class StepConfiguration:
     secondary_intents: List[IntentName]
 
 
+@_slotted
 @dataclass
 class StoryConfiguration:
     main_intent: IntentName
@@ -424,11 +510,13 @@ class StoryConfiguration:
     steps: List[StepConfiguration]
 
 
+@_slotted
 @dataclass
 class ClientConfiguration:
     stories: List[StoryConfiguration]
 
 
+@_slotted
 @dataclass
 class TockMessage:
     request_id: str = uuid.uuid4()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+    The ``response_cache`` module
+    ======================
+
+    Serialized answers of cacheable stories, reused for the same intent, entities and language.
+
+    :Example:
+
+    >>> from tock.bot import TockBot
+    >>> from tock.story import story
+    >>> @story(intent="greetings", cacheable=True)
+    ... def greetings(bus):
+    ...     bus.send("hello")
+    >>> bot = TockBot().register_story(greetings).use_response_cache(max_size=1000)
+
+"""
+import json
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Hashable, List, Optional, Tuple
+
+from tock.codec import LazyEntity
+from tock.models import BotRequest, Entity, RawBotMessage
+
+
+@dataclass
+class ResponseCacheStats:
+    size: int = 0
+    hits: int = 0
+    misses: int = 0
+
+
+class ResponseCache:
+    """
+    Least recently used serialized messages, by story and request key
+
+    :param max_size: least recently used answers are evicted above this count
+    """
+
+    def __init__(self, max_size: int = 1000):
+        self.__max_size = max_size
+        self.__messages: OrderedDict = OrderedDict()
+        self.__stats = ResponseCacheStats()
+
+    @staticmethod
+    def key(story_name: str, request: BotRequest) -> Tuple[Hashable, ...]:
+        """
+        Returns the key of the answer of a story to a request: its intent, entities with their values, and language
+
+        Entity values not decoded yet are keyed by their JSON, so they are not decoded.
+        """
+        language = request.context.language if request.context is not None else None
+        entities = tuple((entity.type, entity.role, entity.content, _value_key(entity)) for entity in request.entities)
+        return story_name, request.intent, entities, language
+
+    def get(self, key: Tuple[Hashable, ...]) -> Optional[List[RawBotMessage]]:
+        messages = self.__messages.get(key)
+        if messages is None:
+            self.__stats.misses += 1
+            return None
+        self.__messages.move_to_end(key)
+        self.__stats.hits += 1
+        return messages
+
+    def put(self, key: Tuple[Hashable, ...], messages: List[RawBotMessage]):
+        self.__messages[key] = messages
+        self.__messages.move_to_end(key)
+        while len(self.__messages) > self.__max_size:
+            self.__messages.popitem(last=False)
+
+    @property
+    def stats(self) -> ResponseCacheStats:
+        return replace(self.__stats, size=len(self.__messages))
+
+    def __len__(self) -> int:
+        return len(self.__messages)
+
+
+def _value_key(entity: Entity) -> Optional[str]:
+    raw = entity.raw if isinstance(entity, LazyEntity) else None
+    if raw is not None:
+        value = raw.get("value")
+        return None if value is None else json.dumps(value, sort_keys=True)
+    return None if entity.value is None else repr(entity.value)
@@ -10,7 +10,7 @@ from tock.models import TockMessage, BotRequest, User, UserId, ConnectorType, \
     Attachment, Action, Carousel, StoryConfiguration, \
     StepConfiguration, ClientConfiguration, StringValue, DurationValue, Candidate, DistanceValue, AmountOfMoneyValue, \
     TemperatureValue, TemperatureUnit, DateGrain, DateIntervalEntityValue, DateEntityValue, EmailValue, \
-    NumberValue, OrdinalValue, PhoneNumberValue, UrlValue, VolumeValue
+    NumberValue, OrdinalValue, PhoneNumberValue, UrlValue, VolumeValue, RawBotMessage
 
 
 def camelcase(s):
@@ -371,6 +371,13 @@ class CarouselSchema(BotMessageSchema):
 class UberBotMessageSchema(OneOfSchema):
     type_field = "type"
     type_schemas = {"sentence": SentenceSchema, "card": CardSchema, "carousel": CarouselSchema}
+    # already serialized messages, dumped as they are
+    raw_types = (RawBotMessage,)
+
+    def _dump(self, obj, **kwargs):
+        if isinstance(obj, self.raw_types):
+            return obj.data
+        return super()._dump(obj, **kwargs)
 
     def get_obj_type(self, obj):
         if isinstance(obj, Sentence):
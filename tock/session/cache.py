@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import threading
+from typing import Dict, FrozenSet, Optional, Tuple, Union
+
+from tock.session.codec import PickleSessionCodec, SessionCodec
+from tock.session.memory import MemoryStorage, MemoryStorageStats
+from tock.session.storage import AsyncStorage, ExecutorStorageAdapter, Storage
+from tock.session.session import Session
+from tock.models import UserId
+
+
+class WriteBehindStorage(Storage):
+    """
+    Keep saved sessions in memory and write them to the wrapped storage later
+
+    A saved session is encoded with ``codec`` right away, and that snapshot is
+    written later, so changes made to the session meanwhile are not written half
+    done. Sessions are flushed every ``flush_interval`` seconds, or as soon as
+    ``max_dirty`` sessions are waiting, so a user saved several times between two
+    flushes is written once. Sessions waiting to be written and the last
+    ``max_clean`` flushed sessions are served from memory, the others are read
+    from the wrapped storage. ``close`` flushes the remaining sessions.
+    Sessions must only be saved through this storage.
+
+    :param storage: the storage sessions are written to
+    :param flush_interval: seconds between two flushes
+    :param max_dirty: count of waiting sessions triggering a flush
+    :param max_clean: count of flushed sessions kept in memory, least recently used are evicted
+    :param codec: serialization of the snapshots, pickle by default
+    """
+    fork_safe = False
+
+    def __init__(self,
+                 storage: Storage,
+                 flush_interval: float = 1.0,
+                 max_dirty: int = 1000,
+                 max_clean: int = 10000,
+                 codec: Optional[SessionCodec] = None):
+        self.__logger: logging.Logger = logging.getLogger(__name__)
+        self.__storage = storage
+        self.__flush_interval = flush_interval
+        self.__max_dirty = max_dirty
+        self.__codec = codec if codec is not None else PickleSessionCodec()
+        self.__condition = threading.Condition()
+        self.__flush_lock = threading.Lock()
+        # session, snapshot and changes of the sessions waiting to be written, by user id
+        self.__dirty: Dict[str, Tuple[Session, bytes, FrozenSet[str]]] = {}
+        self.__flushing: Dict[str, Tuple[Session, bytes, FrozenSet[str]]] = {}
+        self.__clean = MemoryStorage(max_sessions=max_clean)
+        self.__closed = False
+        self.__flusher = threading.Thread(target=self.__flush_loop, name="tock-write-behind", daemon=True)
+        self.__flusher.start()
+
+    def get_session(self, user_id: UserId) -> Session:
+        with self.__condition:
+            entry = self.__dirty.get(user_id.id) or self.__flushing.get(user_id.id)
+            session = entry[0] if entry is not None else self.__clean.find_session(user_id)
+        if session is not None:
+            return session
+        return self.__storage.get_session(user_id)
+
+    def save(self, session: Session):
+        changes = session.pop_changes()
+        if not changes:
+            return
+        try:
+            # the caller owns the session until it returns, later changes are not in the snapshot
+            snapshot = self.__codec.dumps(session)
+        except Exception:
+            session.mark_changed(*changes)
+            raise
+        with self.__condition:
+            previous = self.__dirty.get(session.user_id.id)
+            if previous is not None:
+                changes = changes | previous[2]
+            self.__dirty[session.user_id.id] = (session, snapshot, changes)
+            if len(self.__dirty) >= self.__max_dirty:
+                self.__condition.notify_all()
+
+    def flush(self):
+        with self.__flush_lock:
+            with self.__condition:
+                self.__flushing, self.__dirty = self.__dirty, {}
+            for user_id, (session, snapshot, changes) in self.__flushing.items():
+                try:
+                    written = self.__codec.loads(snapshot)
+                    written.mark_changed(*changes)
+                    self.__storage.save(written)
+                except Exception:
+                    self.__logger.exception("Unable to save session of %s", user_id)
+                    with self.__condition:
+                        self.__dirty.setdefault(user_id, (session, snapshot, changes))
+                    continue
+                with self.__condition:
+                    if user_id not in self.__dirty:
+                        self.__clean.put(session)
+            with self.__condition:
+                self.__flushing = {}
+
+    @property
+    def stats(self) -> MemoryStorageStats:
+        """
+        Returns the stats of the flushed sessions kept in memory
+        """
+        with self.__condition:
+            return self.__clean.stats
+
+    def close(self):
+        with self.__condition:
+            if self.__closed:
+                return
+            self.__closed = True
+            self.__condition.notify_all()
+        self.__flusher.join()
+        self.flush()
+        self.__storage.close()
+
+    def __flush_loop(self):
+        while True:
+            with self.__condition:
+                if not self.__closed and len(self.__dirty) < self.__max_dirty:
+                    self.__condition.wait(self.__flush_interval)
+                if self.__closed:
+                    return
+            self.flush()
+
+
+class TieredStorage(Storage):
+    """
+    Serve recently used sessions from memory, read the others from a persistent storage
+
+    Saved sessions are written to the persistent storage right away, or by a
+    WriteBehindStorage with ``write_back``, and kept in memory. The memory tier
+    is bounded like a MemoryStorage, its hit rate is given by ``stats``.
+    Sessions must only be saved through this storage.
+
+    :param storage: the persistent storage
+    :param max_sessions: least recently used sessions are evicted from memory above this count
+    :param ttl: sessions idle for more than ttl seconds are evicted from memory
+    :param write_back: write saved sessions in batches instead of on each save
+    :param flush_interval: seconds between two batches, with ``write_back``
+    :param max_dirty: count of waiting sessions triggering a batch, with ``write_back``
+    """
+
+    def __init__(self,
+                 storage: Storage,
+                 max_sessions: int = 10000,
+                 ttl: Optional[float] = None,
+                 write_back: bool = False,
+                 flush_interval: float = 1.0,
+                 max_dirty: int = 1000):
+        self.__memory = MemoryStorage(max_sessions=max_sessions, ttl=ttl)
+        # the memory tier already keeps the flushed sessions
+        self.__storage = WriteBehindStorage(storage, flush_interval, max_dirty, max_clean=0) if write_back \
+            else storage
+        self.__lock = threading.Lock()
+
+    @property
+    def fork_safe(self) -> bool:
+        return self.__storage.fork_safe
+
+    def get_session(self, user_id: UserId) -> Session:
+        with self.__lock:
+            session = self.__memory.find_session(user_id)
+        if session is not None:
+            return session
+        session = self.__storage.get_session(user_id)
+        with self.__lock:
+            self.__memory.put(session)
+        return session
+
+    def save(self, session: Session):
+        if not session.changes:
+            return
+        # the persistent storage marks the session as saved
+        self.__storage.save(session)
+        with self.__lock:
+            self.__memory.put(session)
+
+    def flush(self):
+        if isinstance(self.__storage, WriteBehindStorage):
+            self.__storage.flush()
+
+    @property
+    def stats(self) -> MemoryStorageStats:
+        with self.__lock:
+            return self.__memory.stats
+
+    def close(self):
+        self.__storage.close()
+
+
+class AsyncTieredStorage(AsyncStorage):
+    """
+    TieredStorage in front of an AsyncStorage, for persistent storages which must not block the event loop
+
+    Sessions found in memory are returned without leaving the event loop, misses
+    and saves await the persistent storage. Concurrent misses of a user read the
+    persistent storage once. A sync storage is called on the default executor.
+    Sessions must only be saved through this storage, from the event loop.
+
+    :param storage: the persistent storage
+    :param max_sessions: least recently used sessions are evicted from memory above this count
+    :param ttl: sessions idle for more than ttl seconds are evicted from memory
+    """
+
+    def __init__(self,
+                 storage: Union[Storage, AsyncStorage],
+                 max_sessions: int = 10000,
+                 ttl: Optional[float] = None):
+        self.__memory = MemoryStorage(max_sessions=max_sessions, ttl=ttl)
+        self.__storage: AsyncStorage = storage if isinstance(storage, AsyncStorage) \
+            else ExecutorStorageAdapter(storage)
+        # pending reads of the persistent storage, by user id
+        self.__loading: Dict[str, asyncio.Task] = {}
+
+    @property
+    def fork_safe(self) -> bool:
+        return self.__storage.fork_safe
+
+    async def get_session(self, user_id: UserId) -> Session:
+        session = self.__memory.find_session(user_id)
+        if session is not None:
+            return session
+        loading = self.__loading.get(user_id.id)
+        if loading is None:
+            loading = asyncio.ensure_future(self.__load(user_id))
+            self.__loading[user_id.id] = loading
+        # a cancelled caller does not cancel the read awaited by the others
+        return await asyncio.shield(loading)
+
+    async def save(self, session: Session):
+        if not session.changes:
+            return
+        # a pending read of the user must not replace the saved session in memory
+        self.__loading.pop(session.user_id.id, None)
+        self.__memory.put(session)
+        await self.__storage.save(session)
+
+    @property
+    def stats(self) -> MemoryStorageStats:
+        return self.__memory.stats
+
+    async def close(self):
+        await self.__storage.close()
+
+    async def __load(self, user_id: UserId) -> Session:
+        try:
+            session = await self.__storage.get_session(user_id)
+        finally:
+            current = self.__loading.get(user_id.id) is asyncio.current_task()
+            if current:
+                del self.__loading[user_id.id]
+        if current:
+            self.__memory.put(session)
+        return session
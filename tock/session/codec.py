@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+    The ``codec`` module
+    ======================
+
+    Serialization of sessions by the storages writing them to disk or to a database.
+
+    :Example:
+
+    >>> from tock.session.codec import CompactSessionCodec
+    >>> from tock.session.file import FileStorage
+    >>> storage = FileStorage("./sessions", codec=CompactSessionCodec())
+
+"""
+import abc
+import pickle
+import zlib
+from typing import BinaryIO, Optional
+
+from tock.codec import Codec, LazyEntity
+from tock.intent import Intent
+from tock.json_backend import JsonBackend, json_backend
+from tock.models import Entity, PlayerType, UserId
+from tock.schemas import EntitySchema
+from tock.session.session import Session
+
+FORMAT_VERSION = 1
+FLAG_ZLIB = 0x01
+
+
+class SessionCodec(abc.ABC):
+    """
+    Turns sessions into bytes and back, a loaded session has no changes
+
+    ``extension`` is the suffix of the session files written with this codec.
+    """
+    extension: str
+
+    @abc.abstractmethod
+    def dumps(self, session: Session) -> bytes:
+        pass
+
+    @abc.abstractmethod
+    def loads(self, data: bytes) -> Session:
+        pass
+
+    def dump(self, session: Session, file: BinaryIO):
+        file.write(self.dumps(session))
+
+    def load(self, file: BinaryIO) -> Session:
+        return self.loads(file.read())
+
+
+class PickleSessionCodec(SessionCodec):
+    """
+    Pickle the whole session, items can be any picklable value
+
+    Only load sessions written by a trusted process: unpickling can run arbitrary code.
+    """
+    extension = '.pkl'
+
+    def dumps(self, session: Session) -> bytes:
+        return pickle.dumps(session)
+
+    def loads(self, data: bytes) -> Session:
+        return pickle.loads(data)
+
+    def dump(self, session: Session, file: BinaryIO):
+        pickle.dump(session, file)
+
+    def load(self, file: BinaryIO) -> Session:
+        return pickle.load(file)
+
+
+class CompactSessionCodec(SessionCodec):
+    """
+    Write the fields, entities and items of sessions as versioned JSON
+
+    A session is a format version byte, a flags byte then its JSON, compressed with
+    zlib when it is at least ``compress_threshold`` bytes long. Entities are written
+    as in Tock messages, lazy entities not decoded as the JSON they were loaded from,
+    and are read back as lazy entities. Items must be JSON values: tuples are read
+    back as lists, other values raise a TypeError when the session is saved.
+
+    :param compress_threshold: minimum size of the compressed sessions, None to never compress
+    :param compress_level: zlib compression level
+    :param json: JSON backend, the fastest installed one by default
+    """
+    extension = '.session'
+
+    def __init__(self,
+                 compress_threshold: Optional[int] = 1024,
+                 compress_level: int = 6,
+                 json: Optional[JsonBackend] = None):
+        self.__compress_threshold = compress_threshold
+        self.__compress_level = compress_level
+        self.__json = json if json is not None else json_backend()
+        self.__entities = Codec(EntitySchema)
+
+    def dumps(self, session: Session) -> bytes:
+        user_id: UserId = session.user_id
+        previous_intent: Optional[Intent] = session.previous_intent
+        body = self.__json.dumps([
+            [user_id.id, user_id.type.value, user_id.client_id],
+            session.current_story,
+            previous_intent.name if previous_intent is not None else None,
+            [self.__dump_entity(entity) for entity in session.entities],
+            session.items,
+        ])
+        if self.__compress_threshold is not None and len(body) >= self.__compress_threshold:
+            return bytes((FORMAT_VERSION, FLAG_ZLIB)) + zlib.compress(body, self.__compress_level)
+        return bytes((FORMAT_VERSION, 0)) + body
+
+    def loads(self, data: bytes) -> Session:
+        if len(data) < 2 or data[0] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported session format {data[0] if data else None}")
+        body = data[2:]
+        if data[1] & FLAG_ZLIB:
+            body = zlib.decompress(body)
+        user_id, current_story, previous_intent, entities, items = self.__json.loads(body)
+        session = Session(
+            user_id=UserId(id=user_id[0], type=PlayerType(user_id[1]), client_id=user_id[2]),
+            current_story=current_story,
+            previous_intent=Intent(previous_intent) if previous_intent is not None else None,
+            entities=[LazyEntity.from_json(entity) for entity in entities]
+        )
+        for key, item in items.items():
+            session.set_item(key, item)
+        session.pop_changes()
+        return session
+
+    def __dump_entity(self, entity: Entity) -> dict:
+        raw = entity.raw if entity.__class__ is LazyEntity else None
+        return raw if raw is not None else self.__entities.dump(entity)
@@ -1,31 +1,154 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import os
-import pickle
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Optional, Set
 
-from tock.session.storage import Storage
+from tock.session.codec import SessionCodec, PickleSessionCodec
+from tock.session.storage import Storage, ExecutorStorageAdapter
 from tock.session.session import Session
 from tock.models import UserId
 
 
 class FileStorage(Storage):
-    def __init__(self, basepath: str = './'):
+    def __init__(self, basepath: str = './', codec: Optional[SessionCodec] = None):
         self.__basepath = basepath
+        self.__codec = codec if codec is not None else PickleSessionCodec()
 
     def get_session(self, user_id: UserId) -> Session:
         filename = self.__filename(user_id)
         if os.path.isfile(filename):
             with open(filename, 'rb') as f:
-                session = pickle.load(f)
+                session = self.__codec.load(f)
             return session
         else:
             return Session(user_id)
 
     def save(self, session: Session):
-        if not os.path.exists(self.__basepath):
-            os.makedirs(self.__basepath)
-        user_file = self.__filename(session.user_id)
-        with open(user_file, "wb") as f:
-            pickle.dump(session, f)
+        changes = session.pop_changes()
+        if not changes:
+            return
+        try:
+            if not os.path.exists(self.__basepath):
+                os.makedirs(self.__basepath)
+            user_file = self.__filename(session.user_id)
+            with open(user_file, "wb") as f:
+                self.__codec.dump(session, f)
+        except Exception:
+            session.mark_changed(*changes)
+            raise
 
     def __filename(self, user_id: UserId):
-        return self.__basepath + '/' + user_id.id + '.pkl'
+        return self.__basepath + '/' + user_id.id + self.__codec.extension
+
+
+class ShardedFileStorage(Storage):
+    """
+    Keep sessions in files spread over hashed subdirectories
+
+    A session is written to a temporary file then renamed, so a crash never
+    leaves a torn session file. With ``negative_cache``, the file names of the
+    last ``max_listings`` subdirectories read are kept in memory, and updated on
+    save: users without a session file in a listed subdirectory get a new session
+    without touching the disk. Sessions saved meanwhile by another process are
+    not seen: only enable it when this storage is the only writer of ``basepath``,
+    which is not the case of webhook workers sharing it.
+
+    :param basepath: directory of the sessions
+    :param levels: count of subdirectory levels, 256 subdirectories each
+    :param negative_cache: answer the users without a session file from subdirectory listings
+    :param max_listings: count of subdirectory listings kept
+    :param fsync: flush session files to disk before renaming them
+    :param codec: serialization of the sessions, pickle by default
+    """
+
+    def __init__(self,
+                 basepath: str = './sessions',
+                 levels: int = 2,
+                 negative_cache: bool = False,
+                 max_listings: int = 1024,
+                 fsync: bool = False,
+                 codec: Optional[SessionCodec] = None):
+        self.__basepath = basepath
+        self.__codec = codec if codec is not None else PickleSessionCodec()
+        self.__levels = levels
+        self.__negative_cache = negative_cache
+        self.__max_listings = max_listings
+        self.__fsync = fsync
+        self.__lock = threading.Lock()
+        self.__directories: Set[str] = set()
+        # file names by subdirectory, least recently read first
+        self.__listings: OrderedDict = OrderedDict()
+
+    def get_session(self, user_id: UserId) -> Session:
+        directory, name = self.__path(user_id)
+        if self.__negative_cache and name not in self.__listing(directory):
+            return Session(user_id)
+        try:
+            with open(os.path.join(directory, name), 'rb') as f:
+                return self.__codec.load(f)
+        except FileNotFoundError:
+            return Session(user_id)
+
+    def save(self, session: Session):
+        changes = session.pop_changes()
+        if not changes:
+            return
+        directory, name = self.__path(session.user_id)
+        temporary = os.path.join(directory, f"{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            if directory not in self.__directories:
+                os.makedirs(directory, exist_ok=True)
+                with self.__lock:
+                    self.__directories.add(directory)
+            try:
+                with open(temporary, 'wb') as f:
+                    self.__codec.dump(session, f)
+                    if self.__fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+                os.replace(temporary, os.path.join(directory, name))
+            except BaseException:
+                if os.path.exists(temporary):
+                    os.remove(temporary)
+                raise
+        except Exception:
+            session.mark_changed(*changes)
+            raise
+        if self.__negative_cache:
+            with self.__lock:
+                listing = self.__listings.get(directory)
+                if listing is not None:
+                    listing.add(name)
+
+    def __listing(self, directory: str) -> Set[str]:
+        # listed under the lock, so a save running meanwhile is not missing from the listing
+        with self.__lock:
+            listing = self.__listings.get(directory)
+            if listing is None:
+                try:
+                    listing = set(os.listdir(directory))
+                except FileNotFoundError:
+                    listing = set()
+                self.__listings[directory] = listing
+                while len(self.__listings) > self.__max_listings:
+                    self.__listings.popitem(last=False)
+            else:
+                self.__listings.move_to_end(directory)
+            return listing
+
+    def __path(self, user_id: UserId):
+        digest = hashlib.sha1(user_id.id.encode('utf-8')).hexdigest()
+        shards = [digest[2 * level:2 * level + 2] for level in range(self.__levels)]
+        return os.path.join(self.__basepath, *shards), digest + self.__codec.extension
+
+
+class AsyncFileStorage(ExecutorStorageAdapter):
+    """
+    FileStorage doing its disk I/O on an executor
+    """
+
+    def __init__(self, basepath: str = './', executor: Optional[Executor] = None, codec: Optional[SessionCodec] = None):
+        super().__init__(FileStorage(basepath, codec), executor)
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+    The ``log`` module
+    ======================
+
+    Session storage appending saved sessions to segment files.
+
+    :Example:
+
+    >>> from tock.bot import TockBot
+    >>> from tock.session.log import LogStructuredStorage
+    >>> bot = TockBot().use_storage(LogStructuredStorage("./sessions"))
+
+"""
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from tock.session.codec import SessionCodec, PickleSessionCodec
+from tock.session.storage import Storage
+from tock.session.session import Session
+from tock.models import UserId
+
+# crc32 of key and value, key length, value length
+RECORD_HEADER = struct.Struct('<IHI')
+# key length, value offset, value length, record length
+HINT_HEADER = struct.Struct('<HIII')
+SEGMENT_SUFFIX = '.log'
+HINT_SUFFIX = '.hint'
+COMPACT_SUFFIX = '.compact'
+
+# segment, value offset, value length, record length
+Location = Tuple[int, int, int, int]
+
+
+@dataclass
+class LogStructuredStats:
+    size: int = 0
+    segments: int = 0
+    live_bytes: int = 0
+    dead_bytes: int = 0
+    compactions: int = 0
+
+
+class LogStructuredStorage(Storage):
+    """
+    Append saved sessions to segment files, an in-memory index gives the last record of each user
+
+    A save is a single append to the active segment, rolled over above ``max_segment_size``
+    bytes. Sealed segments get a hint file listing their records, so the index is rebuilt
+    on startup from the hint files and a scan of the active segment only. A torn record at
+    the end of the active segment is truncated. Sealed segments whose share of replaced
+    records reaches ``compaction_threshold`` are rewritten by a background thread every
+    ``compaction_interval`` seconds, or when ``compact`` is called.
+    Must be the only process using ``directory``.
+
+    :param directory: directory of the segment files
+    :param max_segment_size: size in bytes above which a new segment is started
+    :param compaction_threshold: share of dead bytes from which a sealed segment is compacted
+    :param compaction_interval: seconds between two compactions, None to only compact on demand
+    :param fsync: flush each record to disk before returning from ``save``
+    :param codec: serialization of the sessions, pickle by default
+    """
+    fork_safe = False
+
+    def __init__(self,
+                 directory: str = './sessions',
+                 max_segment_size: int = 64 * 1024 * 1024,
+                 compaction_threshold: float = 0.5,
+                 compaction_interval: Optional[float] = 60.0,
+                 fsync: bool = False,
+                 codec: Optional[SessionCodec] = None):
+        self.__logger: logging.Logger = logging.getLogger(__name__)
+        self.__directory = directory
+        self.__max_segment_size = max_segment_size
+        self.__compaction_threshold = compaction_threshold
+        self.__compaction_interval = compaction_interval
+        self.__fsync = fsync
+        self.__codec = codec if codec is not None else PickleSessionCodec()
+        self.__lock = threading.Lock()
+        self.__compaction_lock = threading.Lock()
+        self.__index: Dict[str, Location] = {}
+        # read file descriptors, total and live bytes by segment
+        self.__readers: Dict[int, int] = {}
+        self.__sizes: Dict[int, int] = {}
+        self.__live: Dict[int, int] = {}
+        self.__active = 0
+        self.__writer = -1
+        self.__compactions = 0
+        self.__closed = False
+        self.__stopped = threading.Event()
+
+        os.makedirs(directory, exist_ok=True)
+        self.__open()
+        self.__compactor: Optional[threading.Thread] = None
+        if compaction_interval is not None:
+            self.__compactor = threading.Thread(target=self.__compaction_loop, name="tock-log-compaction",
+                                                daemon=True)
+            self.__compactor.start()
+
+    def get_session(self, user_id: UserId) -> Session:
+        with self.__lock:
+            location = self.__index.get(user_id.id)
+            if location is None:
+                return Session(user_id)
+            segment, offset, length, _ = location
+            data = os.pread(self.__readers[segment], length, offset)
+        return self.__codec.loads(data)
+
+    def save(self, session: Session):
+        changes = session.pop_changes()
+        if not changes:
+            return
+        try:
+            key = session.user_id.id.encode('utf-8')
+            value = self.__codec.dumps(session)
+            record = RECORD_HEADER.pack(zlib.crc32(value, zlib.crc32(key)), len(key), len(value)) + key + value
+            with self.__lock:
+                if self.__closed:
+                    raise RuntimeError("storage is closed")
+                if self.__sizes[self.__active] + len(record) > self.__max_segment_size \
+                        and self.__sizes[self.__active] > 0:
+                    self.__roll()
+                offset = self.__sizes[self.__active]
+                os.write(self.__writer, record)
+                if self.__fsync:
+                    os.fsync(self.__writer)
+                self.__sizes[self.__active] += len(record)
+                self.__put(session.user_id.id,
+                           (self.__active, offset + RECORD_HEADER.size + len(key), len(value), len(record)))
+        except Exception:
+            session.mark_changed(*changes)
+            raise
+
+    def compact(self) -> int:
+        """
+        Rewrite the sealed segments holding enough dead records, returns the count of compacted segments
+        """
+        with self.__compaction_lock:
+            with self.__lock:
+                if self.__closed:
+                    return 0
+                segments = [segment for segment, size in self.__sizes.items()
+                            if segment != self.__active and size > 0
+                            and (size - self.__live[segment]) / size >= self.__compaction_threshold]
+                if not segments:
+                    return 0
+                target = max(segments)
+                readers = {segment: self.__readers[segment] for segment in segments}
+                entries = [(key, location) for key, location in self.__index.items() if location[0] in readers]
+
+            # sealed segments are only changed by compactions, they are read without the lock
+            moved: List[Tuple[str, Location, Location]] = []
+            with open(self.__path(target, COMPACT_SUFFIX), 'wb') as f:
+                offset = 0
+                for key, location in entries:
+                    segment, value_offset, length, record_length = location
+                    record = os.pread(readers[segment], record_length, value_offset + length - record_length)
+                    f.write(record)
+                    moved.append((key, location, (target, offset + record_length - length, length, record_length)))
+                    offset += record_length
+                f.flush()
+                os.fsync(f.fileno())
+
+            with self.__lock:
+                self.__remove(self.__path(target, HINT_SUFFIX))
+                os.replace(self.__path(target, COMPACT_SUFFIX), self.__path(target, SEGMENT_SUFFIX))
+                for segment in segments:
+                    os.close(self.__readers.pop(segment))
+                    del self.__sizes[segment]
+                    del self.__live[segment]
+                if moved:
+                    self.__readers[target] = os.open(self.__path(target, SEGMENT_SUFFIX), os.O_RDONLY)
+                    self.__sizes[target] = offset
+                    self.__live[target] = 0
+                live: List[Tuple[str, Location]] = []
+                for key, old, new in moved:
+                    # sessions saved during the compaction keep their newer record
+                    if self.__index.get(key) == old:
+                        self.__index[key] = new
+                        self.__live[target] += new[3]
+                        live.append((key, new))
+                self.__compactions += 1
+            for segment in segments:
+                if segment != target or not moved:
+                    self.__remove(self.__path(segment, SEGMENT_SUFFIX))
+                    self.__remove(self.__path(segment, HINT_SUFFIX))
+            if moved:
+                self.__write_hint(target, live)
+            return len(segments)
+
+    @property
+    def stats(self) -> LogStructuredStats:
+        with self.__lock:
+            size = sum(self.__sizes.values())
+            live = sum(self.__live.values())
+            return LogStructuredStats(size=len(self.__index), segments=len(self.__sizes), live_bytes=live,
+                                      dead_bytes=size - live, compactions=self.__compactions)
+
+    def close(self):
+        self.__stopped.set()
+        if self.__compactor is not None:
+            self.__compactor.join()
+        with self.__compaction_lock, self.__lock:
+            if self.__closed:
+                return
+            self.__closed = True
+            os.close(self.__writer)
+            for reader in self.__readers.values():
+                os.close(reader)
+
+    def __open(self):
+        segments = []
+        for name in os.listdir(self.__directory):
+            if name.endswith(COMPACT_SUFFIX):
+                # interrupted compaction, its segments are still there
+                self.__remove(os.path.join(self.__directory, name))
+            elif name.endswith(SEGMENT_SUFFIX):
+                segments.append(int(name[:-len(SEGMENT_SUFFIX)]))
+        segments.sort()
+        if not segments:
+            segments.append(0)
+        self.__active = segments[-1]
+        self.__remove(self.__path(self.__active, HINT_SUFFIX))
+        for segment in segments:
+            self.__readers[segment] = os.open(self.__path(segment, SEGMENT_SUFFIX), os.O_RDONLY | os.O_CREAT, 0o644)
+            self.__live[segment] = 0
+            if os.path.exists(self.__path(segment, HINT_SUFFIX)):
+                self.__sizes[segment] = os.path.getsize(self.__path(segment, SEGMENT_SUFFIX))
+                locations = self.__read_hint(segment)
+            else:
+                locations = self.__scan(segment)
+            for key, location in locations:
+                self.__put(key, location)
+        self.__writer = os.open(self.__path(self.__active, SEGMENT_SUFFIX), os.O_WRONLY | os.O_APPEND)
+
+    def __scan(self, segment: int) -> Iterator[Tuple[str, Location]]:
+        path = self.__path(segment, SEGMENT_SUFFIX)
+        size = os.path.getsize(path)
+        offset = 0
+        if size > 0:
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                while offset + RECORD_HEADER.size <= size:
+                    crc, key_length, value_length = RECORD_HEADER.unpack_from(data, offset)
+                    key_offset = offset + RECORD_HEADER.size
+                    end = key_offset + key_length + value_length
+                    if end > size or zlib.crc32(data[key_offset:end]) != crc:
+                        break
+                    key = data[key_offset:key_offset + key_length].decode('utf-8')
+                    yield key, (segment, key_offset + key_length, value_length, end - offset)
+                    offset = end
+        if offset < size:
+            self.__logger.warning("Truncating segment %d after %d bytes, its last record is incomplete",
+                                  segment, offset)
+            os.truncate(path, offset)
+        self.__sizes[segment] = offset
+
+    def __read_hint(self, segment: int) -> Iterator[Tuple[str, Location]]:
+        with open(self.__path(segment, HINT_SUFFIX), 'rb') as f:
+            data = f.read()
+        offset = 0
+        while offset < len(data):
+            key_length, value_offset, value_length, record_length = HINT_HEADER.unpack_from(data, offset)
+            offset += HINT_HEADER.size
+            key = data[offset:offset + key_length].decode('utf-8')
+            offset += key_length
+            yield key, (segment, value_offset, value_length, record_length)
+
+    def __write_hint(self, segment: int, locations: List[Tuple[str, Location]]):
+        path = self.__path(segment, HINT_SUFFIX)
+        with open(path + COMPACT_SUFFIX, 'wb') as f:
+            for key, (_, value_offset, value_length, record_length) in locations:
+                encoded = key.encode('utf-8')
+                f.write(HINT_HEADER.pack(len(encoded), value_offset, value_length, record_length) + encoded)
+        os.replace(path + COMPACT_SUFFIX, path)
+
+    def __roll(self):
+        sealed = self.__active
+        os.close(self.__writer)
+        self.__active = max(self.__sizes) + 1
+        self.__writer = os.open(self.__path(self.__active, SEGMENT_SUFFIX),
+                                os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.__readers[self.__active] = os.open(self.__path(self.__active, SEGMENT_SUFFIX), os.O_RDONLY)
+        self.__sizes[self.__active] = 0
+        self.__live[self.__active] = 0
+        self.__write_hint(sealed, [(key, location) for key, location in self.__index.items()
+                                   if location[0] == sealed])
+
+    def __put(self, key: str, location: Location):
+        previous = self.__index.get(key)
+        if previous is not None:
+            self.__live[previous[0]] -= previous[3]
+        self.__index[key] = location
+        self.__live[location[0]] += location[3]
+
+    def __compaction_loop(self):
+        while not self.__stopped.wait(self.__compaction_interval):
+            try:
+                self.compact()
+            except Exception:
+                self.__logger.exception("Unable to compact session segments")
+
+    def __path(self, segment: int, suffix: str) -> str:
+        return os.path.join(self.__directory, f"{segment:08d}{suffix}")
+
+    @staticmethod
+    def __remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
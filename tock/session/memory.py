@@ -1,24 +1,112 @@
 # -*- coding: utf-8 -*-
-from typing import List
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from time import monotonic
+from typing import Optional, Tuple, List
 
 from tock.session.storage import Storage
 from tock.session.session import Session
 from tock.models import UserId
 
 
+@dataclass
+class MemoryStorageStats:
+    size: int = 0
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
 class MemoryStorage(Storage):
-    def __init__(self):
-        self.__sessions: List[Session] = []
+    """
+    Keep sessions in memory, by user id
 
-    def get_session(self, user_id: UserId) -> Session:
-        for session in self.__sessions:
-            if session.user_id == user_id:
-                return session
+    :param max_sessions: least recently used sessions are evicted above this count
+    :param ttl: sessions idle for more than ttl seconds are expired
+    """
 
-        return Session(user_id)
+    def __init__(self, max_sessions: Optional[int] = None, ttl: Optional[float] = None):
+        self.__max_sessions = max_sessions
+        self.__ttl = ttl
+        # least recently used first, values are [session, last access time]
+        self.__sessions: OrderedDict = OrderedDict()
+        self.__stats = MemoryStorageStats()
+
+    def find_session(self, user_id: UserId) -> Optional[Session]:
+        key = self.__key(user_id)
+        entry: Optional[List] = self.__sessions.get(key)
+        if entry is None:
+            self.__stats.misses += 1
+            return None
+
+        now = monotonic()
+        if self.__ttl is not None and now - entry[1] > self.__ttl:
+            del self.__sessions[key]
+            self.__stats.expirations += 1
+            self.__stats.misses += 1
+            return None
+
+        entry[1] = now
+        self.__sessions.move_to_end(key)
+        self.__stats.hits += 1
+        return entry[0]
+
+    def get_session(self, user_id: UserId) -> Session:
+        session = self.find_session(user_id)
+        if session is None:
+            return Session(user_id)
+        return session
 
     def save(self, session: Session):
-        for item in self.__sessions:
-            if item.user_id == session.user_id:
-                self.__sessions.remove(item)
-        self.__sessions.append(session)
+        session.pop_changes()
+        self.put(session)
+
+    def put(self, session: Session):
+        """
+        Keep the session without marking it as saved
+        """
+        key = self.__key(session.user_id)
+        now = monotonic()
+        entry: Optional[List] = self.__sessions.get(key)
+        if entry is None:
+            self.__sessions[key] = [session, now]
+        else:
+            entry[0] = session
+            entry[1] = now
+            self.__sessions.move_to_end(key)
+        self.__expire(now)
+        self.__evict()
+
+    @property
+    def stats(self) -> MemoryStorageStats:
+        return replace(self.__stats, size=len(self.__sessions))
+
+    def __len__(self) -> int:
+        return len(self.__sessions)
+
+    def __expire(self, now: float):
+        if self.__ttl is None:
+            return
+        while self.__sessions:
+            key, entry = next(iter(self.__sessions.items()))
+            if now - entry[1] <= self.__ttl:
+                break
+            del self.__sessions[key]
+            self.__stats.expirations += 1
+
+    def __evict(self):
+        if self.__max_sessions is None:
+            return
+        while len(self.__sessions) > self.__max_sessions:
+            self.__sessions.popitem(last=False)
+            self.__stats.evictions += 1
+
+    @staticmethod
+    def __key(user_id: UserId) -> Tuple:
+        return user_id.id, user_id.type, user_id.client_id
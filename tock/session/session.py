@@ -1,12 +1,33 @@
 # -*- coding: utf-8 -*-
-from re import split
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Set, FrozenSet, Dict, Tuple
 
 from tock.intent import Intent
 from tock.models import Entity, UserId
 
+CURRENT_STORY = "current_story"
+PREVIOUS_INTENT = "previous_intent"
+ENTITIES = "entities"
+ITEMS = "items"
+
+IMMUTABLE_TYPES = (str, int, float, bool, bytes, tuple, frozenset, type(None))
+
+TRANSIENT_ATTRIBUTES = (
+    '_Session__changes',
+    '_Session__entities_by_short_type',
+    '_Session__entities_by_type',
+    '_Session__entities_by_role',
+)
+
 
 class Session:
+    """
+    User session
+
+    A session records which of its fields changed since it was loaded, so storages
+    can skip saving unchanged sessions. A new session has all its fields changed.
+    Items values mutated in place are not detected, unless they were read with
+    ``get_item`` or flagged with ``mark_changed``.
+    """
 
     def __init__(self,
                  user_id: UserId,
@@ -20,13 +41,23 @@ class Session:
         self.__entities = entities
         self.__user_id: UserId = user_id
         self.__items = {}
+        self.__changes: Set[str] = {CURRENT_STORY, PREVIOUS_INTENT, ENTITIES, ITEMS}
+        self.__index_entities()
+
+    def entity(self, entity_type: str, role: Optional[str] = None) -> Optional[Entity]:
+        """
+        Returns the last entity of this type, short ("city") or full ("namespace:city"), and role if provided
+        """
+        if role is not None:
+            return self.__entities_by_role.get((entity_type, role))
+        entity = self.__entities_by_short_type.get(entity_type)
+        if entity is None:
+            entity = self.__entities_by_type.get(entity_type)
+        return entity
 
-    def entity(self, entity_type: str) -> Optional[Entity]:
-        for entity in reversed(self.entities):
-            parts = split(':', entity.type)
-            parts.reverse()
-            if parts[0] == entity_type:
-                return entity
+    @property
+    def entities_by_short_type(self) -> Dict[str, Entity]:
+        return self.__entities_by_short_type
 
     @property
     def current_story(self):
@@ -34,6 +65,8 @@ class Session:
 
     @current_story.setter
     def current_story(self, story: str):
+        if story != self.__current_story:
+            self.__changes.add(CURRENT_STORY)
         self.__current_story = story
 
     @property
@@ -42,6 +75,8 @@ class Session:
 
     @previous_intent.setter
     def previous_intent(self, intent: Intent):
+        if intent != self.__previous_intent:
+            self.__changes.add(PREVIOUS_INTENT)
         self.__previous_intent = intent
 
     @property
@@ -54,20 +89,80 @@ class Session:
 
     @entities.setter
     def entities(self, entities: List[Entity]):
+        if entities != self.__entities:
+            self.__changes.add(ENTITIES)
         self.__entities = entities
+        self.__index_entities()
 
     def reset_entities(self):
+        if self.__entities:
+            self.__changes.add(ENTITIES)
         self.__entities = []
+        self.__index_entities()
 
     def add_entities(self, entities: List[Entity]):
+        if entities:
+            self.__changes.add(ENTITIES)
         self.__entities = self.__entities + entities
+        self.__index_entities()
 
     def set_item(self, key: str, value: Any):
+        self.__changes.add(ITEMS)
         self.__items[key] = value
 
     def get_item(self, key: str) -> Optional[Any]:
         if key in self.__items.keys():
-            return self.__items[key]
+            value = self.__items[key]
+            if not isinstance(value, IMMUTABLE_TYPES):
+                # the caller may change it in place
+                self.__changes.add(ITEMS)
+            return value
+
+    @property
+    def items(self) -> Dict[str, Any]:
+        """
+        Returns a copy of the items, read by storages serializing sessions
+        """
+        return dict(self.__items)
 
     def clear(self):
+        if self.__items:
+            self.__changes.add(ITEMS)
         self.__items = {}
+
+    @property
+    def changes(self) -> FrozenSet[str]:
+        return frozenset(self.__changes)
+
+    def mark_changed(self, *fields: str):
+        self.__changes.update(fields if fields else (CURRENT_STORY, PREVIOUS_INTENT, ENTITIES, ITEMS))
+
+    def pop_changes(self) -> FrozenSet[str]:
+        """
+        Returns the changed fields and marks the session as saved
+        """
+        changes, self.__changes = self.__changes, set()
+        return frozenset(changes)
+
+    def __index_entities(self):
+        # later entities win, as the last entity of a type is the most relevant one
+        self.__entities_by_short_type: Dict[str, Entity] = {}
+        self.__entities_by_type: Dict[str, Entity] = {}
+        self.__entities_by_role: Dict[Tuple[str, str], Entity] = {}
+        for entity in self.__entities:
+            short_type = entity.type.rpartition(':')[2]
+            self.__entities_by_short_type[short_type] = entity
+            self.__entities_by_type[entity.type] = entity
+            self.__entities_by_role[(short_type, entity.role)] = entity
+            self.__entities_by_role[(entity.type, entity.role)] = entity
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for transient in TRANSIENT_ATTRIBUTES:
+            state.pop(transient, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__changes = set()
+        self.__index_entities()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from tock.session.codec import SessionCodec, PickleSessionCodec
+from tock.session.storage import Storage
+from tock.session.session import Session
+from tock.models import UserId
+
+CREATE_TABLE = "CREATE TABLE IF NOT EXISTS sessions (" \
+               "user_id TEXT PRIMARY KEY, " \
+               "data BLOB NOT NULL, " \
+               "updated_at REAL NOT NULL)"
+CREATE_INDEX = "CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)"
+SELECT_SESSION = "SELECT data FROM sessions WHERE user_id = ?"
+UPSERT_SESSION = "INSERT OR REPLACE INTO sessions (user_id, data, updated_at) VALUES (?, ?, ?)"
+DELETE_EXPIRED = "DELETE FROM sessions WHERE updated_at < ?"
+RETRY_DELAY = 0.1
+
+
+class SqliteStorage(Storage):
+    """
+    Keep sessions in a single SQLite database in WAL mode
+
+    Saves are queued and written by a background thread: all the saves queued while
+    a transaction is running are committed together in the next one (group commit).
+    Reads see queued saves immediately. Call ``flush`` to wait for queued saves
+    and ``close`` on shutdown.
+
+    :param path: database file
+    :param max_batch_size: maximum number of sessions written in one transaction
+    :param codec: serialization of the sessions, pickle by default
+    """
+    fork_safe = False
+
+    def __init__(self, path: str = './sessions.db', max_batch_size: int = 500, codec: Optional[SessionCodec] = None):
+        self.__logger: logging.Logger = logging.getLogger(__name__)
+        self.__path = path
+        self.__max_batch_size = max_batch_size
+        self.__codec = codec if codec is not None else PickleSessionCodec()
+        self.__condition = threading.Condition()
+        # user id -> (serialized session, save time)
+        self.__pending: Dict[str, Tuple[bytes, float]] = {}
+        self.__in_flight: Dict[str, Tuple[bytes, float]] = {}
+        self.__closed = False
+        self.__local = threading.local()
+        self.__connections: List[sqlite3.Connection] = []
+
+        connection = self.__connect()
+        with connection:
+            connection.execute(CREATE_TABLE)
+            connection.execute(CREATE_INDEX)
+        self.__writer = threading.Thread(target=self.__write_loop, args=(connection,),
+                                         name="tock-sqlite-writer", daemon=True)
+        self.__writer.start()
+
+    def get_session(self, user_id: UserId) -> Session:
+        with self.__condition:
+            queued = self.__pending.get(user_id.id) or self.__in_flight.get(user_id.id)
+        if queued is not None:
+            return self.__codec.loads(queued[0])
+
+        row = self.__reader().execute(SELECT_SESSION, (user_id.id,)).fetchone()
+        if row is None:
+            return Session(user_id)
+        return self.__codec.loads(row[0])
+
+    def save(self, session: Session):
+        if not session.pop_changes():
+            return
+        data = self.__codec.dumps(session)
+        with self.__condition:
+            if self.__closed:
+                raise RuntimeError("storage is closed")
+            self.__pending[session.user_id.id] = (data, time.time())
+            self.__condition.notify_all()
+
+    def expire(self, max_idle: float) -> int:
+        """
+        Delete the sessions not saved since max_idle seconds, returns the count of deleted sessions
+        """
+        connection = self.__reader()
+        with connection:
+            return connection.execute(DELETE_EXPIRED, (time.time() - max_idle,)).rowcount
+
+    def flush(self):
+        with self.__condition:
+            while self.__pending or self.__in_flight:
+                self.__condition.wait()
+
+    def close(self):
+        with self.__condition:
+            if self.__closed:
+                return
+            self.__closed = True
+            self.__condition.notify_all()
+        self.__writer.join()
+        for connection in self.__connections:
+            connection.close()
+
+    def __write_loop(self, connection: sqlite3.Connection):
+        while True:
+            with self.__condition:
+                while not self.__pending and not self.__closed:
+                    self.__condition.wait()
+                if not self.__pending:
+                    return
+                batch = self.__next_batch()
+
+            try:
+                with connection:
+                    connection.executemany(
+                        UPSERT_SESSION,
+                        [(user_id, data, updated_at) for user_id, (data, updated_at) in batch.items()]
+                    )
+                failed = False
+            except sqlite3.Error:
+                self.__logger.exception("Unable to save %d sessions", len(batch))
+                failed = True
+
+            with self.__condition:
+                if failed and not self.__closed:
+                    # retried with the next batch unless saved again meanwhile
+                    for user_id, queued in batch.items():
+                        self.__pending.setdefault(user_id, queued)
+                self.__in_flight = {}
+                self.__condition.notify_all()
+            if failed:
+                time.sleep(RETRY_DELAY)
+
+    def __next_batch(self) -> Dict[str, Tuple[bytes, float]]:
+        if len(self.__pending) <= self.__max_batch_size:
+            self.__in_flight, self.__pending = self.__pending, {}
+        else:
+            user_ids = list(self.__pending)[:self.__max_batch_size]
+            self.__in_flight = {user_id: self.__pending.pop(user_id) for user_id in user_ids}
+        return self.__in_flight
+
+    def __reader(self) -> sqlite3.Connection:
+        connection = getattr(self.__local, "connection", None)
+        if connection is None:
+            connection = self.__connect()
+            self.__local.connection = connection
+        return connection
+
+    def __connect(self) -> sqlite3.Connection:
+        # statements are constants so sqlite3 keeps them prepared in its per connection cache
+        connection = sqlite3.connect(self.__path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        with self.__condition:
+            self.__connections.append(connection)
+        return connection
@@ -1,11 +1,21 @@
 # -*- coding: utf-8 -*-
+import asyncio
 from abc import ABC, abstractmethod
+from concurrent.futures import Executor
+from typing import Optional
 
 from tock.session.session import Session
 from tock.models import UserId
 
 
 class Storage(ABC):
+    """
+    Sessions by user id
+
+    Storages running threads or holding connections are not ``fork_safe``: they must
+    be created in each worker process, not before the workers are forked.
+    """
+    fork_safe = True
 
     @abstractmethod
     def get_session(self, user_id: UserId) -> Session:
@@ -14,3 +24,68 @@ class Storage(ABC):
     @abstractmethod
     def save(self, session: Session):
         pass
+
+    def close(self):
+        pass
+
+
+class AsyncStorage(ABC):
+    fork_safe = True
+
+    @abstractmethod
+    async def get_session(self, user_id: UserId) -> Session:
+        pass
+
+    @abstractmethod
+    async def save(self, session: Session):
+        pass
+
+    async def close(self):
+        pass
+
+
+class SyncStorageAdapter(AsyncStorage):
+    """
+    Call a sync storage directly on the event loop, for storages which never block
+    """
+
+    def __init__(self, storage: Storage):
+        self.__storage = storage
+
+    @property
+    def fork_safe(self) -> bool:
+        return self.__storage.fork_safe
+
+    async def get_session(self, user_id: UserId) -> Session:
+        return self.__storage.get_session(user_id)
+
+    async def save(self, session: Session):
+        self.__storage.save(session)
+
+    async def close(self):
+        self.__storage.close()
+
+
+class ExecutorStorageAdapter(AsyncStorage):
+    """
+    Call a sync storage on an executor, for storages doing blocking I/O
+
+    :param executor: the loop default executor is used when not provided
+    """
+
+    def __init__(self, storage: Storage, executor: Optional[Executor] = None):
+        self.__storage = storage
+        self.__executor = executor
+
+    @property
+    def fork_safe(self) -> bool:
+        return self.__storage.fork_safe
+
+    async def get_session(self, user_id: UserId) -> Session:
+        return await asyncio.get_event_loop().run_in_executor(self.__executor, self.__storage.get_session, user_id)
+
+    async def save(self, session: Session):
+        await asyncio.get_event_loop().run_in_executor(self.__executor, self.__storage.save, session)
+
+    async def close(self):
+        await asyncio.get_event_loop().run_in_executor(self.__executor, self.__storage.close)
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+    The ``sharding`` module
+    ======================
+
+    Answer websocket messages in worker processes, each user being always
+    answered by the same worker so sessions kept in memory stay valid.
+
+    :Example:
+
+    >>> from tock.sharding import ConsistentHashRing
+    >>> ring = ConsistentHashRing(nodes=4)
+    >>> ring.node("user-1") == ring.node("user-1")
+    True
+
+"""
+import asyncio
+import bisect
+import hashlib
+import inspect
+import logging
+import multiprocessing
+import signal
+import threading
+from multiprocessing.connection import Connection, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from multiprocessing.process import BaseProcess
+
+from tock.idempotency import IdempotencyCache
+from tock.json_backend import JsonBackend, json_backend
+from tock.models import TockMessage
+from tock.schemas import TockMessageSchema
+
+# messages in flight per worker when the websocket forwards frames to workers
+MAX_IN_FLIGHT_PER_WORKER = 64
+
+
+class ConsistentHashRing:
+    """
+    Map keys to ``nodes`` nodes, each node owning ``replicas`` points of the ring
+
+    :param nodes: count of nodes, numbered from 0
+    :param replicas: virtual nodes per node, more replicas spread keys more evenly
+    """
+
+    def __init__(self, nodes: int, replicas: int = 128):
+        points: List[Tuple[int, int]] = sorted(
+            (self.__hash(f"{node}:{replica}"), node)
+            for node in range(nodes)
+            for replica in range(replicas)
+        )
+        self.__hashes: List[int] = [point[0] for point in points]
+        self.__nodes: List[int] = [point[1] for point in points]
+
+    def node(self, key: str) -> int:
+        index = bisect.bisect(self.__hashes, self.__hash(key))
+        return self.__nodes[index % len(self.__nodes)]
+
+    @staticmethod
+    def __hash(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class ShardedHandler:
+    """
+    Answer raw websocket frames in ``workers`` forked processes
+
+    Frames are routed by user id on a consistent hash ring. A worker answers the
+    frames of different users concurrently on its event loop, and the frames of a
+    user one after the other, in order.
+    ``on_worker_start(index)`` is called in each worker before it answers frames,
+    ``on_worker_stop()`` when it stops. Each worker answers on its own pipe, so a
+    killed worker never blocks the others. Crashed workers are restarted, the
+    frames they were answering are dropped.
+
+    :param workers: count of worker processes
+    :param bot_handler: answers a TockMessage, called in the workers
+    """
+
+    def __init__(self,
+                 workers: int,
+                 bot_handler: Callable,
+                 codec: Any = None,
+                 json: Optional[JsonBackend] = None,
+                 on_worker_start: Optional[Callable[[int], None]] = None,
+                 on_worker_stop: Optional[Callable[[], Any]] = None,
+                 idempotency: Optional[IdempotencyCache] = None,
+                 shutdown_timeout: float = 10.0):
+        self.__logger: logging.Logger = logging.getLogger(__name__)
+        self.__workers = workers
+        self.__bot_handler = bot_handler
+        self.__codec = codec if codec is not None else TockMessageSchema()
+        self.__json = json if json is not None else json_backend()
+        self.__on_worker_start = on_worker_start
+        self.__on_worker_stop = on_worker_stop
+        self.__shutdown_timeout = shutdown_timeout
+        self.__idempotency = idempotency
+        self.__ring = ConsistentHashRing(workers)
+        self.__context = multiprocessing.get_context("fork")
+        self.__processes: Dict[int, BaseProcess] = {}
+        self.__requests: Dict[int, multiprocessing.Queue] = {}
+        # parent ends of the response pipes of the workers
+        self.__responses: Dict[int, Connection] = {}
+        self.__stop_reader, self.__stop_writer = self.__context.Pipe(duplex=False)
+        # sequence number -> (worker index, future of the response)
+        self.__in_flight: Dict[int, Tuple[int, asyncio.Future]] = {}
+        self.__sequence = 0
+        self.__loop: Optional[asyncio.AbstractEventLoop] = None
+        self.__reader: Optional[threading.Thread] = None
+        self.__closed = False
+
+    def start(self):
+        for index in range(self.__workers):
+            self.__start_worker(index)
+        self.__reader = threading.Thread(target=self.__read_responses, name="tock-shard-reader", daemon=True)
+        self.__reader.start()
+
+    async def handle(self, data: Union[str, bytes]) -> Optional[bytes]:
+        """
+        Returns the response to the frame, or None if it was not answered
+        """
+        self.__loop = asyncio.get_event_loop()
+        payload = self.__json.loads(data)
+        user_key = self.__user_key(payload)
+        index = self.__ring.node(user_key)
+        request_id = payload.get("requestId")
+        if self.__idempotency is not None and request_id is not None:
+            return await self.__idempotency.get_or_compute(request_id, lambda: self.__submit(index, user_key, data))
+        return await self.__submit(index, user_key, data)
+
+    async def __submit(self, index: int, user_key: str, data: Union[str, bytes]) -> Optional[bytes]:
+        self.__sequence += 1
+        future = self.__loop.create_future()
+        self.__in_flight[self.__sequence] = (index, future)
+        self.__requests[index].put((self.__sequence, user_key, data))
+        return await future
+
+    def close(self):
+        self.__closed = True
+        for requests in self.__requests.values():
+            requests.put(None)
+        for index, process in self.__processes.items():
+            process.join(self.__shutdown_timeout)
+            if process.is_alive():
+                self.__logger.warning("worker %d did not stop, terminating it", index)
+                process.terminate()
+                process.join()
+        if self.__reader is not None:
+            self.__stop_writer.send(None)
+            self.__reader.join()
+        self.__stop_reader.close()
+        self.__stop_writer.close()
+        for responses in self.__responses.values():
+            responses.close()
+        for _, future in self.__in_flight.values():
+            if not future.done():
+                future.cancel()
+        self.__in_flight = {}
+
+    def __start_worker(self, index: int):
+        requests = self.__context.Queue()
+        responses, writer = self.__context.Pipe(duplex=False)
+        process = self.__context.Process(target=self.__run_worker, args=(index, requests, writer),
+                                         name=f"tock-shard-{index}")
+        process.start()
+        # the worker holds the only write end, its pipe reaches EOF when it exits
+        writer.close()
+        self.__requests[index] = requests
+        self.__responses[index] = responses
+        self.__processes[index] = process
+        self.__logger.info("worker %d started with pid %d", index, process.pid)
+
+    def __restart_worker(self, index: int):
+        if self.__closed or self.__processes[index].is_alive():
+            return
+        self.__logger.error("worker %d exited with code %s, restarting it", index, self.__processes[index].exitcode)
+        for sequence, (worker, future) in list(self.__in_flight.items()):
+            if worker == index:
+                del self.__in_flight[sequence]
+                future.set_result(None)
+        self.__start_worker(index)
+
+    def __read_responses(self):
+        # exited workers already reported and pipes at EOF, by index, until the worker is restarted
+        reported: Dict[int, BaseProcess] = {}
+        drained: Dict[int, Connection] = {}
+        while True:
+            sentinels: Dict[int, int] = {}
+            if self.__loop is not None and not self.__closed:
+                sentinels = {process.sentinel: index for index, process in list(self.__processes.items())
+                             if reported.get(index) is not process}
+            pipes = [responses for index, responses in list(self.__responses.items())
+                     if drained.get(index) is not responses]
+            # exited workers are noticed even while other workers keep answering
+            ready = wait([self.__stop_reader, *pipes, *sentinels], timeout=0.5)
+            for responses in pipes:
+                if responses in ready:
+                    self.__drain(responses, drained)
+            if self.__stop_reader in ready:
+                return
+            for sentinel in ready:
+                if sentinel in sentinels:
+                    index = sentinels[sentinel]
+                    reported[index] = self.__processes[index]
+                    # the sentinel is ready before the worker can be reaped, the restart must see it dead
+                    reported[index].join()
+                    self.__loop.call_soon_threadsafe(self.__restart_worker, index)
+
+    def __drain(self, responses: Connection, drained: Dict[int, Connection]):
+        try:
+            while True:
+                self.__loop.call_soon_threadsafe(self.__resolve, *responses.recv())
+                if not responses.poll():
+                    return
+        except (EOFError, OSError):
+            # the worker exited, its sentinel restarts it
+            for index, pipe in list(self.__responses.items()):
+                if pipe is responses:
+                    drained[index] = responses
+
+    def __resolve(self, sequence: int, response: Optional[bytes]):
+        entry = self.__in_flight.pop(sequence, None)
+        if entry is not None and not entry[1].done():
+            entry[1].set_result(response)
+
+    def __run_worker(self, index: int, requests: multiprocessing.Queue, responses: Connection):
+        # the parent stops the workers, a terminal interruption must not kill them first
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        if self.__on_worker_start is not None:
+            self.__on_worker_start(index)
+        loop.run_until_complete(self.__serve(requests, responses))
+        if self.__on_worker_stop is not None:
+            stopped = self.__on_worker_stop()
+            if inspect.isawaitable(stopped):
+                loop.run_until_complete(stopped)
+        responses.close()
+
+    async def __serve(self, requests: multiprocessing.Queue, responses: Connection):
+        loop = asyncio.get_event_loop()
+        # last frame task of each user, the next frame of the user waits for it
+        tails: Dict[str, asyncio.Task] = {}
+        while True:
+            item = await loop.run_in_executor(None, requests.get)
+            if item is None:
+                break
+            sequence, user_key, data = item
+            task = loop.create_task(self.__answer_after(tails.get(user_key), sequence, data, responses))
+            tails[user_key] = task
+            task.add_done_callback(lambda done, key=user_key: tails.pop(key) if tails.get(key) is done else None)
+        if tails:
+            await asyncio.wait(list(tails.values()))
+
+    async def __answer_after(self, previous: Optional[asyncio.Task], sequence: int, data: Union[str, bytes],
+                             responses: Connection):
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            response = await self.__answer(data)
+        except Exception:
+            self.__logger.exception("Unable to answer frame %s", data)
+            response = None
+        # answered from the event loop thread only, sends never interleave
+        responses.send((sequence, response))
+
+    async def __answer(self, data: Union[str, bytes]) -> Optional[bytes]:
+        tock_request: TockMessage = self.__codec.load(self.__json.loads(data))
+        tock_response = self.__bot_handler(tock_request)
+        if inspect.isawaitable(tock_response):
+            tock_response = await tock_response
+        return self.__json.dumps(self.__codec.dump(tock_response))
+
+    @staticmethod
+    def __user_key(payload: dict) -> str:
+        try:
+            return payload["botRequest"]["context"]["userId"]["id"]
+        except (KeyError, TypeError):
+            return str(payload.get("requestId"))
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import abc
+import asyncio
 from typing import Optional, Dict, Type, List
 
 from tock.bus import BotBus, TockBotBus
@@ -8,6 +9,8 @@ from tock.models import BotRequest, ClientConfiguration, StoryConfiguration, Int
 
 
 class Story(abc.ABC):
+    # a cacheable story always answers the same messages to the same intent, entities (content and value) and language
+    cacheable: bool = False
 
     def __init__(self, request: BotRequest):
         self._request: BotRequest = request
@@ -49,13 +52,20 @@ class Story(abc.ABC):
 
 
 def story(intent: IntentName, other_starter_intents: List[IntentName] = None,
-          secondary_intents: List[IntentName] = None):
+          secondary_intents: List[IntentName] = None, cacheable: bool = False):
     if secondary_intents is None:
         secondary_intents = []
     if other_starter_intents is None:
         other_starter_intents = []
 
     def decorator(answer):
+        if asyncio.iscoroutinefunction(answer):
+            async def answer_story(_, bus):
+                await answer(bus)
+        else:
+            def answer_story(_, bus):
+                answer(bus)
+
         def provide_story_type():
             return type(
                 f"{intent.capitalize()}Story",
@@ -64,7 +74,8 @@ def story(intent: IntentName, other_starter_intents: List[IntentName] = None,
                     "intent": lambda: Intent(intent),
                     "other_starter_intents": lambda: list(map(Intent, other_starter_intents)),
                     "secondary_intents": lambda: list(map(Intent, secondary_intents)),
-                    "answer": lambda _, bus: answer(bus)
+                    "answer": answer_story,
+                    "cacheable": cacheable
                 }
             )
 
@@ -82,18 +93,45 @@ class StoryDefinitions:
 
     def __init__(self):
         self.__stories: List[Type[Story]] = []
+        self.__configurations: Dict[Type[Story], StoryConfiguration] = {}
+        self.__stories_by_name: Dict[str, Type[Story]] = {}
+        self.__stories_by_starter_intent: Dict[IntentName, Type[Story]] = {}
+        self.__stories_by_secondary_intent: Dict[IntentName, Type[Story]] = {}
+        self.__unknown_story: Type[Story] = unknown()
+
+    @property
+    def unknown_story(self) -> Type[Story]:
+        return self.__unknown_story
+
+    def configuration(self, story_type: Type[Story]) -> StoryConfiguration:
+        configuration = self.__configurations.get(story_type)
+        if configuration is None:
+            configuration = story_type.configuration()
+            self.__configurations[story_type] = configuration
+        return configuration
 
     def find_story(self, story_name: str) -> Optional[Type[Story]]:
-        for _story in self.__stories:
-            if _story.configuration().name == story_name:
-                return _story
+        return self.__stories_by_name.get(story_name)
 
-    def register_story(self, story_type: Type[Story]):
+    def find_story_by_intent(self, intent: IntentName) -> Optional[Type[Story]]:
+        story_type = self.__stories_by_starter_intent.get(intent)
+        if story_type is None:
+            story_type = self.__stories_by_secondary_intent.get(intent)
+        return story_type
 
+    def register_story(self, story_type: Type[Story]):
+        configuration = self.configuration(story_type)
         self.__stories.append(story_type)
+        # the first registered story wins, as when stories were scanned in order
+        self.__stories_by_name.setdefault(configuration.name, story_type)
+        self.__stories_by_starter_intent.setdefault(configuration.main_intent, story_type)
+        for intent in configuration.other_starter_intents:
+            self.__stories_by_starter_intent.setdefault(intent, story_type)
+        for intent in configuration.secondary_intents:
+            self.__stories_by_secondary_intent.setdefault(intent, story_type)
 
     def client_configuration(self) -> ClientConfiguration:
         configurations: List[StoryConfiguration] = []
         for _story in self.__stories:
-            configurations.append(_story.configuration())
+            configurations.append(self.configuration(_story))
         return ClientConfiguration(configurations)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+    The ``supervisor`` module
+    ======================
+
+    Run a bot in several forked worker processes.
+
+    :Example:
+
+    >>> from tock.supervisor import WorkerSupervisor
+    >>> WorkerSupervisor(target=lambda index: print(f"worker {index}"), workers=4).run()
+
+"""
+import logging
+import multiprocessing
+import signal
+import threading
+from multiprocessing.connection import wait
+from typing import Callable, Dict
+
+from multiprocessing.process import BaseProcess
+
+
+class WorkerSupervisor:
+    """
+    Run ``target(index)`` in ``workers`` forked processes and restart the ones which crash
+
+    ``run`` blocks until SIGINT or SIGTERM is received, or ``stop`` is called, then
+    terminates the workers. Workers exiting with a zero exit code are not restarted.
+
+    :param target: called in each worker with the worker index
+    :param workers: count of worker processes
+    :param restart_delay: seconds to wait before restarting a crashed worker
+    :param shutdown_timeout: seconds given to workers to stop before they are killed
+    """
+
+    def __init__(self,
+                 target: Callable[[int], None],
+                 workers: int,
+                 restart_delay: float = 1.0,
+                 shutdown_timeout: float = 10.0):
+        self.__logger: logging.Logger = logging.getLogger(__name__)
+        self.__target = target
+        self.__workers = workers
+        self.__restart_delay = restart_delay
+        self.__shutdown_timeout = shutdown_timeout
+        self.__context = multiprocessing.get_context("fork")
+        self.__processes: Dict[int, BaseProcess] = {}
+        self.__stopping = threading.Event()
+
+    def run(self):
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, lambda signum, frame: self.stop())
+            signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+
+        for index in range(self.__workers):
+            self.__start(index)
+
+        while self.__processes and not self.__stopping.is_set():
+            wait([process.sentinel for process in self.__processes.values()], timeout=0.5)
+            for index, process in list(self.__processes.items()):
+                if process.is_alive():
+                    continue
+                process.join()
+                if process.exitcode == 0:
+                    self.__logger.info("worker %d exited", index)
+                    del self.__processes[index]
+                elif not self.__stopping.wait(self.__restart_delay):
+                    self.__logger.error("worker %d exited with code %s, restarting it", index, process.exitcode)
+                    self.__start(index)
+
+        self.__shutdown()
+
+    def stop(self):
+        self.__stopping.set()
+
+    def __start(self, index: int):
+        process = self.__context.Process(target=self.__run_worker, args=(index,), name=f"tock-worker-{index}")
+        process.start()
+        self.__processes[index] = process
+        self.__logger.info("worker %d started with pid %d", index, process.pid)
+
+    def __run_worker(self, index: int):
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        self.__target(index)
+
+    def __shutdown(self):
+        for process in self.__processes.values():
+            process.terminate()
+        for index, process in self.__processes.items():
+            process.join(self.__shutdown_timeout)
+            if process.is_alive():
+                self.__logger.warning("worker %d did not stop, killing it", index)
+                process.kill()
+                process.join()
+        self.__processes = {}
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+from testfixtures import compare
+
+from tock.session.cache import WriteBehindStorage, TieredStorage, AsyncTieredStorage
+from tock.session.memory import MemoryStorage
+from tock.session.session import Session
+from tock.session.storage import AsyncStorage
+from tock.tests.test_schemas import given_user_id
+
+
+class TestWriteBehindStorage(unittest.TestCase):
+
+    def test_waiting_session_is_served_from_memory(self):
+        # given
+        storage = mock.Mock()
+        session = Session(given_user_id("id1"))
+        session_storage = WriteBehindStorage(storage, flush_interval=60)
+        session_storage.save(session)
+
+        # when
+        result = session_storage.get_session(session.user_id)
+
+        # then
+        self.assertIs(session, result)
+        assert not storage.get_session.called
+        assert not storage.save.called
+        session_storage.close()
+
+    def test_saves_are_coalesced_until_flush(self):
+        # given
+        storage = mock.Mock()
+        session_storage = WriteBehindStorage(storage, flush_interval=60)
+        session = Session(given_user_id("id1"))
+
+        # when
+        for i in range(5):
+            session.set_item("count", i)
+            session_storage.save(session)
+        session_storage.flush()
+
+        # then
+        storage.save.assert_called_once()
+        compare(session, storage.save.call_args[0][0], ignore_attributes=['_Session__changes'])
+        session_storage.close()
+
+    def test_flush_when_max_dirty_is_reached(self):
+        # given
+        flushed = threading.Event()
+        storage = MemoryStorage()
+        session_storage = WriteBehindStorage(storage, flush_interval=60, max_dirty=2)
+
+        # when
+        with mock.patch.object(storage, "save", side_effect=lambda session: flushed.set()):
+            session_storage.save(Session(given_user_id("id1")))
+            session_storage.save(Session(given_user_id("id2")))
+
+            # then
+            self.assertTrue(flushed.wait(5))
+        session_storage.close()
+
+    def test_close_flushes_waiting_sessions(self):
+        # given
+        storage = mock.Mock()
+        session_storage = WriteBehindStorage(storage, flush_interval=60)
+        session = Session(given_user_id("id1"))
+        session_storage.save(session)
+
+        # when
+        session_storage.close()
+
+        # then
+        storage.save.assert_called_once()
+        compare(session, storage.save.call_args[0][0], ignore_attributes=['_Session__changes'])
+        assert storage.close.called
+
+    def test_flushed_session_is_served_from_memory(self):
+        # given
+        storage = mock.Mock()
+        session_storage = WriteBehindStorage(storage, flush_interval=60)
+        session = Session(given_user_id("id1"))
+        session_storage.save(session)
+        session_storage.flush()
+
+        # when
+        result = session_storage.get_session(session.user_id)
+
+        # then
+        self.assertIs(session, result)
+        assert not storage.get_session.called
+        self.assertEqual(1.0, session_storage.stats.hit_rate)
+        session_storage.close()
+
+    def test_flushed_sessions_are_bounded(self):
+        # given
+        storage = MemoryStorage()
+        session_storage = WriteBehindStorage(storage, flush_interval=60, max_clean=1)
+        for user in ("id1", "id2"):
+            session_storage.save(Session(given_user_id(user)))
+        session_storage.flush()
+
+        # when
+        with mock.patch.object(storage, "get_session", wraps=storage.get_session) as get_session_mock:
+            session_storage.get_session(given_user_id("id1"))
+            session_storage.get_session(given_user_id("id2"))
+
+        # then
+        get_session_mock.assert_called_once_with(given_user_id("id1"))
+        session_storage.close()
+
+    def test_changes_made_after_save_are_not_written(self):
+        # given
+        storage = MemoryStorage()
+        session_storage = WriteBehindStorage(storage, flush_interval=60)
+        session = Session(given_user_id("id1"))
+        session.set_item("key", "saved")
+        session_storage.save(session)
+
+        # when
+        session.set_item("key", "changed")
+        session_storage.flush()
+
+        # then
+        self.assertEqual("saved", storage.find_session(session.user_id).get_item("key"))
+        self.assertEqual({"items"}, session.changes)
+        session_storage.close()
+
+
+class TestTieredStorage(unittest.TestCase):
+
+    def test_saved_session_is_served_from_memory(self):
+        # given
+        storage = mock.Mock()
+        session_storage = TieredStorage(storage)
+        session = Session(given_user_id("id1"))
+        session_storage.save(session)
+
+        # when
+        result = session_storage.get_session(session.user_id)
+
+        # then
+        self.assertIs(session, result)
+        storage.save.assert_called_once_with(session)
+        assert not storage.get_session.called
+        self.assertEqual(1.0, session_storage.stats.hit_rate)
+
+    def test_missing_session_is_read_through_once(self):
+        # given
+        storage = MemoryStorage()
+        session = Session(given_user_id("id1"))
+        storage.save(session)
+        session_storage = TieredStorage(storage)
+
+        # when
+        first = session_storage.get_session(session.user_id)
+        second = session_storage.get_session(session.user_id)
+
+        # then
+        self.assertIs(session, first)
+        self.assertIs(session, second)
+        self.assertEqual(0.5, session_storage.stats.hit_rate)
+
+    def test_evicted_session_is_read_from_persistent_storage(self):
+        # given
+        storage = MemoryStorage()
+        session_storage = TieredStorage(storage, max_sessions=1)
+        first = Session(given_user_id("id1"))
+        session_storage.save(first)
+        session_storage.save(Session(given_user_id("id2")))
+
+        # when
+        result = session_storage.get_session(first.user_id)
+
+        # then
+        self.assertIs(first, result)
+        self.assertEqual(2, session_storage.stats.evictions)
+
+    def test_unchanged_session_is_not_written(self):
+        # given
+        storage = mock.Mock()
+        session_storage = TieredStorage(storage)
+        session = Session(given_user_id("id1"))
+        session.pop_changes()
+
+        # when
+        session_storage.save(session)
+
+        # then
+        assert not storage.save.called
+
+    def test_write_back_writes_sessions_on_flush(self):
+        # given
+        storage = MemoryStorage()
+        session_storage = TieredStorage(storage, write_back=True, flush_interval=60)
+        session = Session(given_user_id("id1"))
+
+        # when
+        session_storage.save(session)
+        before_flush = storage.find_session(session.user_id)
+        session_storage.flush()
+
+        # then
+        self.assertIsNone(before_flush)
+        compare(session, storage.find_session(session.user_id))
+        self.assertEqual(frozenset(), session.changes)
+        session_storage.close()
+
+
+class TestAsyncTieredStorage(unittest.TestCase):
+
+    def test_saved_session_is_served_from_memory(self):
+        # given
+        storage = mock.Mock(spec=AsyncStorage)
+        session_storage = AsyncTieredStorage(storage)
+        session = Session(given_user_id("id1"))
+
+        # when
+        async def save_and_load():
+            await session_storage.save(session)
+            return await session_storage.get_session(session.user_id)
+
+        result = asyncio.run(save_and_load())
+
+        # then
+        self.assertIs(session, result)
+        storage.save.assert_awaited_once_with(session)
+        storage.get_session.assert_not_awaited()
+        self.assertEqual(1.0, session_storage.stats.hit_rate)
+
+    def test_concurrent_misses_read_the_persistent_storage_once(self):
+        # given
+        storage = mock.Mock(spec=AsyncStorage)
+        session = Session(given_user_id("id1"))
+
+        async def get_session(user_id):
+            await asyncio.sleep(0.01)
+            return session
+
+        storage.get_session.side_effect = get_session
+        session_storage = AsyncTieredStorage(storage)
+
+        # when
+        async def load_twice():
+            return await asyncio.gather(*[session_storage.get_session(session.user_id) for _ in range(2)])
+
+        results = asyncio.run(load_twice())
+
+        # then
+        self.assertEqual([session, session], results)
+        self.assertEqual(1, storage.get_session.await_count)
+
+    def test_session_saved_during_a_read_is_kept_in_memory(self):
+        # given
+        storage = mock.Mock(spec=AsyncStorage)
+
+        async def get_session(user_id):
+            await asyncio.sleep(0.01)
+            return Session(user_id)
+
+        storage.get_session.side_effect = get_session
+        session_storage = AsyncTieredStorage(storage)
+        saved = Session(given_user_id("id1"))
+
+        # when
+        async def load_while_saving():
+            loading = asyncio.ensure_future(session_storage.get_session(saved.user_id))
+            await asyncio.sleep(0)
+            await session_storage.save(saved)
+            await loading
+            return await session_storage.get_session(saved.user_id)
+
+        result = asyncio.run(load_while_saving())
+
+        # then
+        self.assertIs(saved, result)
+
+    def test_sync_storage_is_read_off_the_event_loop(self):
+        # given
+        storage = mock.Mock()
+        threads = []
+        storage.get_session.side_effect = lambda user_id: threads.append(threading.current_thread()) \
+            or Session(user_id)
+        session_storage = AsyncTieredStorage(storage)
+
+        # when
+        asyncio.run(session_storage.get_session(given_user_id("id1")))
+
+        # then
+        self.assertEqual(1, len(threads))
+        self.assertIsNot(threading.main_thread(), threads[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
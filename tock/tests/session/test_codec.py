@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import io
+import unittest
+from dataclasses import replace
+
+from testfixtures import compare
+
+from tock.intent import Intent
+from tock.json_backend import json_backend
+from tock.session.codec import CompactSessionCodec, PickleSessionCodec, FORMAT_VERSION, FLAG_ZLIB
+from tock.session.session import Session
+from tock.tests.test_schemas import given_user_id, given_entity, given_date_entity_value
+
+
+def given_session() -> Session:
+    session = Session(given_user_id("id1"),
+                      current_story="greetings",
+                      previous_intent=Intent("greetings"),
+                      entities=[given_entity(), replace(given_entity(), type="date", value=given_date_entity_value())])
+    session.set_item("count", 1)
+    session.set_item("cart", {"items": ["book", "pen"], "total": 12.5})
+    return session
+
+
+class TestCompactSessionCodec(unittest.TestCase):
+
+    def test_dumps_then_loads_session(self):
+        # given
+        codec = CompactSessionCodec(json=json_backend("json"))
+        session = given_session()
+
+        # when
+        result = codec.loads(codec.dumps(session))
+
+        # then
+        compare(session, result, ignore_attributes=['_Session__changes'])
+        self.assertEqual(frozenset(), result.changes)
+
+    def test_dump_then_load_file(self):
+        # given
+        codec = CompactSessionCodec()
+        file = io.BytesIO()
+
+        # when
+        codec.dump(given_session(), file)
+        file.seek(0)
+        result = codec.load(file)
+
+        # then
+        self.assertEqual({"items": ["book", "pen"], "total": 12.5}, result.get_item("cart"))
+
+    def test_large_sessions_are_compressed(self):
+        # given
+        codec = CompactSessionCodec(compress_threshold=1024)
+        session = given_session()
+        session.set_item("history", ["message"] * 1000)
+
+        # when
+        data = codec.dumps(session)
+
+        # then
+        self.assertEqual(bytes((FORMAT_VERSION, FLAG_ZLIB)), data[:2])
+        self.assertLess(len(data), 1024)
+        self.assertEqual(["message"] * 1000, codec.loads(data).get_item("history"))
+
+    def test_small_sessions_are_not_compressed(self):
+        # when
+        data = CompactSessionCodec(compress_threshold=1024).dumps(Session(given_user_id("id1")))
+
+        # then
+        self.assertEqual(bytes((FORMAT_VERSION, 0)), data[:2])
+
+    def test_unknown_format_version_is_rejected(self):
+        # given
+        data = bytes((FORMAT_VERSION + 1, 0)) + b'[]'
+
+        # then
+        with self.assertRaises(ValueError):
+            CompactSessionCodec().loads(data)
+
+    def test_items_must_be_json_values(self):
+        # given
+        session = Session(given_user_id("id1"))
+        session.set_item("key", object())
+
+        # then
+        with self.assertRaises(TypeError):
+            CompactSessionCodec().dumps(session)
+
+    def test_is_smaller_than_pickle(self):
+        # given
+        session = given_session()
+
+        # then
+        self.assertLess(len(CompactSessionCodec().dumps(session)), len(PickleSessionCodec().dumps(session)))
+
+
+class TestPickleSessionCodec(unittest.TestCase):
+
+    def test_dumps_then_loads_session(self):
+        # given
+        codec = PickleSessionCodec()
+        session = given_session()
+
+        # when
+        result = codec.loads(codec.dumps(session))
+
+        # then
+        compare(session, result, ignore_attributes=['_Session__changes'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import hashlib
+import os
+import tempfile
 import unittest
 from unittest import mock
 
 from testfixtures import compare
 
+from tock.session.codec import CompactSessionCodec
 from tock.session.session import Session
-from tock.session.file import FileStorage
+from tock.session.file import FileStorage, AsyncFileStorage, ShardedFileStorage
 from tock.tests.test_schemas import given_user_id
 
 
@@ -81,6 +86,181 @@ class TestFileStorage(unittest.TestCase):
         assert not pickle_load_mock.called
         compare(result, expected)
 
+    @mock.patch('os.path.exists', return_value=True)
+    @mock.patch('tock.session.file.open', create=True)
+    @mock.patch('pickle.dump')
+    def test_given_unchanged_session_then_skip_save(self,
+                                                    pickle_dump_mock,
+                                                    open_mock,
+                                                    path_exists_mock):
+        # given a session already saved
+        session = Session(given_user_id("id1"))
+        session.pop_changes()
+        session_storage = FileStorage("/tmp/test-tock-sessions")
+
+        # when
+        session_storage.save(session)
+
+        # then
+        assert not open_mock.called
+        assert not pickle_dump_mock.called
+
+
+class TestAsyncFileStorage(unittest.TestCase):
+
+    def test_save_and_load_session(self):
+        # given
+        session = Session(given_user_id("id1"))
+        session.set_item("key", "value")
+
+        with tempfile.TemporaryDirectory() as basepath:
+            session_storage = AsyncFileStorage(basepath)
+
+            # when
+            async def save_and_load():
+                await session_storage.save(session)
+                return await session_storage.get_session(session.user_id)
+
+            result = asyncio.run(save_and_load())
+
+        # then
+        compare(session, result)
+
+
+class TestShardedFileStorage(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.basepath = directory.name
+
+    def test_save_and_load_session(self):
+        # given
+        session = Session(given_user_id("id1"))
+        session.set_item("key", "value")
+        ShardedFileStorage(self.basepath).save(session)
+
+        # when
+        result = ShardedFileStorage(self.basepath).get_session(session.user_id)
+
+        # then
+        compare(session, result)
+
+    def test_session_file_is_in_a_hashed_subdirectory(self):
+        # given
+        session = Session(given_user_id("../../id1"))
+
+        # when
+        ShardedFileStorage(self.basepath, levels=2).save(session)
+
+        # then
+        files = [os.path.relpath(os.path.join(root, name), self.basepath)
+                 for root, _, names in os.walk(self.basepath) for name in names]
+        self.assertEqual(1, len(files))
+        first, second, name = files[0].split(os.sep)
+        self.assertEqual(name[0:2] + name[2:4], first + second)
+
+    def test_missing_users_of_a_listed_directory_are_not_looked_up_on_disk(self):
+        # given
+        storage = ShardedFileStorage(self.basepath, levels=0, negative_cache=True)
+        storage.save(Session(given_user_id("id0")))
+
+        # when
+        with mock.patch('os.listdir', wraps=os.listdir) as listdir_mock, \
+                mock.patch('tock.session.file.open', create=True, wraps=open) as open_mock:
+            sessions = [storage.get_session(given_user_id(user)) for user in ("id1", "id2", "id0")]
+
+        # then
+        self.assertEqual([given_user_id(user) for user in ("id1", "id2", "id0")],
+                         [session.user_id for session in sessions])
+        self.assertEqual(1, listdir_mock.call_count)
+        self.assertEqual(1, open_mock.call_count)
+
+    def test_saved_user_is_no_longer_missing(self):
+        # given
+        storage = ShardedFileStorage(self.basepath, negative_cache=True)
+        storage.get_session(given_user_id("id1"))
+        session = Session(given_user_id("id1"))
+        session.set_item("key", "value")
+        storage.save(session)
+
+        # when
+        result = storage.get_session(given_user_id("id1"))
+
+        # then
+        self.assertEqual("value", result.get_item("key"))
+
+    def test_directory_listings_are_bounded(self):
+        # given
+        storage = ShardedFileStorage(self.basepath, levels=1, negative_cache=True, max_listings=1)
+        users = ("id1", "id2")
+        self.assertNotEqual(*[hashlib.sha1(user.encode('utf-8')).hexdigest()[:2] for user in users])
+
+        # when
+        with mock.patch('os.listdir', wraps=os.listdir) as listdir_mock:
+            for user in users + users[:1]:
+                storage.get_session(given_user_id(user))
+
+        # then
+        self.assertEqual(3, listdir_mock.call_count)
+
+    def test_by_default_files_of_other_writers_are_read(self):
+        # given
+        storage = ShardedFileStorage(self.basepath)
+        storage.get_session(given_user_id("id1"))
+        session = Session(given_user_id("id1"))
+        session.set_item("key", "value")
+        ShardedFileStorage(self.basepath).save(session)
+
+        # when
+        result = storage.get_session(given_user_id("id1"))
+
+        # then
+        self.assertEqual("value", result.get_item("key"))
+
+    def test_directories_are_created_once(self):
+        # given
+        storage = ShardedFileStorage(self.basepath, levels=0)
+
+        # when
+        with mock.patch('os.makedirs', wraps=os.makedirs) as makedirs_mock:
+            for user in ("id1", "id2", "id3"):
+                storage.save(Session(given_user_id(user)))
+
+        # then
+        self.assertEqual(1, makedirs_mock.call_count)
+
+    def test_failed_write_keeps_the_previous_session(self):
+        # given
+        storage = ShardedFileStorage(self.basepath)
+        session = Session(given_user_id("id1"))
+        session.set_item("key", "saved")
+        storage.save(session)
+        session.set_item("key", "failed")
+
+        # when
+        with mock.patch('pickle.dump', side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                storage.save(session)
+
+        # then
+        self.assertEqual("saved", ShardedFileStorage(self.basepath).get_session(session.user_id).get_item("key"))
+        self.assertEqual([], [name for _, _, names in os.walk(self.basepath) for name in names if name.endswith('.tmp')])
+        self.assertTrue(session.changes)
+
+    def test_save_and_load_session_with_compact_codec(self):
+        # given
+        session = Session(given_user_id("id1"))
+        session.set_item("key", "value")
+        ShardedFileStorage(self.basepath, codec=CompactSessionCodec()).save(session)
+
+        # when
+        result = ShardedFileStorage(self.basepath, codec=CompactSessionCodec()).get_session(session.user_id)
+
+        # then
+        self.assertEqual("value", result.get_item("key"))
+        self.assertTrue(all(name.endswith(".session") for _, _, names in os.walk(self.basepath) for name in names))
+
 
 if __name__ == '__main__':
     unittest.main()
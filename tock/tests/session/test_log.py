@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+
+from testfixtures import compare
+
+from tock.intent import Intent
+from tock.session.codec import CompactSessionCodec
+from tock.session.log import LogStructuredStorage
+from tock.session.session import Session
+from tock.tests.test_schemas import given_user_id
+
+
+def given_session(user_id: str = "id1", value: str = "value") -> Session:
+    session = Session(given_user_id(user_id), current_story="greetings", previous_intent=Intent("greetings"))
+    session.set_item("key", value)
+    return session
+
+
+class TestLogStructuredStorage(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def given_storage(self, **kwargs) -> LogStructuredStorage:
+        storage = LogStructuredStorage(self.directory, compaction_interval=None, **kwargs)
+        self.addCleanup(storage.close)
+        return storage
+
+    def test_given_not_existing_session_then_create_it(self):
+        # when
+        result = self.given_storage().get_session(given_user_id("id1"))
+
+        # then
+        compare(Session(given_user_id("id1")), result)
+
+    def test_given_saved_session_then_load_its_last_version(self):
+        # given
+        storage = self.given_storage()
+        storage.save(given_session(value="first"))
+        storage.save(given_session(value="last"))
+
+        # when
+        result = storage.get_session(given_user_id("id1"))
+
+        # then
+        self.assertEqual("last", result.get_item("key"))
+        self.assertEqual(frozenset(), result.changes)
+
+    def test_unchanged_session_is_not_appended(self):
+        # given
+        storage = self.given_storage()
+        session = given_session()
+        storage.save(session)
+
+        # when
+        storage.save(session)
+
+        # then
+        self.assertEqual(0, storage.stats.dead_bytes)
+
+    def test_given_saved_sessions_then_load_them_after_restart(self):
+        # given
+        storage = self.given_storage(max_segment_size=200)
+        for index in range(20):
+            storage.save(given_session(f"id{index % 5}", f"value{index}"))
+        storage.close()
+
+        # when
+        storage = self.given_storage(max_segment_size=200)
+
+        # then
+        self.assertTrue(any(name.endswith(".hint") for name in os.listdir(self.directory)))
+        self.assertGreater(storage.stats.segments, 2)
+        self.assertEqual(5, storage.stats.size)
+        for index in range(15, 20):
+            self.assertEqual(f"value{index}", storage.get_session(given_user_id(f"id{index % 5}")).get_item("key"))
+
+    def test_torn_record_is_truncated_on_restart(self):
+        # given
+        storage = self.given_storage()
+        storage.save(given_session("id1", "saved"))
+        storage.close()
+        segment = os.path.join(self.directory, "00000000.log")
+        size = os.path.getsize(segment)
+        with open(segment, 'ab') as f:
+            f.write(b'\x01\x02\x03')
+
+        # when
+        storage = self.given_storage()
+        storage.save(given_session("id2", "saved after restart"))
+
+        # then
+        self.assertEqual("saved", storage.get_session(given_user_id("id1")).get_item("key"))
+        self.assertEqual("saved after restart", storage.get_session(given_user_id("id2")).get_item("key"))
+        self.assertGreater(os.path.getsize(segment), size)
+
+    def test_compaction_drops_replaced_records(self):
+        # given
+        storage = self.given_storage(max_segment_size=300, compaction_threshold=0.5)
+        for index in range(30):
+            storage.save(given_session(f"id{index % 3}", f"value{index}"))
+        before = storage.stats
+
+        # when
+        compacted = storage.compact()
+
+        # then
+        after = storage.stats
+        self.assertGreater(compacted, 0)
+        self.assertLess(after.segments, before.segments)
+        self.assertLess(after.dead_bytes, before.dead_bytes)
+        self.assertEqual(before.live_bytes, after.live_bytes)
+        for index in range(27, 30):
+            self.assertEqual(f"value{index}", storage.get_session(given_user_id(f"id{index % 3}")).get_item("key"))
+
+    def test_compacted_segments_are_loaded_after_restart(self):
+        # given
+        storage = self.given_storage(max_segment_size=300, compaction_threshold=0.1)
+        for index in range(30):
+            storage.save(given_session(f"id{index % 7}", f"value{index}"))
+        storage.compact()
+        storage.close()
+
+        # when
+        storage = self.given_storage(max_segment_size=300)
+
+        # then
+        self.assertEqual(7, storage.stats.size)
+        for index in range(23, 30):
+            self.assertEqual(f"value{index}", storage.get_session(given_user_id(f"id{index % 7}")).get_item("key"))
+
+    def test_save_with_compact_codec(self):
+        # given
+        storage = self.given_storage(codec=CompactSessionCodec())
+        storage.save(given_session())
+
+        # when
+        result = storage.get_session(given_user_id("id1"))
+
+        # then
+        compare(given_session(), result, ignore_attributes=['_Session__changes'])
+
+    def test_closed_storage_refuses_saves(self):
+        # given
+        storage = self.given_storage()
+        storage.close()
+        session = given_session()
+
+        # then
+        with self.assertRaises(RuntimeError):
+            storage.save(session)
+        self.assertTrue(session.changes)
+
+
+if __name__ == '__main__':
+    unittest.main()
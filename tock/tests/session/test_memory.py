@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import unittest
+from unittest import mock
 
 from testfixtures import compare
 
@@ -52,6 +53,57 @@ class TestMemoryStorage(unittest.TestCase):
         compare(expected, result)
         compare(expected2, result2)
 
+    def test_least_recently_used_session_is_evicted(self):
+        # given a full storage
+        session_storage = MemoryStorage(max_sessions=2)
+        session_storage.save(Session(given_user_id("id1")))
+        session_storage.save(Session(given_user_id("id2")))
+        session_storage.get_session(given_user_id("id1"))
+
+        # when a new session is saved
+        session_storage.save(Session(given_user_id("id3")))
+
+        # then the least recently used session is evicted
+        self.assertEqual(2, len(session_storage))
+        self.assertIsNotNone(session_storage.find_session(given_user_id("id1")))
+        self.assertIsNone(session_storage.find_session(given_user_id("id2")))
+        self.assertIsNotNone(session_storage.find_session(given_user_id("id3")))
+        self.assertEqual(1, session_storage.stats.evictions)
+
+    @mock.patch('tock.session.memory.monotonic')
+    def test_idle_session_is_expired(self, monotonic_mock):
+        # given sessions saved at 0 and 50
+        session_storage = MemoryStorage(ttl=60)
+        monotonic_mock.return_value = 0
+        session_storage.save(Session(given_user_id("id1")))
+        monotonic_mock.return_value = 50
+        session_storage.save(Session(given_user_id("id2")))
+
+        # when loaded at 100
+        monotonic_mock.return_value = 100
+        result = session_storage.find_session(given_user_id("id1"))
+        result2 = session_storage.find_session(given_user_id("id2"))
+
+        # then only the idle one is expired
+        self.assertIsNone(result)
+        self.assertIsNotNone(result2)
+        self.assertEqual(1, session_storage.stats.expirations)
+
+    def test_stats(self):
+        # given
+        session_storage = MemoryStorage()
+        session_storage.save(Session(given_user_id("id1")))
+
+        # when
+        session_storage.get_session(given_user_id("id1"))
+        session_storage.get_session(given_user_id("id2"))
+
+        # then
+        stats = session_storage.stats
+        self.assertEqual(1, stats.size)
+        self.assertEqual(1, stats.hits)
+        self.assertEqual(1, stats.misses)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import pickle
+import unittest
+from dataclasses import replace
+
+from tock.intent import Intent
+from tock.session.session import Session
+from tock.tests.test_schemas import given_user_id, given_entity
+
+
+def given_loaded_session() -> Session:
+    session = Session(given_user_id("id1"), current_story="greetings", previous_intent=Intent("greetings"))
+    session.set_item("flag", True)
+    session.set_item("cart", [])
+    return pickle.loads(pickle.dumps(session))
+
+
+class TestSession(unittest.TestCase):
+
+    def test_new_session_is_changed(self):
+        session = Session(given_user_id("id1"))
+
+        self.assertEqual({"current_story", "previous_intent", "entities", "items"}, session.changes)
+
+    def test_loaded_session_is_unchanged(self):
+        session = given_loaded_session()
+
+        self.assertEqual(frozenset(), session.changes)
+
+    def test_setting_same_values_is_not_a_change(self):
+        session = given_loaded_session()
+
+        session.current_story = "greetings"
+        session.previous_intent = Intent("greetings")
+        session.entities = []
+        session.get_item("flag")
+
+        self.assertEqual(frozenset(), session.changes)
+
+    def test_changes_are_recorded_by_field(self):
+        session = given_loaded_session()
+
+        session.previous_intent = Intent("goodbye")
+        session.add_entities([given_entity()])
+
+        self.assertEqual({"previous_intent", "entities"}, session.changes)
+
+    def test_reading_a_mutable_item_is_a_change(self):
+        session = given_loaded_session()
+
+        session.get_item("cart").append("item")
+
+        self.assertEqual({"items"}, session.changes)
+
+    def test_pop_changes_marks_the_session_as_saved(self):
+        session = given_loaded_session()
+        session.set_item("flag", False)
+
+        changes = session.pop_changes()
+
+        self.assertEqual({"items"}, changes)
+        self.assertEqual(frozenset(), session.changes)
+
+    def test_mark_changed(self):
+        session = given_loaded_session()
+
+        session.mark_changed("items")
+
+        self.assertEqual({"items"}, session.changes)
+
+
+class TestSessionEntities(unittest.TestCase):
+
+    def given_session(self) -> Session:
+        return Session(given_user_id("id1"), entities=[
+            replace(given_entity(), type="ns:city", role="origin", content="Paris"),
+            replace(given_entity(), type="ns:city", role="destination", content="Lyon"),
+            replace(given_entity(), type="ns:date", role="date", content="tomorrow"),
+        ])
+
+    def test_entity_by_short_type_is_the_last_one(self):
+        self.assertEqual("Lyon", self.given_session().entity("city").content)
+
+    def test_entity_by_full_type(self):
+        self.assertEqual("tomorrow", self.given_session().entity("ns:date").content)
+
+    def test_entity_by_type_and_role(self):
+        session = self.given_session()
+
+        self.assertEqual("Paris", session.entity("city", "origin").content)
+        self.assertEqual("Paris", session.entity("ns:city", "origin").content)
+        self.assertIsNone(session.entity("city", "unknown"))
+
+    def test_unknown_entity(self):
+        self.assertIsNone(self.given_session().entity("unknown"))
+
+    def test_index_follows_entities_changes(self):
+        session = self.given_session()
+
+        session.reset_entities()
+        self.assertIsNone(session.entity("city"))
+
+        session.add_entities([replace(given_entity(), type="ns:city", content="Nantes")])
+        self.assertEqual("Nantes", session.entity("city").content)
+
+    def test_index_is_rebuilt_after_unpickling(self):
+        session = pickle.loads(pickle.dumps(self.given_session()))
+
+        self.assertEqual("Lyon", session.entity("city").content)
+
+
+if __name__ == '__main__':
+    unittest.main()
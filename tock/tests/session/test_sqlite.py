@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from testfixtures import compare
+
+from tock.intent import Intent
+from tock.session.codec import CompactSessionCodec
+from tock.session.session import Session
+from tock.session.sqlite import SqliteStorage
+from tock.tests.test_schemas import given_user_id
+
+
+def given_session(user_id: str = "id1") -> Session:
+    session = Session(given_user_id(user_id), current_story="greetings", previous_intent=Intent("greetings"))
+    session.set_item("key", "value")
+    return session
+
+
+class TestSqliteStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "sessions.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_given_not_existing_session_then_create_it(self):
+        # given
+        user_id = given_user_id("id1")
+        session_storage = SqliteStorage(self.path)
+
+        # when
+        result = session_storage.get_session(user_id)
+        session_storage.close()
+
+        # then
+        compare(Session(user_id), result)
+
+    def test_given_queued_session_then_load_it(self):
+        # given a save not yet committed because another connection holds the write lock
+        expected = given_session()
+        session_storage = SqliteStorage(self.path)
+        lock_holder = sqlite3.connect(self.path, isolation_level=None)
+        lock_holder.execute("BEGIN IMMEDIATE")
+        session_storage.save(expected)
+
+        # when
+        result = session_storage.get_session(expected.user_id)
+        lock_holder.execute("ROLLBACK")
+        lock_holder.close()
+        session_storage.close()
+
+        # then
+        compare(expected, result)
+
+    def test_given_saved_session_then_load_it_after_restart(self):
+        # given
+        expected = given_session()
+        session_storage = SqliteStorage(self.path)
+        session_storage.save(expected)
+        session_storage.close()
+
+        # when
+        session_storage = SqliteStorage(self.path)
+        result = session_storage.get_session(expected.user_id)
+        session_storage.close()
+
+        # then
+        compare(expected, result)
+        with sqlite3.connect(self.path) as connection:
+            self.assertEqual("wal", connection.execute("PRAGMA journal_mode").fetchone()[0])
+
+    def test_given_compact_codec_then_load_saved_session(self):
+        # given
+        expected = given_session()
+        session_storage = SqliteStorage(self.path, codec=CompactSessionCodec())
+        session_storage.save(expected)
+        session_storage.close()
+
+        # when
+        session_storage = SqliteStorage(self.path, codec=CompactSessionCodec())
+        result = session_storage.get_session(expected.user_id)
+        session_storage.close()
+
+        # then
+        compare(expected, result)
+
+    def test_concurrent_saves_are_committed_together(self):
+        # given
+        session_storage = SqliteStorage(self.path, max_batch_size=100)
+        batch_sizes = []
+        next_batch = session_storage._SqliteStorage__next_batch
+
+        def record_batch():
+            batch = next_batch()
+            batch_sizes.append(len(batch))
+            return batch
+
+        # when saves are queued faster than they are committed
+        with mock.patch.object(session_storage, "_SqliteStorage__next_batch", side_effect=record_batch):
+            for i in range(250):
+                session_storage.save(given_session(f"id{i}"))
+            session_storage.flush()
+        session_storage.close()
+
+        # then
+        self.assertEqual(250, sum(batch_sizes))
+        self.assertLess(len(batch_sizes), 250)
+        self.assertLessEqual(max(batch_sizes), 100)
+
+    def test_expire_idle_sessions(self):
+        # given a session saved an hour ago and a fresh one
+        session_storage = SqliteStorage(self.path)
+        with mock.patch('tock.session.sqlite.time.time', return_value=time.time() - 3600):
+            session_storage.save(given_session("id1"))
+            session_storage.flush()
+        expected = given_session("id2")
+        session_storage.save(expected)
+        session_storage.flush()
+
+        # when
+        deleted = session_storage.expire(60)
+
+        # then
+        self.assertEqual(1, deleted)
+        compare(Session(given_user_id("id1")), session_storage.get_session(given_user_id("id1")))
+        compare(expected, session_storage.get_session(given_user_id("id2")))
+        session_storage.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
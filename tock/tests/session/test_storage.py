@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+from testfixtures import compare
+
+from tock.session.memory import MemoryStorage
+from tock.session.session import Session
+from tock.session.storage import SyncStorageAdapter, ExecutorStorageAdapter
+from tock.tests.test_schemas import given_user_id
+
+
+class TestSyncStorageAdapter(unittest.TestCase):
+    def test_save_and_load_session(self):
+        # given
+        expected = Session(given_user_id("id1"))
+        session_storage = SyncStorageAdapter(MemoryStorage())
+
+        # when
+        async def save_and_load():
+            await session_storage.save(expected)
+            return await session_storage.get_session(expected.user_id)
+
+        result = asyncio.run(save_and_load())
+
+        # then
+        compare(expected, result)
+
+
+class TestExecutorStorageAdapter(unittest.TestCase):
+    def test_storage_is_called_off_the_event_loop(self):
+        # given
+        storage = mock.Mock()
+        threads = []
+        storage.get_session.side_effect = lambda user_id: threads.append(threading.current_thread())
+        storage.save.side_effect = lambda session: threads.append(threading.current_thread())
+        session_storage = ExecutorStorageAdapter(storage)
+
+        # when
+        async def save_and_load():
+            await session_storage.save(Session(given_user_id("id1")))
+            await session_storage.get_session(given_user_id("id1"))
+            await session_storage.close()
+
+        asyncio.run(save_and_load())
+
+        # then
+        self.assertEqual(2, len(threads))
+        self.assertNotIn(threading.main_thread(), threads)
+        assert storage.close.called
+
+
+if __name__ == '__main__':
+    unittest.main()
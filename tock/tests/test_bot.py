@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import tempfile
+import threading
+import unittest
+from dataclasses import replace
+from typing import List
+from unittest import mock
+
+from tock.bot import TockBot
+from tock.bus import TockBotBus
+from tock.codec import TockMessageCodec
+from tock.metrics import DECODE, SESSION_LOAD, STORY_LOOKUP, STORY_CREATE, ANSWER, RESPONSE_BUILD, \
+    SESSION_SAVE, ENCODE
+from tock.models import TockMessage
+from tock.schemas import TockMessageSchema
+from tock.session.codec import CompactSessionCodec, PickleSessionCodec
+from tock.session.file import FileStorage
+from tock.session.memory import MemoryStorage
+from tock.session.storage import Storage
+from tock.story import story
+from tock.tests.test_schemas import given_bot_request, given_request_context, given_user_id
+from tock.tests.test_websocket import FakeWebSocket, patch_client_session
+
+
+def given_frame(request_id: str, intent: str) -> str:
+    bot_request = replace(given_bot_request(), intent=intent, story_id=intent, entities=[])
+    return TockMessageSchema().dumps(TockMessage(request_id=request_id, bot_request=bot_request))
+
+
+def given_user_frame(request_id: str, intent: str, user_id: str) -> str:
+    bot_request = replace(
+        given_bot_request(),
+        intent=intent,
+        story_id=intent,
+        entities=[],
+        context=replace(given_request_context(), user_id=given_user_id(user_id))
+    )
+    return TockMessageSchema().dumps(TockMessage(request_id=request_id, bot_request=bot_request))
+
+
+def sent_texts(ws: FakeWebSocket) -> List[str]:
+    responses = [json.loads(data) for data in ws.sent[1:]]
+    return [message["text"]["text"] for response in responses for message in response["botResponse"]["messages"]]
+
+
+def run_bot(bot: TockBot, frames: List[str], **kwargs) -> FakeWebSocket:
+    ws = FakeWebSocket(frames)
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    with patch_client_session(mock.MagicMock(return_value=ws)):
+        bot.start_websocket(reconnect=False, **kwargs)
+    return ws
+
+
+class TestTockBot(unittest.TestCase):
+
+    def test_async_story_is_awaited(self):
+        # given
+        @story(intent="greetings")
+        async def greetings(bus: TockBotBus):
+            await asyncio.sleep(0)
+            bus.send("hello")
+
+        # when
+        ws = run_bot(TockBot().register_story(greetings), [given_frame("r1", "greetings")])
+
+        # then
+        self.assertEqual(["hello"], sent_texts(ws))
+
+    def test_sync_story_runs_off_the_event_loop(self):
+        # given
+        threads = []
+
+        def goodbye(bus: TockBotBus):
+            threads.append(threading.current_thread())
+            bus.send("goodbye")
+
+        # when
+        ws = run_bot(TockBot().register_story(goodbye), [given_frame("r1", "goodbye")])
+
+        # then
+        self.assertEqual(["goodbye"], sent_texts(ws))
+        self.assertIsNot(threading.main_thread(), threads[0])
+
+    def test_fast_codec(self):
+        # given
+        def goodbye(bus: TockBotBus):
+            bus.send("goodbye")
+
+        # when
+        ws = run_bot(TockBot().use_codec(TockMessageCodec()).register_story(goodbye), [given_frame("r1", "goodbye")])
+
+        # then
+        self.assertEqual(["goodbye"], sent_texts(ws))
+
+    def test_worker_start_hook_is_called_before_serving(self):
+        # given
+        storage = mock.MagicMock()
+        started = []
+
+        def on_worker_start(bot: TockBot, index: int):
+            started.append(index)
+            bot.use_storage(storage)
+
+        # when
+        with mock.patch('tock.bot.TockWebhook') as webhook:
+            TockBot().start_webhook(host="127.0.0.1", path="key", port=5000, on_worker_start=on_worker_start)
+
+        # then
+        self.assertEqual([0], started)
+        webhook.return_value.start.assert_called_once_with(reuse_port=False)
+
+    def test_workers_are_supervised(self):
+        # when
+        with mock.patch('tock.bot.WorkerSupervisor') as supervisor:
+            TockBot().start_webhook(host="127.0.0.1", path="key", port=5000, workers=4)
+
+        # then
+        self.assertEqual(4, supervisor.call_args.kwargs["workers"])
+        supervisor.return_value.run.assert_called_once_with()
+
+    def test_storage_not_fork_safe_must_be_created_in_workers(self):
+        # given
+        storage = mock.Mock(spec=Storage, fork_safe=False)
+        bot = TockBot().use_storage(storage)
+
+        # then
+        with mock.patch('tock.bot.WorkerSupervisor') as supervisor:
+            with self.assertRaises(ValueError):
+                bot.start_webhook(host="127.0.0.1", path="key", port=5000, workers=2)
+            with self.assertRaises(ValueError):
+                bot.start_websocket(workers=2)
+        assert not supervisor.called
+
+    def test_worker_keeping_a_storage_not_fork_safe_fails(self):
+        # given
+        bot = TockBot().use_storage(mock.Mock(spec=Storage, fork_safe=False))
+        with mock.patch('tock.bot.WorkerSupervisor') as supervisor:
+            bot.start_webhook(host="127.0.0.1", path="key", port=5000, workers=2,
+                              on_worker_start=lambda bot, index: None)
+        run_worker = supervisor.call_args.kwargs["target"]
+
+        # then
+        with mock.patch('tock.bot.TockWebhook') as webhook:
+            with self.assertRaises(RuntimeError):
+                run_worker(0)
+        assert not webhook.called
+
+    def test_worker_replacing_a_storage_not_fork_safe_serves(self):
+        # given
+        bot = TockBot().use_storage(mock.Mock(spec=Storage, fork_safe=False))
+        with mock.patch('tock.bot.WorkerSupervisor') as supervisor:
+            bot.start_webhook(host="127.0.0.1", path="key", port=5000, workers=2,
+                              on_worker_start=lambda bot, index: bot.use_storage(MemoryStorage()))
+        run_worker = supervisor.call_args.kwargs["target"]
+
+        # when
+        with mock.patch('tock.bot.TockWebhook') as webhook:
+            run_worker(0)
+
+        # then
+        webhook.return_value.start.assert_called_once_with(reuse_port=True)
+
+    def test_sharded_workers_keep_user_sessions(self):
+        # given
+        def count(bus: TockBotBus):
+            counter = (bus.session.get_item("count") or 0) + 1
+            bus.session.set_item("count", counter)
+            bus.send(f"{bus.session.user_id.id}{counter}")
+
+        frames = [given_user_frame(f"{user}{i}", "count", user) for i in range(3) for user in ("a", "b", "c", "d")]
+
+        # when
+        ws = run_bot(TockBot().register_story(count), frames, workers=2)
+
+        # then
+        self.assertEqual(
+            sorted(f"{user}{i}" for i in range(1, 4) for user in ("a", "b", "c", "d")),
+            sorted(sent_texts(ws))
+        )
+
+    def test_pipeline_stages_and_stories_are_timed(self):
+        # given
+        def goodbye(bus: TockBotBus):
+            bus.send("goodbye")
+
+        def failure(bus: TockBotBus):
+            raise ValueError("failure")
+
+        bot = TockBot().register_stories(goodbye, failure)
+
+        # when
+        run_bot(bot, [given_frame("r1", "goodbye"), given_frame("r2", "failure"), given_frame("r3", "goodbye")])
+
+        # then
+        self.assertEqual(
+            {DECODE, SESSION_LOAD, STORY_LOOKUP, STORY_CREATE, ANSWER, RESPONSE_BUILD, SESSION_SAVE, ENCODE},
+            set(bot.metrics.stages)
+        )
+        self.assertEqual(3, bot.metrics.stages[ANSWER].count)
+        self.assertEqual({"goodbye": 2, "failure": 1}, {name: h.count for name, h in bot.metrics.stories.items()})
+        self.assertEqual({"goodbye": 0, "failure": 1}, bot.metrics.errors)
+
+    def test_middleware_answers_in_place_of_the_story(self):
+        # given
+        def goodbye(bus: TockBotBus):
+            bus.send("goodbye")
+
+        async def maintenance(message: TockMessage, call_next) -> TockMessage:
+            return TockMessage(request_id=message.request_id)
+
+        # when
+        ws = run_bot(TockBot().register_story(goodbye).use_middleware(maintenance), [given_frame("r1", "goodbye")])
+
+        # then
+        self.assertEqual([{"requestId": "r1"}], [json.loads(data) for data in ws.sent[1:]])
+
+    def test_retried_request_is_answered_without_running_the_story_again(self):
+        # given
+        calls = []
+
+        def goodbye(bus: TockBotBus):
+            calls.append(bus.request)
+            bus.send("goodbye")
+
+        bot = TockBot().register_story(goodbye).use_idempotency()
+
+        # when
+        ws = run_bot(bot, [given_frame("r1", "goodbye"), given_frame("r1", "goodbye")])
+
+        # then
+        self.assertEqual(1, len(calls))
+        self.assertEqual(2, len(ws.sent[1:]))
+        self.assertEqual(ws.sent[1], ws.sent[2])
+
+    def test_cacheable_story_answers_from_the_response_cache(self):
+        # given
+        calls = []
+
+        @story(intent="faq", cacheable=True)
+        def faq(bus: TockBotBus):
+            calls.append(bus.request)
+            bus.send("answer")
+
+        bot = TockBot().register_story(faq).use_response_cache()
+
+        # when
+        ws = run_bot(bot, [given_user_frame("r1", "faq", "a"), given_user_frame("r2", "faq", "b")])
+
+        # then
+        self.assertEqual(1, len(calls))
+        self.assertEqual(["answer", "answer"], sent_texts(ws))
+        self.assertEqual(["r1", "r2"], [json.loads(data)["botResponse"]["context"]["requestId"] for data in ws.sent[1:]])
+
+    def test_story_is_not_cached_by_default(self):
+        # given
+        calls = []
+
+        def goodbye(bus: TockBotBus):
+            calls.append(bus.request)
+            bus.send("goodbye")
+
+        bot = TockBot().register_story(goodbye).use_response_cache()
+
+        # when
+        run_bot(bot, [given_frame("r1", "goodbye"), given_frame("r2", "goodbye")])
+
+        # then
+        self.assertEqual(2, len(calls))
+
+    def test_lazy_codec(self):
+        # given
+        def goodbye(bus: TockBotBus):
+            bus.send("goodbye")
+
+        # when
+        ws = run_bot(TockBot().use_codec(TockMessageCodec(lazy=True)).register_story(goodbye),
+                     [given_frame("r1", "goodbye")])
+
+        # then
+        self.assertEqual(["goodbye"], sent_texts(ws))
+
+    def test_lazy_entities_stay_raw_on_the_next_request_of_the_user(self):
+        # given
+        raw_entities = []
+
+        def goodbye(bus: TockBotBus):
+            raw_entities.append([entity.raw is not None for entity in bus.request.entities])
+            bus.send("goodbye")
+
+        bot_request = replace(given_bot_request(), intent="goodbye", story_id="goodbye")
+        frames = [TockMessageSchema().dumps(TockMessage(request_id=request_id, bot_request=bot_request))
+                  for request_id in ("r1", "r2")]
+
+        # when
+        run_bot(TockBot().use_codec(TockMessageCodec(lazy=True)).register_story(goodbye), frames)
+
+        # then
+        self.assertEqual([[True], [True]], raw_entities)
+
+    def test_lazy_entities_stay_raw_when_saved_on_disk(self):
+        for codec in (PickleSessionCodec(), CompactSessionCodec()):
+            with self.subTest(codec=type(codec).__name__), tempfile.TemporaryDirectory() as directory:
+                # given
+                entities = []
+
+                def goodbye(bus: TockBotBus):
+                    entities.extend(bus.request.entities)
+                    bus.send("goodbye")
+
+                bot_request = replace(given_bot_request(), intent="goodbye", story_id="goodbye")
+                frames = [TockMessageSchema().dumps(TockMessage(request_id=request_id, bot_request=bot_request))
+                          for request_id in ("r1", "r2")]
+                bot = TockBot() \
+                    .use_codec(TockMessageCodec(lazy=True)) \
+                    .use_storage(FileStorage(directory, codec=codec)) \
+                    .register_story(goodbye)
+
+                # when
+                ws = run_bot(bot, frames)
+
+                # then
+                self.assertEqual([True, True], [entity.raw is not None for entity in entities])
+                self.assertEqual(json.loads(frames[1])["botRequest"]["entities"],
+                                 json.loads(ws.sent[-1])["botResponse"]["entities"])
+
+
+if __name__ == '__main__':
+    unittest.main()
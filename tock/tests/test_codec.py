@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+import json
+import pickle
+import unittest
+from dataclasses import replace
+from unittest import TestCase
+
+from marshmallow import ValidationError
+
+from tock.codec import Codec, TockMessageCodec, LazyBotRequest, LazyEntity
+from tock.models import ClientConfiguration, TockMessage, RawBotMessage, BotRequest, Entity
+from tock.schemas import ConnectorTypeSchema, EntitySchema, MessageSchema, UserIdSchema, UserSchema, \
+    RequestContextSchema, SuggestionSchema, I18NTextSchema, \
+    ResponseContextSchema, BotRequestSchema, BotResponseSchema, TockMessageSchema, \
+    CardSchema, SentenceSchema, AttachmentSchema, ActionSchema, CarouselSchema, ClientConfigurationSchema, \
+    StoryConfigurationSchema, DurationValueSchema, StringValueSchema, DistanceValueSchema, \
+    AmountOfMoneyValueSchema, TemperatureValueSchema, DateIntervalEntityValueSchema, DateEntityValueSchema, \
+    EmailValueSchema, NumberValueSchema, OrdinalValueSchema, PhoneNumberValueSchema, UrlValueSchema, VolumeValueSchema, \
+    UberBotMessageSchema
+from tock.tests.test_schemas import given_amount_of_money_value, given_date_entity_value, \
+    given_date_interval_entity_value, given_distance_value, given_duration_value, given_email_value, \
+    given_number_value, given_ordinal_value, given_phone_number_value, given_string_value, \
+    given_temperature_value, given_url_value, given_volume_value, given_entity, given_message, \
+    given_connector_type, given_user_id, given_user, given_request_context, given_suggestion, \
+    given_i18n_text, given_sentence, given_attachment, given_action, given_card, given_carousel, \
+    given_response_context, given_bot_request, given_bot_response, given_tock_message, given_story_configuration
+
+FIXTURES = [
+    (AmountOfMoneyValueSchema, given_amount_of_money_value),
+    (DateEntityValueSchema, given_date_entity_value),
+    (DateIntervalEntityValueSchema, given_date_interval_entity_value),
+    (DistanceValueSchema, given_distance_value),
+    (DurationValueSchema, given_duration_value),
+    (EmailValueSchema, given_email_value),
+    (NumberValueSchema, given_number_value),
+    (OrdinalValueSchema, given_ordinal_value),
+    (PhoneNumberValueSchema, given_phone_number_value),
+    (StringValueSchema, given_string_value),
+    (TemperatureValueSchema, given_temperature_value),
+    (UrlValueSchema, given_url_value),
+    (VolumeValueSchema, given_volume_value),
+    (EntitySchema, given_entity),
+    (MessageSchema, given_message),
+    (ConnectorTypeSchema, given_connector_type),
+    (UserIdSchema, given_user_id),
+    (UserSchema, given_user),
+    (RequestContextSchema, given_request_context),
+    (SuggestionSchema, given_suggestion),
+    (I18NTextSchema, given_i18n_text),
+    (SentenceSchema, given_sentence),
+    (AttachmentSchema, given_attachment),
+    (ActionSchema, given_action),
+    (CardSchema, given_card),
+    (CarouselSchema, given_carousel),
+    (ResponseContextSchema, given_response_context),
+    (BotRequestSchema, given_bot_request),
+    (BotResponseSchema, given_bot_response),
+    (TockMessageSchema, given_tock_message),
+    (StoryConfigurationSchema, given_story_configuration),
+    (ClientConfigurationSchema, lambda: ClientConfiguration(stories=[given_story_configuration()])),
+]
+
+
+class TestCodecConformance(TestCase):
+    def test_dumps_is_identical_to_schema(self):
+        for schema_class, given in FIXTURES:
+            with self.subTest(schema=schema_class.__name__):
+                expected = schema_class().dumps(given())
+                result = Codec(schema_class).dumps(given())
+                self.assertEqual(expected, result)
+
+    def test_load_is_identical_to_schema(self):
+        for schema_class, given in FIXTURES:
+            with self.subTest(schema=schema_class.__name__):
+                payload = json.loads(schema_class().dumps(given()))
+                expected = schema_class().load(payload)
+                result = Codec(schema_class).load(payload)
+                self.assertEqual(expected, result)
+                self.assertEqual(type(expected), type(result))
+
+    def test_json_serialization(self):
+        for schema_class, given in FIXTURES:
+            with self.subTest(schema=schema_class.__name__):
+                expected = given()
+                codec = Codec(schema_class)
+                result = codec.load(json.loads(codec.dumps(expected)))
+                self.assertEqual(expected, result)
+
+
+def without(path, key):
+    def change(payload):
+        target = payload
+        for name in path:
+            target = target[name]
+        del target[key]
+    return change
+
+
+def with_null(path, key):
+    def change(payload):
+        target = payload
+        for name in path:
+            target = target[name]
+        target[key] = None
+    return change
+
+
+INVALID_PAYLOADS = [
+    ("missing requestId", without([], "requestId")),
+    ("null requestId", with_null([], "requestId")),
+    ("missing intent", without(["botRequest"], "intent")),
+    ("null message", with_null(["botRequest"], "message")),
+    ("missing entity role", without(["botRequest", "entities", 0], "role")),
+    ("missing user id", without(["botRequest", "context", "userId"], "id")),
+]
+
+
+class TestCodecInvalidPayloads(TestCase):
+    def test_invalid_payloads_are_rejected_like_schema(self):
+        for name, change in INVALID_PAYLOADS:
+            with self.subTest(payload=name):
+                payload = json.loads(TockMessageSchema().dumps(given_tock_message()))
+                change(payload)
+                with self.assertRaises(ValidationError):
+                    TockMessageSchema().load(payload)
+                with self.assertRaises(ValidationError):
+                    TockMessageCodec().load(payload)
+
+
+INVALID_ENVELOPES = [
+    ("missing intent", without(["botRequest"], "intent")),
+    ("null intent", with_null(["botRequest"], "intent")),
+    ("missing entities", without(["botRequest"], "entities")),
+    ("null entities", with_null(["botRequest"], "entities")),
+    ("null message", with_null(["botRequest"], "message")),
+    ("missing storyId", without(["botRequest"], "storyId")),
+    ("null storyId", with_null(["botRequest"], "storyId")),
+    ("null context", with_null(["botRequest"], "context")),
+]
+
+
+class TestLazyCodecInvalidPayloads(TestCase):
+    def test_invalid_envelopes_are_rejected_on_load_like_eager_codec(self):
+        for name, change in INVALID_ENVELOPES:
+            with self.subTest(payload=name):
+                payload = json.loads(TockMessageSchema().dumps(given_tock_message()))
+                change(payload)
+                with self.assertRaises(ValidationError) as expected:
+                    TockMessageCodec().load(payload)
+                with self.assertRaises(ValidationError) as result:
+                    TockMessageCodec(lazy=True).load(payload)
+                self.assertEqual(expected.exception.messages, result.exception.messages)
+
+
+class TestTockMessageCodec(TestCase):
+    def test_payload(self):
+        expected = '{"botRequest": {"intent": "greetings", "entities": [], "message": {"type": "text", "text": "yo"}, "storyId": "tock_unknown_story", "context": {"namespace": "elebescond", "language": "fr", "connectorType": {"id": "web", "userInterfaceType": "textChat"}, "userInterface": "textChat", "applicationId": "test-erwan_assistant", "userId": {"id": "test_5dcae4ec816a555b46a4857f_fr__sjniho739", "type": "user"}, "botId": {"id": "test_bot_5dcae4ec816a555b46a4857f_fr", "type": "bot"}, "user": {"timezone": "UTC", "locale": "fr", "test": false}}}, "requestId": "5f788c08c93772446f21d05f"}'
+        codec = TockMessageCodec()
+        loads: TockMessage = codec.loads(expected)
+        self.assertEqual(TockMessageSchema().loads(expected), loads)
+        self.assertEqual(expected, codec.dumps(loads))
+
+    def test_raw_messages_are_dumped_as_they_are(self):
+        # given
+        raw = RawBotMessage(UberBotMessageSchema().dump(given_sentence()))
+        message = TockMessage(request_id="request_id",
+                              bot_response=replace(given_bot_response(), messages=[raw, given_carousel()]))
+
+        # when
+        result = TockMessageCodec().dumps(message)
+
+        # then
+        self.assertEqual(TockMessageSchema().dumps(message), result)
+        self.assertEqual(raw.data, json.loads(result)["botResponse"]["messages"][0])
+
+    def test_invalid_payload_raises_validation_error(self):
+        with self.assertRaises(ValidationError):
+            TockMessageCodec().loads('{"botRequest": {"intent": "greetings"}, "requestId": "id"}')
+
+
+class TestLazyTockMessageCodec(TestCase):
+
+    def test_lazy_load_is_equal_to_schema(self):
+        # given
+        payload = json.loads(TockMessageSchema().dumps(given_tock_message()))
+
+        # when
+        result = TockMessageCodec(lazy=True).load(payload)
+
+        # then
+        self.assertIsInstance(result.bot_request, LazyBotRequest)
+        self.assertIsInstance(result.bot_request.entities[0], LazyEntity)
+        self.assertEqual(TockMessageSchema().load(payload), result)
+        self.assertEqual(TockMessageSchema().dumps(given_tock_message()), TockMessageCodec(lazy=True).dumps(result))
+
+    def test_entity_values_are_decoded_when_read(self):
+        # given
+        payload = json.loads(TockMessageSchema().dumps(given_tock_message()))
+        payload["botRequest"]["entities"][0]["value"] = {"@type": "unknown"}
+
+        # when
+        result = TockMessageCodec(lazy=True).load(payload)
+        entity = result.bot_request.entities[0]
+
+        # then
+        self.assertEqual(given_entity().type, entity.type)
+        with self.assertRaises(KeyError):
+            entity.value
+
+    def test_user_id_is_read_without_decoding_the_context(self):
+        # given
+        payload = json.loads(TockMessageSchema().dumps(given_tock_message()))
+        del payload["botRequest"]["context"]["namespace"]
+
+        # when
+        result = TockMessageCodec(lazy=True).load(payload)
+
+        # then
+        self.assertEqual(given_bot_request().context.user_id, result.bot_request.user_id)
+        with self.assertRaises(ValidationError):
+            result.bot_request.context
+
+    def test_lazy_requests_are_compared_without_decoding(self):
+        # given
+        payload = json.loads(TockMessageSchema().dumps(given_tock_message()))
+        del payload["botRequest"]["context"]["namespace"]
+        other = json.loads(json.dumps(payload))
+        other["botRequest"]["message"]["text"] = "other"
+        codec = TockMessageCodec(lazy=True)
+
+        # then
+        self.assertEqual(codec.load(payload).bot_request, codec.load(payload).bot_request)
+        self.assertNotEqual(codec.load(payload).bot_request, codec.load(other).bot_request)
+
+    def test_lazy_entities_are_compared_without_decoding_their_values(self):
+        # given
+        payload = json.loads(TockMessageSchema().dumps(given_tock_message()))
+        other = json.loads(json.dumps(payload))
+        other["botRequest"]["entities"][0]["value"]["value"] = "other"
+        codec = TockMessageCodec(lazy=True)
+        entity = codec.load(payload).bot_request.entities[0]
+
+        # when
+        equal = entity == codec.load(payload).bot_request.entities[0]
+        not_equal = entity != codec.load(other).bot_request.entities[0]
+
+        # then
+        self.assertTrue(equal)
+        self.assertTrue(not_equal)
+        self.assertIsNotNone(entity.raw)
+        self.assertEqual(given_entity(), entity)
+
+    def test_lazy_entities_are_compared_to_entities_without_decoding_their_values(self):
+        # given
+        payload = json.loads(TockMessageSchema().dumps(given_tock_message()))
+        codec = TockMessageCodec(lazy=True)
+        entity = codec.load(payload).bot_request.entities[0]
+        decoded = codec.load(payload).bot_request.entities[0]
+        decoded.value
+
+        # when
+        equal = [entity == given_entity(), given_entity() == entity, [given_entity()] == [entity], entity == decoded]
+        not_equal = entity != replace(given_entity(), value=given_number_value())
+
+        # then
+        self.assertEqual([True, True, True, True], equal)
+        self.assertTrue(not_equal)
+        self.assertIsNotNone(entity.raw)
+
+    def test_lazy_models_are_pickled_as_models(self):
+        # given
+        payload = json.loads(TockMessageSchema().dumps(given_tock_message()))
+        bot_request = TockMessageCodec(lazy=True).load(payload).bot_request
+
+        # when
+        result = pickle.loads(pickle.dumps(bot_request))
+
+        # then
+        self.assertIs(BotRequest, type(result))
+        self.assertIs(LazyEntity, type(result.entities[0]))
+        self.assertIsNotNone(result.entities[0].raw)
+        self.assertEqual(given_bot_request(), result)
+
+    def test_changed_lazy_entities_are_pickled_as_entities(self):
+        # given
+        payload = json.loads(TockMessageSchema().dumps(given_tock_message()))
+        entity = TockMessageCodec(lazy=True).load(payload).bot_request.entities[0]
+        entity.content = "changed"
+
+        # when
+        result = pickle.loads(pickle.dumps(entity))
+
+        # then
+        self.assertIs(Entity, type(result))
+        self.assertEqual("changed", result.content)
+        self.assertEqual(given_bot_request().entities[0].value, result.value)
+
+    def test_unchanged_entities_are_dumped_as_loaded(self):
+        # given
+        payload = json.loads(TockMessageSchema().dumps(given_tock_message()))
+        fragment = dict(payload["botRequest"]["entities"][0], subEntities=[])
+        payload["botRequest"]["entities"] = [fragment]
+        codec = TockMessageCodec(lazy=True)
+        bot_request = codec.load(payload).bot_request
+
+        # when
+        result = codec.dump(TockMessage(bot_response=replace(given_bot_response(), entities=bot_request.entities)))
+
+        # then
+        self.assertIs(fragment, result["botResponse"]["entities"][0])
+
+    def test_changed_entities_are_dumped_again(self):
+        # given
+        payload = json.loads(TockMessageSchema().dumps(given_tock_message()))
+        payload["botRequest"]["entities"] *= 2
+        codec = TockMessageCodec(lazy=True)
+        changed, read = codec.load(payload).bot_request.entities
+        changed.content = "changed"
+        self.assertEqual(given_entity().value, read.value)
+
+        # when
+        result = codec.dump(TockMessage(bot_response=replace(given_bot_response(), entities=[changed, read])))
+
+        # then
+        expected = TockMessageSchema().dump(TockMessage(bot_response=replace(
+            given_bot_response(), entities=[replace(given_entity(), content="changed"), given_entity()])))
+        self.assertEqual(expected, result)
+        self.assertIsNot(payload["botRequest"]["entities"][1], result["botResponse"]["entities"][1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+from unittest import mock
+
+from tock.idempotency import IdempotencyCache
+
+
+class Computation:
+
+    def __init__(self, delay: float = 0, failures: int = 0):
+        self.calls = 0
+        self.delay = delay
+        self.failures = failures
+
+    async def __call__(self) -> bytes:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.calls <= self.failures:
+            raise ValueError("failure")
+        return f"response {self.calls}".encode('utf-8')
+
+
+class TestIdempotencyCache(unittest.TestCase):
+
+    def test_duplicate_gets_the_first_response(self):
+        # given
+        cache = IdempotencyCache()
+        compute = Computation()
+
+        async def run():
+            return [await cache.get_or_compute("r1", compute), await cache.get_or_compute("r1", compute)]
+
+        # when
+        responses = asyncio.run(run())
+
+        # then
+        self.assertEqual([b"response 1", b"response 1"], responses)
+        self.assertEqual(1, compute.calls)
+        self.assertEqual(1, cache.stats.hits)
+        self.assertEqual(1, cache.stats.misses)
+
+    def test_concurrent_duplicates_wait_for_the_first_execution(self):
+        # given
+        cache = IdempotencyCache()
+        compute = Computation(delay=0.01)
+
+        async def run():
+            return await asyncio.gather(*[cache.get_or_compute("r1", compute) for _ in range(5)])
+
+        # when
+        responses = asyncio.run(run())
+
+        # then
+        self.assertEqual([b"response 1"] * 5, responses)
+        self.assertEqual(1, compute.calls)
+
+    def test_duplicate_of_a_failed_request_is_executed_again(self):
+        # given
+        cache = IdempotencyCache()
+        compute = Computation(delay=0.01, failures=1)
+
+        async def run():
+            return await asyncio.gather(cache.get_or_compute("r1", compute), cache.get_or_compute("r1", compute),
+                                        return_exceptions=True)
+
+        # when
+        first, second = asyncio.run(run())
+
+        # then
+        self.assertIsInstance(first, ValueError)
+        self.assertEqual(b"response 2", second)
+
+    @mock.patch('tock.idempotency.monotonic')
+    def test_response_expires_after_ttl(self, monotonic):
+        # given
+        cache = IdempotencyCache(ttl=10)
+        compute = Computation()
+
+        async def run():
+            monotonic.return_value = 100
+            await cache.get_or_compute("r1", compute)
+            monotonic.return_value = 111
+            return await cache.get_or_compute("r1", compute)
+
+        # when
+        response = asyncio.run(run())
+
+        # then
+        self.assertEqual(b"response 2", response)
+
+    def test_oldest_requests_are_forgotten_above_max_size(self):
+        # given
+        cache = IdempotencyCache(max_size=2)
+        compute = Computation()
+
+        async def run():
+            for request_id in ("r1", "r2", "r3"):
+                await cache.get_or_compute(request_id, compute)
+            return await cache.get_or_compute("r1", compute)
+
+        # when
+        response = asyncio.run(run())
+
+        # then
+        self.assertEqual(b"response 4", response)
+        self.assertEqual(2, len(cache))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+from unittest import TestCase
+
+from tock.json_backend import json_backend, BACKENDS
+from tock.schemas import TockMessageSchema
+from tock.tests.test_schemas import given_tock_message
+
+
+def available_backends():
+    for name in BACKENDS:
+        try:
+            yield json_backend(name)
+        except ImportError:
+            pass
+
+
+class TestJsonBackend(TestCase):
+    def test_round_trip(self):
+        payload = TockMessageSchema().dump(given_tock_message())
+        for backend in available_backends():
+            with self.subTest(backend=backend.name):
+                dumps = backend.dumps(payload)
+                self.assertIsInstance(dumps, bytes)
+                self.assertEqual(payload, json.loads(dumps))
+                self.assertEqual(payload, backend.loads(dumps))
+                self.assertEqual(payload, backend.loads(dumps.decode('utf-8')))
+
+    def test_non_ascii_text(self):
+        for backend in available_backends():
+            with self.subTest(backend=backend.name):
+                self.assertEqual({"text": "héllo / 👋"}, json.loads(backend.dumps({"text": "héllo / 👋"})))
+
+    def test_default_backend_is_installed(self):
+        self.assertIn(json_backend().name, BACKENDS)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            json_backend("unknown")
+
+
+if __name__ == '__main__':
+    unittest.main()
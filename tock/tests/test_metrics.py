@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from tock.metrics import Histogram, Metrics, ANSWER, DECODE
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_observations_are_counted_by_bucket(self):
+        # given
+        histogram = Histogram(buckets=(0.1, 1.0))
+
+        # when
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+
+        # then
+        self.assertEqual([2, 1, 1], histogram.counts)
+        self.assertEqual(4, histogram.count)
+        self.assertAlmostEqual(2.65, histogram.sum)
+
+    def test_quantile_is_the_upper_bound_of_its_bucket(self):
+        # given
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in [0.05] * 98 + [0.5, 5.0]:
+            histogram.observe(value)
+
+        # then
+        self.assertEqual(0.1, histogram.quantile(0.5))
+        self.assertEqual(1.0, histogram.quantile(0.99))
+        self.assertEqual(float("inf"), histogram.quantile(1.0))
+        self.assertIsNone(Histogram().quantile(0.5))
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_time_observes_stage_duration(self):
+        # given
+        metrics = Metrics()
+
+        # when
+        with metrics.time(DECODE):
+            pass
+
+        # then
+        self.assertEqual(1, metrics.stages[DECODE].count)
+        self.assertGreaterEqual(metrics.stages[DECODE].sum, 0)
+
+    def test_read_histograms_are_copies(self):
+        # given
+        metrics = Metrics()
+        metrics.observe(ANSWER, 0.1)
+        stages = metrics.stages
+
+        # when
+        metrics.observe(ANSWER, 0.1)
+
+        # then
+        self.assertEqual(1, stages[ANSWER].count)
+
+    def test_prometheus_text(self):
+        # given
+        metrics = Metrics(buckets=(0.1, 1.0))
+        metrics.observe(ANSWER, 0.05)
+        metrics.observe_story('say "hi"', 0.5, error=True)
+
+        # when
+        text = metrics.prometheus()
+
+        # then
+        self.assertEqual(
+            '# HELP tock_stage_duration_seconds Duration of the bot request pipeline stages\n'
+            '# TYPE tock_stage_duration_seconds histogram\n'
+            'tock_stage_duration_seconds_bucket{stage="answer",le="0.1"} 1\n'
+            'tock_stage_duration_seconds_bucket{stage="answer",le="1.0"} 1\n'
+            'tock_stage_duration_seconds_bucket{stage="answer",le="+Inf"} 1\n'
+            'tock_stage_duration_seconds_sum{stage="answer"} 0.05\n'
+            'tock_stage_duration_seconds_count{stage="answer"} 1\n'
+            '# HELP tock_story_duration_seconds Duration of the story answers\n'
+            '# TYPE tock_story_duration_seconds histogram\n'
+            'tock_story_duration_seconds_bucket{story="say \\"hi\\"",le="0.1"} 0\n'
+            'tock_story_duration_seconds_bucket{story="say \\"hi\\"",le="1.0"} 1\n'
+            'tock_story_duration_seconds_bucket{story="say \\"hi\\"",le="+Inf"} 1\n'
+            'tock_story_duration_seconds_sum{story="say \\"hi\\""} 0.5\n'
+            'tock_story_duration_seconds_count{story="say \\"hi\\""} 1\n'
+            '# HELP tock_story_errors_total Count of story answers raising an error\n'
+            '# TYPE tock_story_errors_total counter\n'
+            'tock_story_errors_total{story="say \\"hi\\""} 1\n',
+            text
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
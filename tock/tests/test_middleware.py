@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+from typing import List, Optional
+
+from tock.middleware import Middleware, compose
+from tock.models import TockMessage
+
+
+class Recorder(Middleware):
+
+    def __init__(self, name: str, calls: List[str]):
+        self.name = name
+        self.calls = calls
+
+    def before(self, message: TockMessage) -> Optional[TockMessage]:
+        self.calls.append(f"before {self.name}")
+        return None
+
+    def after(self, message: TockMessage, response: TockMessage) -> Optional[TockMessage]:
+        self.calls.append(f"after {self.name}")
+        return None
+
+
+def handle(middlewares, message: TockMessage, calls: List[str] = None) -> TockMessage:
+    async def bot_handler(request: TockMessage) -> TockMessage:
+        if calls is not None:
+            calls.append("bot")
+        return TockMessage(request_id=f"answer to {request.request_id}")
+
+    return asyncio.run(compose(middlewares, bot_handler)(message))
+
+
+class TestMiddleware(unittest.TestCase):
+
+    def test_without_middleware_the_handler_is_unchanged(self):
+        # given
+        async def bot_handler(request: TockMessage) -> TockMessage:
+            return request
+
+        # then
+        self.assertIs(bot_handler, compose([], bot_handler))
+
+    def test_middlewares_run_in_registration_order(self):
+        # given
+        calls = []
+
+        async def tracing(message: TockMessage, call_next) -> TockMessage:
+            calls.append("before async")
+            response = await call_next(message)
+            calls.append("after async")
+            return response
+
+        # when
+        response = handle([Recorder("first", calls), tracing, Recorder("last", calls)], TockMessage(request_id="r1"), calls)
+
+        # then
+        self.assertEqual("answer to r1", response.request_id)
+        self.assertEqual(
+            ["before first", "before async", "before last", "bot", "after last", "after async", "after first"],
+            calls
+        )
+
+    def test_before_short_circuits_the_next_handlers(self):
+        # given
+        calls = []
+
+        class Cached(Middleware):
+            def before(self, message: TockMessage) -> Optional[TockMessage]:
+                return TockMessage(request_id="cached")
+
+        # when
+        response = handle([Cached(), Recorder("next", calls)], TockMessage(request_id="r1"), calls)
+
+        # then
+        self.assertEqual("cached", response.request_id)
+        self.assertEqual([], calls)
+
+    def test_after_replaces_the_response(self):
+        # given
+        class Replacing(Middleware):
+            def after(self, message: TockMessage, response: TockMessage) -> Optional[TockMessage]:
+                return TockMessage(request_id=response.request_id.upper())
+
+        # when
+        response = handle([Replacing()], TockMessage(request_id="r1"))
+
+        # then
+        self.assertEqual("ANSWER TO R1", response.request_id)
+
+    def test_async_middleware_changes_the_message(self):
+        # given
+        async def renaming(message: TockMessage, call_next) -> TockMessage:
+            return await call_next(TockMessage(request_id="renamed"))
+
+        # when
+        response = handle([renaming], TockMessage(request_id="r1"))
+
+        # then
+        self.assertEqual("answer to renamed", response.request_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import pickle
+import unittest
+from dataclasses import FrozenInstanceError, replace
+
+from tock.models import Entity, UserId, PlayerType, Sentence, Carousel
+from tock.tests.test_schemas import given_entity, given_sentence, given_carousel, given_bot_request, given_user_id
+
+
+class TestSlottedModels(unittest.TestCase):
+
+    def test_instances_have_no_dict(self):
+        for model in (given_entity(), given_entity().value, given_sentence(), given_carousel(), given_bot_request()):
+            with self.subTest(model=type(model).__name__):
+                self.assertFalse(hasattr(model, '__dict__'))
+
+    def test_pickle(self):
+        for model in (given_entity(), given_sentence(), given_carousel(), given_bot_request(), given_user_id()):
+            with self.subTest(model=type(model).__name__):
+                self.assertEqual(model, pickle.loads(pickle.dumps(model)))
+
+    def test_dict_state_pickled_before_slots_is_loaded(self):
+        # given
+        entity = Entity.__new__(Entity)
+
+        # when
+        entity.__setstate__({"type": "type", "role": "role", "evaluated": True, "new": False,
+                             "content": "content", "value": None, "removed": "field"})
+
+        # then
+        self.assertEqual(Entity(type="type", role="role", evaluated=True, new=False, content="content"), entity)
+
+    def test_user_id_is_frozen(self):
+        # given
+        user_id = UserId(id="id", type=PlayerType.USER)
+
+        # then
+        with self.assertRaises(FrozenInstanceError):
+            user_id.id = "other"
+        self.assertEqual({user_id}, {UserId(id="id", type=PlayerType.USER)})
+        self.assertEqual("other", replace(user_id, id="other").id)
+
+    def test_bot_messages_keep_their_delay(self):
+        # when
+        sentence = Sentence.Builder("hello").with_delay(3).build()
+        carousel = Carousel(cards=[], delay=2)
+
+        # then
+        self.assertEqual(3, sentence.delay)
+        self.assertEqual(2, carousel.delay)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+from dataclasses import replace
+from datetime import datetime
+
+from tock.codec import TockMessageCodec
+from tock.models import RawBotMessage, TockMessage
+from tock.response_cache import ResponseCache
+from tock.schemas import TockMessageSchema
+from tock.tests.test_schemas import given_bot_request, given_request_context, given_entity, given_date_entity_value
+
+
+def given_messages(text: str):
+    return [RawBotMessage({"type": "sentence", "text": {"text": text}})]
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_key_depends_on_intent_entities_and_language(self):
+        # given
+        request = given_bot_request()
+        key = ResponseCache.key("story", request)
+
+        # then
+        self.assertEqual(key, ResponseCache.key("story", given_bot_request()))
+        self.assertNotEqual(key, ResponseCache.key("other", request))
+        self.assertNotEqual(key, ResponseCache.key("story", replace(request, intent="other")))
+        self.assertNotEqual(key, ResponseCache.key("story", replace(request, entities=[])))
+        self.assertNotEqual(key, ResponseCache.key(
+            "story", replace(request, entities=[replace(given_entity(), content="other")])))
+        self.assertNotEqual(key, ResponseCache.key(
+            "story", replace(request, context=replace(given_request_context(), language="en"))))
+
+    def test_key_depends_on_entity_values(self):
+        # given
+        def with_date(day: int):
+            entity = replace(given_entity(), type="date", content="tomorrow",
+                             value=given_date_entity_value(datetime(2020, 1, day)))
+            return replace(given_bot_request(), entities=[entity])
+
+        # then
+        self.assertEqual(ResponseCache.key("story", with_date(2)), ResponseCache.key("story", with_date(2)))
+        self.assertNotEqual(ResponseCache.key("story", with_date(2)), ResponseCache.key("story", with_date(3)))
+
+    def test_key_of_lazy_entities_does_not_decode_them(self):
+        # given
+        def load(day: int):
+            message = TockMessage(request_id="r1", bot_request=replace(given_bot_request(), entities=[
+                replace(given_entity(), value=given_date_entity_value(datetime(2020, 1, day)))]))
+            return TockMessageCodec(lazy=True).load(json.loads(TockMessageSchema().dumps(message))).bot_request
+
+        request = load(2)
+
+        # when
+        key = ResponseCache.key("story", request)
+
+        # then
+        self.assertIsNotNone(request.entities[0].raw)
+        self.assertEqual(key, ResponseCache.key("story", load(2)))
+        self.assertNotEqual(key, ResponseCache.key("story", load(3)))
+
+    def test_key_does_not_depend_on_user(self):
+        # given
+        request = given_bot_request()
+        other_user = replace(request, context=replace(given_request_context(), user_id=replace(
+            request.context.user_id, id="other")))
+
+        # then
+        self.assertEqual(ResponseCache.key("story", request), ResponseCache.key("story", other_user))
+
+    def test_least_recently_used_answers_are_evicted(self):
+        # given
+        cache = ResponseCache(max_size=2)
+        cache.put(("a",), given_messages("a"))
+        cache.put(("b",), given_messages("b"))
+        cache.get(("a",))
+
+        # when
+        cache.put(("c",), given_messages("c"))
+
+        # then
+        self.assertEqual(given_messages("a"), cache.get(("a",)))
+        self.assertIsNone(cache.get(("b",)))
+        self.assertEqual(2, len(cache))
+
+    def test_stats(self):
+        # given
+        cache = ResponseCache()
+        cache.put(("a",), given_messages("a"))
+
+        # when
+        cache.get(("a",))
+        cache.get(("b",))
+
+        # then
+        self.assertEqual((1, 1, 1), (cache.stats.size, cache.stats.hits, cache.stats.misses))
+
+
+if __name__ == '__main__':
+    unittest.main()
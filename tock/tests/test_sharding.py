@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import os
+import signal
+import unittest
+from collections import Counter
+from typing import List, Optional
+
+from tock.models import TockMessage
+from tock.sharding import ConsistentHashRing, ShardedHandler
+from tock.tests.test_websocket import given_frame
+
+
+def answer_with_pid(request: TockMessage) -> TockMessage:
+    return TockMessage(request_id=f"{request.request_id}:{os.getpid()}")
+
+
+def crash_on_boom(request: TockMessage) -> TockMessage:
+    if request.request_id == "boom":
+        os._exit(1)
+    return answer_with_pid(request)
+
+
+def kill_on_boom(request: TockMessage) -> TockMessage:
+    if request.request_id == "boom":
+        os.kill(os.getpid(), signal.SIGKILL)
+    return answer_with_pid(request)
+
+
+async def answer_slowly(request: TockMessage) -> TockMessage:
+    if request.request_id.startswith("slow"):
+        await asyncio.sleep(1)
+    return answer_with_pid(request)
+
+
+def users_of_worker(index: int, count: int) -> List[str]:
+    ring = ConsistentHashRing(2)
+    return [user for user in (f"user-{i}" for i in range(1000)) if ring.node(user) == index][:count]
+
+
+def handle(shards: ShardedHandler, frames: List[str]) -> List[Optional[str]]:
+    async def run():
+        return await asyncio.gather(*[shards.handle(frame) for frame in frames])
+
+    responses = asyncio.new_event_loop().run_until_complete(run())
+    return [None if response is None else json.loads(response)["requestId"] for response in responses]
+
+
+class TestConsistentHashRing(unittest.TestCase):
+
+    def test_keys_are_spread_over_nodes(self):
+        # given
+        ring = ConsistentHashRing(nodes=4)
+
+        # when
+        counts = Counter(ring.node(f"user-{i}") for i in range(4000))
+
+        # then
+        self.assertEqual({0, 1, 2, 3}, set(counts))
+        for count in counts.values():
+            self.assertGreater(count, 600)
+
+    def test_adding_a_node_moves_few_keys(self):
+        # given
+        before = ConsistentHashRing(nodes=4)
+        after = ConsistentHashRing(nodes=5)
+
+        # when
+        moved = [key for key in (f"user-{i}" for i in range(4000)) if before.node(key) != after.node(key)]
+
+        # then
+        self.assertLess(len(moved), 4000 / 3)
+        for key in moved:
+            self.assertEqual(4, after.node(key))
+
+
+class TestShardedHandler(unittest.TestCase):
+
+    def start(self, bot_handler) -> ShardedHandler:
+        shards = ShardedHandler(workers=2, bot_handler=bot_handler)
+        shards.start()
+        self.addCleanup(shards.close)
+        return shards
+
+    def test_user_is_always_answered_by_the_same_worker(self):
+        # given
+        shards = self.start(answer_with_pid)
+        frames = [given_frame(f"{user}{i}", user) for i in range(5) for user in ("a", "b", "c", "d")]
+
+        # when
+        responses = handle(shards, frames)
+
+        # then
+        pids_by_user = {}
+        for response in responses:
+            request_id, pid = response.split(":")
+            pids_by_user.setdefault(request_id[0], set()).add(pid)
+        for pids in pids_by_user.values():
+            self.assertEqual(1, len(pids))
+        self.assertNotIn(str(os.getpid()), {pid for pids in pids_by_user.values() for pid in pids})
+
+    def test_crashed_worker_is_restarted(self):
+        # given
+        shards = self.start(crash_on_boom)
+
+        # when
+        crashed = handle(shards, [given_frame("boom", "a")])
+        answered = handle(shards, [given_frame("a1", "a")])
+
+        # then
+        self.assertEqual([None], crashed)
+        self.assertEqual("a1", answered[0].split(":")[0])
+
+    def test_crashed_worker_is_restarted_during_traffic_on_other_workers(self):
+        # given
+        shards = self.start(crash_on_boom)
+        crashing_user, = users_of_worker(0, 1)
+        other_user, = users_of_worker(1, 1)
+
+        async def run():
+            crashed = asyncio.ensure_future(shards.handle(given_frame("boom", crashing_user)))
+            for i in range(40):
+                await shards.handle(given_frame(f"o{i}", other_user))
+                await asyncio.sleep(0.05)
+                if crashed.done():
+                    return i, crashed.result()
+            return None, None
+
+        # when
+        frames_before_restart, response = asyncio.new_event_loop().run_until_complete(run())
+
+        # then
+        self.assertIsNotNone(frames_before_restart)
+        self.assertIsNone(response)
+
+    def test_killed_worker_does_not_block_other_workers(self):
+        # given
+        shards = self.start(kill_on_boom)
+        killed_user, = users_of_worker(0, 1)
+        other_users = users_of_worker(1, 20)
+
+        # when
+        answered = handle(shards, [given_frame("boom", killed_user)]
+                          + [given_frame(f"o{i}", user) for i, user in enumerate(other_users)])
+        after_restart = handle(shards, [given_frame("k1", killed_user)])
+
+        # then
+        self.assertIsNone(answered[0])
+        self.assertEqual([f"o{i}" for i in range(20)], [response.split(":")[0] for response in answered[1:]])
+        self.assertEqual("k1", after_restart[0].split(":")[0])
+
+    def test_slow_user_does_not_delay_other_users_of_its_worker(self):
+        # given
+        shards = self.start(answer_slowly)
+        slow_user, fast_user = users_of_worker(0, 2)
+        completed = []
+
+        async def send(request_id: str, user: str):
+            await shards.handle(given_frame(request_id, user))
+            completed.append(request_id)
+
+        async def run():
+            await asyncio.gather(send("slow", slow_user), send("after-slow", slow_user), send("fast", fast_user))
+
+        # when
+        asyncio.new_event_loop().run_until_complete(run())
+
+        # then
+        self.assertEqual(["fast", "slow", "after-slow"], completed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import unittest
+from unittest import TestCase, mock
+
+from tock.bus import TockBotBus
+from tock.story import story, StoryDefinitions
+
+
+@story(intent="greetings", other_starter_intents=["hello"], secondary_intents=["more"])
+def greetings(bus: TockBotBus):
+    bus.send("hello")
+
+
+@story(intent="goodbye", secondary_intents=["hello", "more"])
+def goodbye(bus: TockBotBus):
+    bus.send("goodbye")
+
+
+def given_story_definitions() -> StoryDefinitions:
+    story_definitions = StoryDefinitions()
+    story_definitions.register_story(greetings())
+    story_definitions.register_story(goodbye())
+    return story_definitions
+
+
+class TestStoryDefinitions(TestCase):
+    def test_find_story_by_name(self):
+        story_definitions = given_story_definitions()
+
+        self.assertEqual("greetings", story_definitions.configuration(story_definitions.find_story("greetings")).name)
+        self.assertEqual("goodbye", story_definitions.configuration(story_definitions.find_story("goodbye")).name)
+        self.assertIsNone(story_definitions.find_story("hello"))
+
+    def test_find_story_by_intent_prefers_starter_intents(self):
+        story_definitions = given_story_definitions()
+
+        self.assertEqual("greetings", story_definitions.configuration(
+            story_definitions.find_story_by_intent("hello")).name)
+        self.assertEqual("greetings", story_definitions.configuration(
+            story_definitions.find_story_by_intent("more")).name)
+        self.assertEqual("goodbye", story_definitions.configuration(
+            story_definitions.find_story_by_intent("goodbye")).name)
+        self.assertIsNone(story_definitions.find_story_by_intent("unknown"))
+
+    def test_configuration_is_built_once_per_story(self):
+        story_definitions = StoryDefinitions()
+        story_type = greetings()
+        with mock.patch.object(story_type, "configuration", wraps=story_type.configuration) as configuration:
+            story_definitions.register_story(story_type)
+            story_definitions.find_story("greetings")
+            story_definitions.configuration(story_type)
+            story_definitions.client_configuration()
+
+        self.assertEqual(1, configuration.call_count)
+
+    def test_unknown_story_is_shared(self):
+        story_definitions = StoryDefinitions()
+
+        self.assertIs(story_definitions.unknown_story, story_definitions.unknown_story)
+        self.assertEqual("unknown", story_definitions.configuration(story_definitions.unknown_story).name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+import os
+import threading
+import time
+import unittest
+
+from tock.supervisor import WorkerSupervisor
+
+context = multiprocessing.get_context("fork")
+
+
+def wait_for(predicate, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+class TestWorkerSupervisor(unittest.TestCase):
+
+    def run_supervisor(self, supervisor: WorkerSupervisor) -> threading.Thread:
+        thread = threading.Thread(target=supervisor.run, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 10)
+        self.addCleanup(supervisor.stop)
+        return thread
+
+    def test_workers_are_started(self):
+        # given
+        started = context.Array('i', [0, 0, 0])
+
+        def target(index: int):
+            started[index] = os.getpid()
+            time.sleep(60)
+
+        # when
+        self.run_supervisor(WorkerSupervisor(target=target, workers=3))
+        wait_for(lambda: all(started))
+
+        # then
+        self.assertEqual(3, len(set(started)))
+        self.assertNotIn(os.getpid(), started)
+
+    def test_crashed_worker_is_restarted(self):
+        # given
+        runs = context.Value('i', 0)
+
+        def target(index: int):
+            with runs.get_lock():
+                runs.value += 1
+                first_run = runs.value == 1
+            if first_run:
+                os._exit(1)
+            time.sleep(60)
+
+        # when
+        self.run_supervisor(WorkerSupervisor(target=target, workers=1, restart_delay=0.01))
+        wait_for(lambda: runs.value == 2)
+
+        # then
+        self.assertEqual(2, runs.value)
+
+    def test_stop_terminates_workers(self):
+        # given
+        pids = context.Array('i', [0, 0])
+
+        def target(index: int):
+            pids[index] = os.getpid()
+            time.sleep(60)
+
+        supervisor = WorkerSupervisor(target=target, workers=2)
+        thread = self.run_supervisor(supervisor)
+        wait_for(lambda: all(pids))
+
+        # when
+        supervisor.stop()
+        thread.join(10)
+
+        # then
+        self.assertFalse(thread.is_alive())
+        for pid in pids:
+            with self.assertRaises(ProcessLookupError):
+                os.kill(pid, 0)
+
+    def test_workers_exiting_normally_are_not_restarted(self):
+        # given
+        runs = context.Value('i', 0)
+
+        def target(index: int):
+            with runs.get_lock():
+                runs.value += 1
+
+        supervisor = WorkerSupervisor(target=target, workers=2)
+
+        # when
+        thread = self.run_supervisor(supervisor)
+        thread.join(10)
+
+        # then
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(2, runs.value)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import unittest
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from tock.metrics import Metrics
+from tock.models import TockMessage, ClientConfiguration
+from tock.schemas import TockMessageSchema
+from tock.tests.test_schemas import given_bot_request, given_story_configuration
+from tock.webhook import TockWebhook
+
+
+def post(webhook: TockWebhook, payload: str) -> dict:
+    async def run():
+        async with TestClient(TestServer(webhook._TockWebhook__app)) as client:
+            response = await client.post("/webhook_key/webhook", data=payload)
+            return json.loads(await response.read())
+
+    return asyncio.run(run())
+
+
+def post_then_get(webhook: TockWebhook, payload: str, path: str):
+    async def run():
+        async with TestClient(TestServer(webhook._TockWebhook__app)) as client:
+            await client.post("/webhook_key/webhook", data=payload)
+            response = await client.get(path)
+            return response.headers["Content-Type"], await response.text()
+
+    return asyncio.run(run())
+
+
+class TestTockWebhook(unittest.TestCase):
+
+    def test_bot_request(self):
+        # given
+        async def bot_handler(request: TockMessage) -> TockMessage:
+            return TockMessage(request_id=request.request_id)
+
+        webhook = TockWebhook(bot_handler=bot_handler)
+        payload = TockMessageSchema().dumps(TockMessage(request_id="r1", bot_request=given_bot_request()))
+
+        # when
+        result = post(webhook, payload)
+
+        # then
+        self.assertEqual({"requestId": "r1"}, result)
+
+    def test_configuration_request(self):
+        # given
+        client_configuration = ClientConfiguration(stories=[given_story_configuration()])
+        webhook = TockWebhook(client_configuration=client_configuration)
+
+        # when
+        result = post(webhook, '{"requestId": "r1", "configuration": true}')
+
+        # then
+        self.assertEqual(TockMessageSchema().dump(TockMessage(bot_configuration=client_configuration))["botConfiguration"],
+                         result["botConfiguration"])
+
+    def test_metrics_are_exported(self):
+        # given
+        metrics = Metrics()
+        webhook = TockWebhook(bot_handler=lambda request: TockMessage(request_id=request.request_id), metrics=metrics,
+                              metrics_path="/webhook_key/metrics")
+        payload = TockMessageSchema().dumps(TockMessage(request_id="r1", bot_request=given_bot_request()))
+
+        # when
+        content_type, text = post_then_get(webhook, payload, "/webhook_key/metrics")
+
+        # then
+        self.assertTrue(content_type.startswith("text/plain"))
+        self.assertIn('tock_stage_duration_seconds_count{stage="decode"} 1', text)
+        self.assertIn('tock_stage_duration_seconds_count{stage="encode"} 1', text)
+
+    def test_metrics_are_not_exported_by_default(self):
+        # given
+        webhook = TockWebhook(bot_handler=lambda request: TockMessage(request_id=request.request_id))
+        payload = TockMessageSchema().dumps(TockMessage(request_id="r1", bot_request=given_bot_request()))
+
+        # when
+        content_type, text = post_then_get(webhook, payload, "/metrics")
+
+        # then
+        self.assertNotIn("tock_stage_duration_seconds", text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+from contextlib import contextmanager
+from dataclasses import replace
+from typing import List
+from unittest import mock
+
+import aiohttp
+
+from tock.models import TockMessage
+from tock.schemas import TockMessageSchema
+from tock.tests.test_schemas import given_bot_request, given_request_context, given_user_id
+from tock.websocket import TockWebsocket
+
+
+class FakeMessage:
+    def __init__(self, data: str):
+        self.type = aiohttp.WSMsgType.TEXT
+        self.data = data
+
+
+class FakeWebSocket:
+    def __init__(self, frames: List[str]):
+        self.frames = frames
+        self.sent: List[str] = []
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def __aiter__(self):
+        return self.__iterate()
+
+    async def __iterate(self):
+        for frame in self.frames:
+            yield FakeMessage(frame)
+
+    async def send_str(self, data: str):
+        self.sent.append(data)
+
+    async def close(self):
+        self.closed = True
+
+
+def given_frame(request_id: str, user_id: str) -> str:
+    bot_request = replace(
+        given_bot_request(),
+        context=replace(given_request_context(), user_id=given_user_id(user_id))
+    )
+    return TockMessageSchema().dumps(TockMessage(request_id=request_id, bot_request=bot_request))
+
+
+def sent_request_ids(ws: FakeWebSocket) -> List[str]:
+    schema = TockMessageSchema()
+    return [schema.loads(data).request_id for data in ws.sent[1:]]
+
+
+@contextmanager
+def patch_client_session(ws_connect: mock.MagicMock):
+    with mock.patch('tock.websocket.aiohttp.ClientSession') as client_session:
+        session = client_session.return_value
+        session.__aenter__.return_value = session
+        session.ws_connect = ws_connect
+        yield session
+
+
+def run_websocket(ws: FakeWebSocket, bot_handler, max_concurrency: int):
+    with patch_client_session(mock.MagicMock(return_value=ws)):
+        asyncio.run(TockWebsocket(bot_handler=bot_handler, max_concurrency=max_concurrency, reconnect=False).start())
+
+
+class TestTockWebsocket(unittest.TestCase):
+
+    def test_sequential_mode_answers_in_reception_order(self):
+        # given
+        ws = FakeWebSocket([given_frame("a1", "a"), given_frame("b1", "b")])
+
+        # when
+        run_websocket(ws, lambda request: TockMessage(request_id=request.request_id), max_concurrency=1)
+
+        # then
+        self.assertEqual(["a1", "b1"], sent_request_ids(ws))
+
+    def test_concurrent_mode_keeps_per_user_order(self):
+        # given a slow first message for user a
+        delays = {"a1": 0.05, "a2": 0, "b1": 0}
+        ws = FakeWebSocket([given_frame("a1", "a"), given_frame("a2", "a"), given_frame("b1", "b")])
+
+        async def bot_handler(request: TockMessage) -> TockMessage:
+            await asyncio.sleep(delays[request.request_id])
+            return TockMessage(request_id=request.request_id)
+
+        # when
+        run_websocket(ws, bot_handler, max_concurrency=10)
+
+        # then user b is not stalled and user a is answered in order
+        self.assertEqual(["b1", "a1", "a2"], sent_request_ids(ws))
+
+    def test_concurrent_mode_caps_in_flight_messages(self):
+        # given
+        ws = FakeWebSocket([given_frame(f"r{i}", f"u{i}") for i in range(10)])
+        in_flight = []
+        peak = []
+
+        async def bot_handler(request: TockMessage) -> TockMessage:
+            in_flight.append(request.request_id)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(request.request_id)
+            return TockMessage(request_id=request.request_id)
+
+        # when
+        run_websocket(ws, bot_handler, max_concurrency=3)
+
+        # then
+        self.assertEqual(3, max(peak))
+        self.assertEqual(10, len(sent_request_ids(ws)))
+
+
+class TestTockWebsocketReconnection(unittest.TestCase):
+
+    def run_connections(self, websocket: TockWebsocket, *results) -> mock.MagicMock:
+        """
+        ws_connect returns or raises the results in order, then stops the websocket
+        """
+        remaining = list(results)
+
+        def ws_connect(url):
+            if not remaining:
+                websocket.stop()
+                raise aiohttp.ClientConnectionError("no more connections")
+            result = remaining.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        connect = mock.MagicMock(side_effect=ws_connect)
+        with patch_client_session(connect):
+            asyncio.run(websocket.start())
+        return connect
+
+    def test_reconnects_and_sends_configuration_again(self):
+        # given
+        first = FakeWebSocket([given_frame("a1", "a")])
+        second = FakeWebSocket([given_frame("a2", "a")])
+        websocket = TockWebsocket(bot_handler=lambda request: TockMessage(request_id=request.request_id),
+                                  backoff_base=0.001)
+
+        # when
+        self.run_connections(websocket, first, aiohttp.ClientConnectionError("refused"), second)
+
+        # then
+        self.assertEqual(["a1"], sent_request_ids(first))
+        self.assertEqual(["a2"], sent_request_ids(second))
+        self.assertEqual(first.sent[0], second.sent[0])
+
+    def test_backoff_grows_until_connected(self):
+        # given
+        websocket = TockWebsocket(backoff_base=1, backoff_max=3)
+        error = aiohttp.ClientConnectionError("refused")
+        bounds = []
+
+        def uniform(low, high):
+            bounds.append(high)
+            return 0
+
+        # when
+        with mock.patch('tock.websocket.random.uniform', side_effect=uniform):
+            self.run_connections(websocket, error, error, error, error, FakeWebSocket([]), error)
+
+        # then
+        self.assertEqual([1, 2, 3, 3, 1, 2], bounds)
+
+    def test_without_reconnect_stops_when_the_connection_is_lost(self):
+        # given
+        websocket = TockWebsocket(reconnect=False)
+
+        # when
+        connect = self.run_connections(websocket, aiohttp.ClientConnectionError("refused"))
+
+        # then
+        self.assertEqual(1, connect.call_count)
+
+    def test_parallel_connections(self):
+        # given
+        sockets = [FakeWebSocket([given_frame("a1", "a")]), FakeWebSocket([given_frame("b1", "b")])]
+        websocket = TockWebsocket(bot_handler=lambda request: TockMessage(request_id=request.request_id),
+                                  reconnect=False, connections=2)
+
+        # when
+        self.run_connections(websocket, *sockets)
+
+        # then
+        self.assertEqual(["a1"], sent_request_ids(sockets[0]))
+        self.assertEqual(["b1"], sent_request_ids(sockets[1]))
+
+    def test_stop_closes_open_connections(self):
+        # given
+        ws = FakeWebSocket([given_frame("a1", "a")])
+        websocket = TockWebsocket(bot_handler=lambda request: websocket.stop() or TockMessage(request_id="a1"))
+
+        # when
+        self.run_connections(websocket, ws, FakeWebSocket([]))
+
+        # then
+        self.assertTrue(ws.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
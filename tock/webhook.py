@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
+import inspect
 import logging
-from typing import Callable
+from typing import Callable, Any, Optional
 
 from aiohttp import web
 
+from tock.idempotency import IdempotencyCache
+from tock.json_backend import JsonBackend, json_backend
+from tock.metrics import Metrics, DECODE, ENCODE, PROMETHEUS_CONTENT_TYPE
 from tock.models import TockMessage, ClientConfiguration
 from tock.schemas import TockMessageSchema
 
@@ -11,6 +15,9 @@ from tock.schemas import TockMessageSchema
 class TockWebhook:
     """
     Tock Webhook mode
+
+    Metrics are exported in the Prometheus text format on ``GET metrics_path``,
+    not exported when it is None.
     """
 
     def __init__(self,
@@ -18,40 +25,65 @@ class TockWebhook:
                  port: int = 5000,
                  path: str = 'webhook_key',
                  client_configuration: ClientConfiguration = None,
-                 bot_handler: Callable = lambda text: None
-
+                 bot_handler: Callable = lambda text: None,
+                 codec: Any = None,
+                 on_cleanup: Optional[Callable] = None,
+                 json: Optional[JsonBackend] = None,
+                 metrics: Optional[Metrics] = None,
+                 idempotency: Optional[IdempotencyCache] = None,
+                 metrics_path: Optional[str] = None
                  ):
         self.__host = host
         self.__port = port
         self.__path = path
         self.__bot_handler = bot_handler
         self.__client_configuration = client_configuration
+        self.__codec = codec if codec is not None else TockMessageSchema()
+        self.__json = json if json is not None else json_backend()
+        self.__metrics = metrics if metrics is not None else Metrics()
+        self.__idempotency = idempotency
         self.__logger = logging.getLogger(__name__)
         self.__app = web.Application()
-        self.__app.add_routes([
-            web.post(f'/{self.__path}/webhook', self.__webhook)
-        ])
+        self.__app.add_routes([web.post(f'/{self.__path}/webhook', self.__webhook)])
+        if metrics_path is not None:
+            self.__app.add_routes([web.get(metrics_path, self.__export_metrics)])
+        if on_cleanup is not None:
+            self.__app.on_cleanup.append(lambda app: on_cleanup())
 
-    def start(self):
-        web.run_app(host=self.__host, app=self.__app, port=self.__port)
+    def start(self, reuse_port: bool = False):
+        web.run_app(host=self.__host, app=self.__app, port=self.__port, reuse_port=reuse_port or None)
 
     async def __webhook(self, request):
-        payload = await request.json()
-        self.__logger.debug(f"new event received : {payload}")
+        body = await request.read()
+        with self.__metrics.time(DECODE):
+            payload = self.__json.loads(body)
+            tock_request: TockMessage = self.__codec.load(payload)
+        self.__logger.debug("new event received : %s", payload)
 
-        tock_message_schema = TockMessageSchema()
-        tock_request: TockMessage = tock_message_schema.load(payload)
         if tock_request.configuration:
             return self.__send_bot_configuration(self.__client_configuration)
+        elif self.__idempotency is not None and tock_request.request_id is not None:
+            tock_response = await self.__idempotency.get_or_compute(
+                tock_request.request_id, lambda: self.__respond(tock_request))
         else:
-            tock_response = tock_message_schema.dumps(self.__bot_handler(tock_request))
+            tock_response = await self.__respond(tock_request)
+
+        self.__logger.debug("new event sent : %s", tock_response)
+        return web.Response(body=tock_response, content_type='application/json')
+
+    async def __respond(self, tock_request: TockMessage) -> bytes:
+        tock_response = self.__bot_handler(tock_request)
+        if inspect.isawaitable(tock_response):
+            tock_response = await tock_response
+        with self.__metrics.time(ENCODE):
+            return self.__json.dumps(self.__codec.dump(tock_response))
 
-        self.__logger.debug(f"new event sent : {tock_response}")
-        return web.Response(text=tock_response)
+    async def __export_metrics(self, request):
+        return web.Response(body=self.__metrics.prometheus().encode('utf-8'),
+                            headers={'Content-Type': PROMETHEUS_CONTENT_TYPE})
 
     def __send_bot_configuration(self, client_configuration):
-        tock_message_schema = TockMessageSchema()
         tock_message = TockMessage(bot_configuration=client_configuration)
-        bot_configuration: str = tock_message_schema.dumps(tock_message)
-        self.__logger.debug(f"bot configuration sent {bot_configuration}")
-        return web.Response(text=bot_configuration)
+        bot_configuration: bytes = self.__json.dumps(self.__codec.dump(tock_message))
+        self.__logger.debug("bot configuration sent %s", bot_configuration)
+        return web.Response(body=bot_configuration, content_type='application/json')
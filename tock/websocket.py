@@ -1,18 +1,40 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import inspect
 import logging
+import random
 import sys
 from json import JSONDecodeError
-from typing import Callable
+from typing import Awaitable, Callable, Dict, Optional, Set, Any, Union
 
 import aiohttp
 
+from tock.idempotency import IdempotencyCache
+from tock.json_backend import JsonBackend, json_backend
+from tock.metrics import Metrics, DECODE, ENCODE
 from tock.models import TockMessage, ClientConfiguration
 from tock.schemas import TockMessageSchema
 
+# the backoff delay stops growing after this count of failed attempts
+MAX_BACKOFF_ATTEMPT = 16
+
 
 class TockWebsocket:
     """
     Tock Web Socket mode
+
+    With ``max_concurrency`` greater than 1, every incoming message is handled
+    in its own task. At most ``max_concurrency`` messages are in flight at once
+    and messages from the same user are always answered in order. Responses may
+    be sent out of order across users, the Tock server matches them by request id.
+
+    The connection is opened again when it is lost, after a random delay growing
+    exponentially from ``backoff_base`` up to ``backoff_max`` seconds, unless
+    ``reconnect`` is False. ``connections`` sockets are opened in parallel to spread
+    the load, sharing one client session.
+
+    With a ``frame_handler``, raw frames are forwarded to it without being decoded,
+    and the bytes it returns are sent back. ``max_concurrency`` bounds the frames in flight.
     """
 
     def __init__(
@@ -22,7 +44,17 @@ class TockWebsocket:
             port: int = 443,
             protocol: str = "wss",
             client_configuration: ClientConfiguration = None,
-            bot_handler: Callable = lambda text: None
+            bot_handler: Callable = lambda text: None,
+            max_concurrency: int = 1,
+            codec: Any = None,
+            json: Optional[JsonBackend] = None,
+            frame_handler: Optional[Callable[[Union[str, bytes]], Awaitable[Optional[bytes]]]] = None,
+            reconnect: bool = True,
+            backoff_base: float = 0.5,
+            backoff_max: float = 30.0,
+            connections: int = 1,
+            metrics: Optional[Metrics] = None,
+            idempotency: Optional[IdempotencyCache] = None
     ):
         self.__apikey = apikey
         self.__host = host
@@ -30,35 +62,172 @@ class TockWebsocket:
         self.__protocol = protocol
         self.__client_configuration = client_configuration
         self.__bot_handler = bot_handler
+        self.__max_concurrency = max_concurrency
+        self.__codec = codec if codec is not None else TockMessageSchema()
+        self.__json = json if json is not None else json_backend()
+        self.__frame_handler = frame_handler
+        self.__metrics = metrics if metrics is not None else Metrics()
+        self.__idempotency = idempotency
+        self.__reconnect = reconnect
+        self.__backoff_base = backoff_base
+        self.__backoff_max = backoff_max
+        self.__connections = connections
+        self.__stopped: Optional[asyncio.Event] = None
+        self.__sockets: Set[Any] = set()
+        self.__semaphore: Optional[asyncio.Semaphore] = None
+        self.__send_lock: Optional[asyncio.Lock] = None
+        self.__pending: Set[asyncio.Future] = set()
+        self.__user_tasks: Dict[str, asyncio.Future] = {}
         self.__logger = logging.getLogger(__name__)
 
     async def start(self):
         self.__logger.info("started")
-        session = aiohttp.ClientSession()
-        async with session.ws_connect(f'{self.__protocol}://{self.__host}:{self.__port}/{self.__apikey}') as ws:
-            await self.__send_bot_configuration(self.__client_configuration, ws)
-            async for msg in ws:
-                if msg.type == aiohttp.WSMsgType.TEXT:
+        self.__semaphore = asyncio.Semaphore(self.__max_concurrency)
+        self.__send_lock = asyncio.Lock()
+        self.__stopped = asyncio.Event()
+        async with aiohttp.ClientSession() as session:
+            await asyncio.gather(*[self.__connect(session, index) for index in range(self.__connections)])
+        self.__logger.info("stopped")
+
+    def stop(self):
+        """
+        Close the connections and stop reconnecting, must be called from the event loop
+        """
+        if self.__stopped is not None:
+            self.__stopped.set()
+        for ws in list(self.__sockets):
+            asyncio.ensure_future(ws.close())
+
+    async def __connect(self, session: aiohttp.ClientSession, index: int):
+        attempt = 0
+        while not self.__stopped.is_set():
+            try:
+                async with session.ws_connect(f'{self.__protocol}://{self.__host}:{self.__port}/{self.__apikey}') as ws:
+                    self.__sockets.add(ws)
                     try:
-                        self.__logger.debug(f"new event received {msg.data}")
-                        tock_message_schema = TockMessageSchema()
-                        tock_request: TockMessage = tock_message_schema.loads(msg.data)
-                        tock_response = tock_message_schema.dumps(self.__bot_handler(tock_request))
-                        self.__logger.debug(f"new event sent : {tock_response}")
-                        await ws.send_str(tock_response)
-                    except Exception as e:
-                        self.__logger.exception(e)
-                        pass
-                elif msg.type == aiohttp.WSMsgType.CLOSED:
-                    self.__logger.info("stopped")
-                    break
-                elif msg.type == aiohttp.WSMsgType.ERROR:
-                    self.__logger.error(msg.data)
-                    break
+                        # the configuration is sent again on each connection
+                        await self.__send_bot_configuration(self.__client_configuration, ws)
+                        attempt = 0
+                        await self.__receive(ws)
+                        if self.__pending:
+                            await asyncio.wait(self.__pending)
+                    finally:
+                        self.__sockets.discard(ws)
+            except (aiohttp.ClientError, OSError, asyncio.TimeoutError) as e:
+                self.__logger.warning("connection %d failed: %s", index, e)
+
+            if not self.__reconnect or self.__stopped.is_set():
+                return
+            # full jitter, so connections lost together are not retried together
+            delay = random.uniform(0, min(self.__backoff_max, self.__backoff_base * 2 ** attempt))
+            attempt = min(attempt + 1, MAX_BACKOFF_ATTEMPT)
+            self.__logger.info("connection %d lost, reconnecting in %.2f seconds", index, delay)
+            try:
+                await asyncio.wait_for(self.__stopped.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def __receive(self, ws):
+        async for msg in ws:
+            if msg.type == aiohttp.WSMsgType.TEXT or msg.type == aiohttp.WSMsgType.BINARY:
+                if self.__frame_handler is not None:
+                    await self.__forward(msg.data, ws)
+                elif self.__max_concurrency > 1:
+                    await self.__dispatch(msg.data, ws)
+                else:
+                    await self.__handle(msg.data, ws)
+            elif msg.type == aiohttp.WSMsgType.CLOSED:
+                self.__logger.info("connection closed")
+                break
+            elif msg.type == aiohttp.WSMsgType.ERROR:
+                self.__logger.error(msg.data)
+                break
+
+    async def __handle(self, data: Union[str, bytes], ws):
+        try:
+            self.__logger.debug("new event received %s", data)
+            with self.__metrics.time(DECODE):
+                tock_request: TockMessage = self.__codec.load(self.__json.loads(data))
+            await self.__answer(tock_request, ws)
+        except Exception as e:
+            self.__logger.exception(e)
+
+    async def __dispatch(self, data: Union[str, bytes], ws):
+        # waiting for a free slot stops reading from the socket when saturated
+        await self.__semaphore.acquire()
+        try:
+            self.__logger.debug("new event received %s", data)
+            with self.__metrics.time(DECODE):
+                tock_request: TockMessage = self.__codec.load(self.__json.loads(data))
+        except Exception as e:
+            self.__semaphore.release()
+            self.__logger.exception(e)
+            return
+
+        user_key = self.__user_key(tock_request)
+        previous: Optional[asyncio.Future] = self.__user_tasks.get(user_key)
+        task = asyncio.ensure_future(self.__run(tock_request, user_key, previous, ws))
+        self.__user_tasks[user_key] = task
+        self.__pending.add(task)
+        task.add_done_callback(self.__pending.discard)
+
+    async def __forward(self, data: Union[str, bytes], ws):
+        await self.__semaphore.acquire()
+        self.__logger.debug("new event forwarded %s", data)
+        task = asyncio.ensure_future(self.__send_forwarded(data, ws))
+        self.__pending.add(task)
+        task.add_done_callback(self.__pending.discard)
+
+    async def __send_forwarded(self, data: Union[str, bytes], ws):
+        try:
+            tock_response: Optional[bytes] = await self.__frame_handler(data)
+            if tock_response is not None:
+                async with self.__send_lock:
+                    await ws.send_str(tock_response.decode('utf-8'))
+        except Exception as e:
+            self.__logger.exception(e)
+        finally:
+            self.__semaphore.release()
+
+    async def __run(self, tock_request: TockMessage, user_key: str, previous: Optional[asyncio.Future], ws):
+        try:
+            if previous is not None and not previous.done():
+                await asyncio.wait([previous])
+            await self.__answer(tock_request, ws)
+        except Exception as e:
+            self.__logger.exception(e)
+        finally:
+            self.__semaphore.release()
+            if self.__user_tasks.get(user_key) is asyncio.current_task():
+                del self.__user_tasks[user_key]
+
+    async def __answer(self, tock_request: TockMessage, ws):
+        if self.__idempotency is not None and tock_request.request_id is not None:
+            tock_response = await self.__idempotency.get_or_compute(
+                tock_request.request_id, lambda: self.__respond(tock_request))
+        else:
+            tock_response = await self.__respond(tock_request)
+        self.__logger.debug("new event sent for request %s : %s", tock_request.request_id, tock_response)
+        async with self.__send_lock:
+            # the Tock server expects text frames
+            await ws.send_str(tock_response.decode('utf-8'))
+
+    async def __respond(self, tock_request: TockMessage) -> bytes:
+        tock_response = self.__bot_handler(tock_request)
+        if inspect.isawaitable(tock_response):
+            tock_response = await tock_response
+        with self.__metrics.time(ENCODE):
+            return self.__json.dumps(self.__codec.dump(tock_response))
+
+    @staticmethod
+    def __user_key(tock_request: TockMessage) -> str:
+        bot_request = tock_request.bot_request
+        if bot_request is not None and bot_request.user_id is not None:
+            return bot_request.user_id.id
+        return str(tock_request.request_id)
 
     async def __send_bot_configuration(self, client_configuration, ws):
-        tock_message_schema = TockMessageSchema()
         tock_message = TockMessage(bot_configuration=client_configuration)
-        bot_configuration: str = tock_message_schema.dumps(tock_message)
-        self.__logger.debug(f"bot configuration sent {bot_configuration}")
-        await ws.send_str(bot_configuration)
+        bot_configuration: bytes = self.__json.dumps(self.__codec.dump(tock_message))
+        self.__logger.debug("bot configuration sent %s", bot_configuration)
+        await ws.send_str(bot_configuration.decode('utf-8'))